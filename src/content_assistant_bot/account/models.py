@@ -0,0 +1,20 @@
+from sqlalchemy import BigInteger, Column, Index, Integer, String
+
+from ..models import Base, TimeStampMixin
+
+
+class CreditLedger(Base, TimeStampMixin):
+    """ One change of a user's balance """
+
+    __tablename__ = "credit_ledger"
+    # Shows the history of a user's balance
+    __table_args__ = (Index("ix_credit_ledger_user_id_id", "user_id", "id"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, nullable=False)
+    # Positive for credits, negative for debits
+    delta = Column(Integer, nullable=False)
+    balance_after = Column(Integer, nullable=False)
+    # For example welcome_bonus, subscription, reserve, refund, debit
+    reason = Column(String, nullable=False)
+    reference = Column(String, nullable=True)
@@ -1,26 +1,101 @@
 import logging
+import math
+from pathlib import Path
+from typing import Optional
 
+from omegaconf import OmegaConf
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
 
 from ..auth.models import User
 from ..database.core import get_session
+from ..openai.schemas import LLMCallUsage
+from .models import CreditLedger
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
 
-def debit_balance(user_id: int, quantity: int = 1) -> bool:
-    """ Use text generation from the active subscription """
+
+def credits_for_usage(usage: Optional[LLMCallUsage]) -> int:
+    """ Credits for one generation: one per call, or by tokens with `billing.mode: tokens` """
+    billing = config.app.billing
+    if billing.mode != "tokens" or usage is None:
+        return 1
+    return max(1, math.ceil(usage.total_tokens / billing.tokens_per_credit))
+
+
+def change_balance(
+    db_session: Session, user_id: int, delta: int, reason: str, reference: Optional[str] = None
+) -> Optional[int]:
+    """
+    Change a balance in one statement and record the change in the ledger.
+
+    The balance is updated by the database itself, so concurrent changes
+    are never lost, and a debit only happens when the balance covers it.
+
+    Args:
+        db_session: The database session.
+        user_id: The user.
+        delta: Credits to add, negative to debit.
+        reason: Why the balance changed.
+        reference: What the change belongs to, for example a job.
+
+    Returns:
+        Optional[int]: The new balance, None if the user was not found or the balance is too low.
+    """
+    statement = (
+        update(User)
+        .where(User.id == user_id)
+        .values(balance=func.coalesce(User.balance, 0) + delta)
+        .returning(User.balance)
+    )
+    if delta < 0:
+        statement = statement.where(func.coalesce(User.balance, 0) >= -delta)
+
+    balance = db_session.execute(statement).scalar_one_or_none()
+    if balance is None:
+        db_session.rollback()
+        return None
+    db_session.add(CreditLedger(user_id=user_id, delta=delta, balance_after=balance, reason=reason, reference=reference))
+    db_session.commit()
+    return balance
+
+
+def _change_balance(user_id: int, delta: int, reason: str, reference: Optional[str] = None) -> Optional[int]:
     db: Session = get_session()
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        # Check if user has enough balance
-        if user.balance < quantity:
-            return False
-        else:
-            user.balance -= quantity
-            db.commit()
-            return True
+        return change_balance(db, user_id, delta, reason, reference)
     finally:
         db.close()
+
+
+def reserve_credits(user_id: int, quantity: int = 1, reference: Optional[str] = None) -> bool:
+    """ Take credits from the balance only if it covers them """
+    return _change_balance(user_id, -quantity, "reserve", reference) is not None
+
+
+def refund_credits(user_id: int, quantity: int, reference: Optional[str] = None) -> None:
+    """ Give reserved credits back """
+    if quantity > 0:
+        _change_balance(user_id, quantity, "refund", reference)
+
+
+def settle_reservation(user_id: int, reserved: int, used: int, reference: Optional[str] = None) -> int:
+    """ Commit a reservation for the credits actually used and return how many were debited """
+    if used < reserved:
+        refund_credits(user_id, reserved - used, reference)
+        return used
+    if used > reserved and _change_balance(user_id, reserved - used, "debit", reference) is None:
+        logger.warning(f"Could not debit {used - reserved} more credits from user {user_id}")
+        return reserved
+    return used
+
+
+def debit_balance(user_id: int, quantity: int = 1, reference: Optional[str] = None) -> bool:
+    """ Use text generation from the active subscription """
+    return _change_balance(user_id, -quantity, "debit", reference) is not None
@@ -3,13 +3,20 @@ import logging
 import logging.config
 import os
 from ast import Call
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 
 from omegaconf import OmegaConf
 from telebot.types import CallbackQuery, Message
 
-from ..database.core import export_all_tables
+from ..chatgpt.inflight import inflight
+from ..chatgpt.stream import edit_rates
+from ..database.core import export_all_tables, get_session
+from ..generation.jobs import generation_queue
+from ..openai.files import file_cache
+from ..openai.keys import key_pools
+from ..openai.router import router
+from ..openai.usage import cost_per_user, latency_per_model
 from .markup import create_admin_menu_markup
 
 # Set up logging
@@ -69,6 +76,37 @@ def register_handlers(bot):
         bot.send_message(user_id, f"```yaml\n{config_str}\n```", parse_mode="Markdown")
 
 
+    @bot.callback_query_handler(func=lambda call: call.data == "metrics")
+    def metrics_handler(call: CallbackQuery, data: dict):
+        user = data["user"]
+        if user.role_id not in {0, 1}:
+            bot.send_message(call.from_user.id, app_strings[user.lang].no_rights)
+            return
+
+        since = datetime.utcnow() - timedelta(days=1)
+        db_session = get_session()
+        try:
+            usage = {
+                "llm_cost_per_user_24h": cost_per_user(db_session, since, limit=10),
+                "llm_p95_latency_24h": latency_per_model(db_session, since),
+            }
+        finally:
+            db_session.close()
+
+        metrics = {
+            **usage,
+            "llm_providers": router.snapshot(),
+            "api_keys": key_pools.metrics(),
+            "stream_edit_rates": edit_rates.snapshot(),
+            "file_cache": file_cache.metrics(),
+            "inflight_replies": inflight.snapshot(),
+            "generation_queue": generation_queue.snapshot(),
+        }
+        metrics_str = OmegaConf.to_yaml(metrics)
+
+        # Send metrics
+        bot.send_message(user.id, f"```yaml\n{metrics_str}\n```", parse_mode="Markdown")
+
     @bot.callback_query_handler(func=lambda call: call.data == "export_data")
     def export_data_handler(call, data):
         user = data["user"]
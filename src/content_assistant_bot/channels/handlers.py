@@ -3,9 +3,11 @@ from pathlib import Path
 
 from omegaconf import OmegaConf
 from telebot import TeleBot, types
+from telebot.apihelper import ApiTelegramException
 from telebot.states import State, StatesGroup
 
 from ..database.core import get_session
+from ..database.pagination import parse_page_callback
 from ..menu.markup import create_menu_markup
 from .markup import (
     create_cancel_button, 
@@ -19,6 +21,8 @@ from .service import (
     delete_channel,
     read_channel,
     read_channels_by_owner,
+    read_channels_page,
+    resolve_channel,
     update_channel,
 )
 
@@ -103,6 +107,18 @@ def register_handlers(bot: TeleBot):
             )
             return
 
+        # A channel Telegram does not know is refused now, not when a post is due
+        try:
+            access = resolve_channel(bot, link)
+        except ApiTelegramException as e:
+            logger.info(f"Could not resolve channel {link}: {e}")
+            bot.send_message(
+                user.id,
+                strings[user.lang].channel_unreachable,
+                reply_markup=create_cancel_button(user.lang)
+            )
+            return
+
         data["state"].add_data(link=link)
         
         with data["state"].data() as data_items:
@@ -111,7 +127,8 @@ def register_handlers(bot: TeleBot):
                 db_session,
                 name=data_items['name'], 
                 link=data_items['link'],
-                owner_id=user.id
+                owner_id=user.id,
+                access=access
             )
 
         bot.send_message(
@@ -120,14 +137,21 @@ def register_handlers(bot: TeleBot):
             reply_markup=create_menu_markup(user.lang),
             parse_mode="Markdown"
         )
+        if not access.can_post:
+            bot.send_message(user.id, strings[user.lang].bot_cannot_post)
         data["state"].delete()
 
-    @bot.callback_query_handler(func=lambda call: call.data == "my_channels")
+    @bot.callback_query_handler(func=lambda call: call.data == "my_channels" or call.data.startswith("channels_page_"))
     def show_my_channels(call: types.CallbackQuery, data: dict):
         user = data["user"]
         data["state"].set(ChannelState.my_channels)
 
-        channels = read_channels_by_owner(db_session, user.id)
+        # Page buttons carry a cursor, "my_channels" opens the newest page
+        cursor, direction = parse_page_callback(call.data, "channels_page")
+        page = read_channels_page(db_session, user.id, cursor, direction)
+        if cursor and not page.items:
+            page = read_channels_page(db_session, user.id)
+        channels = page.items
 
         if not channels:
             markup = types.InlineKeyboardMarkup()
@@ -141,7 +165,7 @@ def register_handlers(bot: TeleBot):
             )
             return
 
-        markup = create_channels_list_markup(user.lang, channels)
+        markup = create_channels_list_markup(user.lang, channels, page)
 
         bot.edit_message_text(
             chat_id=user.id,
@@ -280,13 +304,27 @@ def register_handlers(bot: TeleBot):
     @bot.message_handler(state=ChannelState.edit_link)
     def process_edit_link(message: types.Message, data: dict):
         user = data["user"]
+        link = message.text.strip()
+        try:
+            access = resolve_channel(bot, link)
+        except ApiTelegramException as e:
+            logger.info(f"Could not resolve channel {link}: {e}")
+            bot.send_message(
+                user.id,
+                strings[user.lang].channel_unreachable,
+                reply_markup=create_cancel_button(user.lang)
+            )
+            return
+
         with data["state"].data() as data_items:
             channel_id = data_items['channel_id']
-            channel = update_channel(db_session, channel_id, link=message.text)
+            channel = update_channel(db_session, channel_id, link=link, access=access)
 
         bot.send_message(
             user.id,
             strings[user.lang].channel_updated,
             reply_markup=create_menu_markup(user.lang)
         )
+        if not access.can_post:
+            bot.send_message(user.id, strings[user.lang].bot_cannot_post)
         data["state"].delete()
\ No newline at end of file
@@ -1,9 +1,11 @@
 import logging
 from pathlib import Path
+from typing import Optional
 
 from omegaconf import OmegaConf
 from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from ..database.pagination import Page, page_callback
 from .models import Channel
 
 # Load configuration
@@ -27,11 +29,23 @@ def create_channels_menu_markup(lang: str) -> InlineKeyboardMarkup:
     return markup
 
 
-def create_channels_list_markup(lang: str, channels: list) -> InlineKeyboardMarkup:
-    """ Create channels list markup """
+def create_channels_list_markup(lang: str, channels: list, page: Optional[Page] = None) -> InlineKeyboardMarkup:
+    """ Create channels list markup, with page buttons when there are more channels """
     markup = InlineKeyboardMarkup(row_width=1)
     for channel in channels:
         markup.add(InlineKeyboardButton(channel.name, callback_data=f"view_channel_{channel.id}"))
+    # The cursors of the neighbouring pages travel in the callback data
+    buttons = []
+    if page and page.previous_cursor:
+        buttons.append(InlineKeyboardButton(
+            strings[lang].previous_page, callback_data=page_callback("channels_page", "prev", page.previous_cursor)
+        ))
+    if page and page.next_cursor:
+        buttons.append(InlineKeyboardButton(
+            strings[lang].next_page, callback_data=page_callback("channels_page", "next", page.next_cursor)
+        ))
+    if buttons:
+        markup.row(*buttons)
     markup.add(InlineKeyboardButton(strings[lang].back_to_menu, callback_data="channels"))
     return markup
 
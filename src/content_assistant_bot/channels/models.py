@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from ..auth.models import User
@@ -8,10 +8,17 @@ from ..models import Base, TimeStampMixin
 class Channel(Base, TimeStampMixin):
     """ Channel model for storing user's Telegram channels """
     __tablename__ = "channels"
+    # Serves the pages of a user's channels
+    __table_args__ = (Index("ix_channels_owner_id_created_at_id", "owner_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     link = Column(String, nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    # Resolved from the link with get_chat, messages are sent to it directly
+    chat_id = Column(BigInteger, nullable=True)
+    # Whether the bot could post in the channel when last checked with get_chat_member
+    can_post = Column(Boolean, nullable=True)
+    checked_at = Column(DateTime, nullable=True)
 
     #owner = relationship("User", back_populates="channels")
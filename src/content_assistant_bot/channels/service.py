@@ -1,23 +1,87 @@
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple, Optional
 
-from sqlalchemy.orm import Session
+from omegaconf import OmegaConf
+from sqlalchemy.orm import Session, load_only
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
 
+from ..database.pagination import Page, paginate
 from .models import Channel
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+
+class ChannelAccess(NamedTuple):
+    """ The resolved chat of a channel and whether the bot can post there """
+
+    chat_id: int
+    can_post: bool
+
+
+def channel_tag(channel_link: str) -> str:
+    """ Get the @username of a channel from its link """
+    return f"@{channel_link.rsplit('/', 1)[-1]}"
+
+
+def resolve_channel(bot: TeleBot, link: str) -> ChannelAccess:
+    """
+    Look up a channel by its link and check the bot's rights in it.
+
+    Raises:
+        ApiTelegramException: If Telegram does not know the channel.
+    """
+    chat = bot.get_chat(channel_tag(link))
+    try:
+        member = bot.get_chat_member(chat.id, bot.user.id)
+    except ApiTelegramException as e:
+        # The bot was never added to the channel
+        logger.info(f"Bot is not a member of channel {link}: {e}")
+        return ChannelAccess(chat.id, False)
+    can_post = member.status == "creator" or (
+        member.status == "administrator" and member.can_post_messages is not False
+    )
+    return ChannelAccess(chat.id, can_post)
+
+
+def cached_access(channel: Channel) -> Optional[ChannelAccess]:
+    """ Get the stored access of a channel if it allowed posting and is recent enough to trust """
+    if channel.chat_id is None or not channel.can_post or channel.checked_at is None:
+        return None
+    if datetime.utcnow() - channel.checked_at > timedelta(seconds=config.app.access.ttl_seconds):
+        return None
+    return ChannelAccess(channel.chat_id, True)
+
+
+def store_access(channel: Channel, access: Optional[ChannelAccess]) -> None:
+    """ Remember a fresh check of a channel, or forget the last one with None """
+    if access is None:
+        channel.checked_at = None
+        return
+    channel.chat_id = access.chat_id
+    channel.can_post = access.can_post
+    channel.checked_at = datetime.utcnow()
+
 
 # Channel related functions
-def create_channel(db_session: Session, name: str, link: str, owner_id: int) -> Channel:
-    """ Create a new channel """
+def create_channel(
+    db_session: Session, name: str, link: str, owner_id: int, access: Optional[ChannelAccess] = None
+) -> Channel:
+    """ Create a new channel, with its access as resolved by `resolve_channel` """
     channel = Channel(
         name=name,
         link=link,
         owner_id=owner_id
     )
+    store_access(channel, access)
     db_session.add(channel)
     db_session.commit()
     db_session.refresh(channel)
@@ -29,19 +93,36 @@ def read_channels_by_owner(db_session: Session, owner_id: int, skip: int = 0, li
     return db_session.query(Channel).filter(Channel.owner_id == owner_id).offset(skip).limit(limit).all()
 
 
+def read_channels_page(
+    db_session: Session, owner_id: int, cursor: Optional[str] = None, direction: str = "next", limit: int = 10
+) -> Page:
+    """ Get one page of a user's channels, newest first, with only the columns the list shows """
+    query = (
+        db_session.query(Channel)
+        .options(load_only(Channel.id, Channel.name, Channel.created_at))
+        .filter(Channel.owner_id == owner_id)
+    )
+    return paginate(query, Channel, limit, cursor, direction)
+
+
 def read_channel(db_session: Session, channel_id: int):
     """ Get a channel by ID """
     return db_session.query(Channel).filter(Channel.id == channel_id).first()
 
 
-def update_channel(db_session: Session, channel_id: int, name: str = None, link: str = None) -> Channel:
-    """ Update channel information """
+def update_channel(
+    db_session: Session, channel_id: int, name: str = None, link: str = None, access: Optional[ChannelAccess] = None
+) -> Channel:
+    """ Update channel information, a new link comes with its resolved access """
     channel = db_session.query(Channel).filter(Channel.id == channel_id).first()
     if channel:
         if name:
             channel.name = name
         if link:
             channel.link = link
+            channel.chat_id = None
+            channel.can_post = None
+            store_access(channel, access)
         channel.updated_at = datetime.utcnow()
         db_session.commit()
         db_session.refresh(channel)
@@ -0,0 +1,208 @@
+import logging
+import multiprocessing
+import queue
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Optional
+
+from omegaconf import OmegaConf
+from telebot import TeleBot
+from telebot.types import Document
+
+from ..openai.files import file_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+
+class DocumentTooLargeError(Exception):
+    """Raised when a document is bigger than the conversion limit"""
+
+
+class ConversionTimeoutError(Exception):
+    """Raised when a conversion did not finish in time"""
+
+
+class ConversionError(Exception):
+    """Raised when a worker failed to convert a document"""
+
+
+# Each worker process keeps its own converter
+@lru_cache(maxsize=1)
+def _get_markitdown():
+    # Loaded by the worker processes only, the bot itself never converts
+    from markitdown import MarkItDown  # noqa: PLC0415
+
+    return MarkItDown()
+
+
+def _convert_file(path: str) -> str:
+    return _get_markitdown().convert_local(path).text_content
+
+
+def _worker_loop(connection: Connection) -> None:
+    connection.send("ready")
+    while True:
+        try:
+            function, args = connection.recv()
+        except EOFError:
+            return
+        try:
+            connection.send((True, function(*args)))
+        except Exception as e:
+            connection.send((False, repr(e)))
+
+
+class _Worker:
+    """A worker process that runs one task at a time, sent through its pipe"""
+
+    def __init__(self):  # noqa: D107
+        # Spawned workers do not inherit the bot's threads and connections
+        context = multiprocessing.get_context("spawn")
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker_loop, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        # The start-up is not part of any task's time
+        self.connection.recv()
+
+    def stop(self) -> None:
+        """Terminate the process, whatever it is running."""
+        self.process.terminate()
+        self.process.join(timeout=5)
+        self.connection.close()
+
+
+class TextCache:
+    """LRU cache of converted texts, bounded by their total length"""
+
+    def __init__(self, max_chars: int):  # noqa: D107
+        self.max_chars = max_chars
+        self.size = 0
+        self.items: OrderedDict[str, str] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached text and mark it as recently used."""
+        with self.lock:
+            text = self.items.get(key)
+            if text is not None:
+                self.items.move_to_end(key)
+            return text
+
+    def put(self, key: str, text: str) -> None:
+        """Cache a text, evicting the least recently used ones beyond the size limit."""
+        with self.lock:
+            if key in self.items:
+                self.size -= len(self.items.pop(key))
+            self.items[key] = text
+            self.size += len(text)
+            while self.size > self.max_chars and len(self.items) > 1:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class DocumentConverter:
+    """
+    Converts documents to text in a pool of worker processes.
+
+    The size is checked before anything is downloaded, the file is streamed
+    into the file cache and converted by a worker, so a slow conversion
+    neither blocks a bot thread nor holds its GIL. The timeout starts when a
+    worker picks the conversion up, and a worker that runs past it is
+    terminated while the other workers keep running.
+    Converted texts are cached by `file_unique_id`.
+    """
+
+    def __init__(self, settings=None):  # noqa: D107
+        self.settings = settings or config.app.documents
+        self.cache = TextCache(self.settings.cache_max_chars)
+        self._idle: queue.SimpleQueue[_Worker] = queue.SimpleQueue()
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> _Worker:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            start_new = self._started < self.settings.max_workers
+            if start_new:
+                self._started += 1
+        if not start_new:
+            return self._idle.get()
+        try:
+            return _Worker()
+        except BaseException:
+            self._discard()
+            raise
+
+    def _discard(self) -> None:
+        with self._lock:
+            self._started -= 1
+
+    def _run(self, function, *args):
+        # Waiting for a free worker is not counted against the timeout
+        worker = self._acquire()
+        try:
+            worker.connection.send((function, args))
+            if not worker.connection.poll(self.settings.timeout_seconds):
+                worker.stop()
+                self._discard()
+                raise ConversionTimeoutError(
+                    f"Conversion took more than {self.settings.timeout_seconds}s"
+                )
+            ok, result = worker.connection.recv()
+        except (EOFError, OSError):
+            worker.stop()
+            self._discard()
+            raise ConversionError("Conversion worker exited") from None
+        self._idle.put(worker)
+        if not ok:
+            raise ConversionError(result)
+        return result
+
+    def convert(self, bot: TeleBot, document: Document) -> str:
+        """
+        Convert a Telegram document to text.
+
+        Args:
+            bot: The Telegram bot instance.
+            document: The document of the message.
+
+        Returns:
+            str: The text content of the document.
+
+        Raises:
+            DocumentTooLargeError: If the document is over the size limit.
+            ConversionTimeoutError: If the conversion took too long.
+            ConversionError: If the worker failed to convert the document.
+        """
+        cached = self.cache.get(document.file_unique_id)
+        if cached is not None:
+            return cached
+
+        if (document.file_size or 0) > self.settings.max_bytes:
+            raise DocumentTooLargeError(f"Document is {document.file_size} bytes")
+        file_info = file_cache.get_file_info(bot, document.file_id)
+        if (file_info.file_size or 0) > self.settings.max_bytes:
+            raise DocumentTooLargeError(f"Document is {file_info.file_size} bytes")
+
+        # The extension tells the converter which format to read
+        suffix = Path(document.file_name or file_info.file_path or "").suffix
+        with file_cache.open_path(bot, document.file_id, document.file_unique_id, suffix) as path:
+            text = self._run(_convert_file, path)
+
+        self.cache.put(document.file_unique_id, text)
+        return text
+
+
+document_converter = DocumentConverter()
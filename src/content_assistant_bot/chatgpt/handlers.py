@@ -1,10 +1,9 @@
 import logging
+from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
-from markitdown import MarkItDown
 from omegaconf import OmegaConf
-from PIL import Image
 from telebot.states import State
 from telebot.states.sync.context import StateContext
 from telebot.types import CallbackQuery, Message
@@ -14,8 +13,16 @@ from .. import openai
 from ..auth.models import User
 from ..database.core import get_session
 from ..openai.client import LLM
-from ..openai.utils import download_file_in_memory
-from .service import create_message, read_chat_history
+from ..openai.images import prepare_photo
+from ..openai.router import CallCancelledError
+from ..openai.schemas import ImagePayload
+from .documents import ConversionTimeoutError, DocumentTooLargeError, document_converter
+from .inflight import Generation, inflight
+from .markup import create_stop_markup
+from .retrieval import document_index, with_documents
+from .service import create_messages
+from .stream import StreamRenderer
+from .summary import build_memory, schedule_summary, with_summary
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,9 +30,6 @@ logger = logging.getLogger(__name__)
 # Load the database session
 db_session = get_session()
 
-# Initialize MarkItDown
-markitdown = MarkItDown()
-
 # Load configuration
 CURRENT_DIR = Path(__file__).parent
 config = OmegaConf.load(CURRENT_DIR / "config.yaml")
@@ -52,14 +56,25 @@ def register_handlers(bot):
     def handle_chatgpt_input(message: Message, data: dict) -> None:
         user = data["user"]
 
+        # One reply per user runs at a time, a new input cancels it or waits behind it
+        if not inflight.submit(user.id, lambda generation: answer(message, user, generation)):
+            bot.reply_to(message, strings[user.lang].busy)
+
+    @bot.callback_query_handler(func=lambda call: call.data == "stop_generation")
+    def handle_stop_generation(call: CallbackQuery, data: dict):
+        user = data["user"]
+        inflight.cancel(user.id)
+        bot.answer_callback_query(call.id)
+
+    def answer(message: Message, user: User, generation: Generation) -> None:
         try:
             if message.content_type == "document":
-                handle_document(message, user)
+                handle_document(message, user, generation)
             elif message.content_type == "photo":
                 logger.info("Handling photo")
-                handle_photo(message, user)
+                handle_photo(message, user, generation)
             elif message.content_type == "text":
-                handle_text(message, user)
+                handle_text(message, user, generation)
             else:
                 bot.reply_to(message, strings[user.lang].unsupported_message_type)
         except Exception as e:
@@ -74,91 +89,98 @@ def register_handlers(bot):
             state.delete()
 
 
-    def handle_photo(message: Message, user: User):
+    def handle_photo(message: Message, user: User, generation: Generation):
         user_id = int(message.chat.id)
         user_message = message.caption if message.caption else ""
-        image = None
 
-        # Download the file
-        file_object = download_file_in_memory(bot, message.photo[-1].file_id)
-        image = Image.open(file_object)
+        # Download the smallest size that is good enough and encode it once
+        image = prepare_photo(bot, message.photo)
 
-        process_message(user_id, user_message, user, image)
+        process_message(user_id, user_message, user, generation, image)
 
-    def handle_document(message: Message, user: User):
+    def handle_document(message: Message, user: User, generation: Generation):
         user_id = int(message.chat.id)
         user_message = message.caption if message.caption else ""
 
-        file_object = download_file_in_memory(bot, message.document.file_id)
-
+        # Conversion runs in a worker process, the text is cached by file_unique_id
         try:
-            result = markitdown.convert_stream(file_object)
-            user_message += "\n" + result.text_content
+            text = document_converter.convert(bot, message.document)
+        except DocumentTooLargeError as e:
+            logger.warning(f"Rejected document: {e}")
+            bot.reply_to(message, strings[user.lang].document_too_large.format(max_mb=config.app.documents.max_bytes >> 20))
+            return
+        except ConversionTimeoutError as e:
+            logger.error(f"Error processing file: {e}")
+            bot.reply_to(message, strings[user.lang].document_timeout)
+            return
         except Exception as e:
             logger.error(f"Error processing file: {e}")
             bot.reply_to(message, "An error occurred while processing your file.")
             return
 
-        process_message(user_id, user_message, user)
+        # The document is searched per question instead of being sent with every message
+        document = message.document
+        chunks = document_index.add(db_session, user_id, document.file_unique_id, document.file_name, text)
+        if not user_message:
+            name = document.file_name or ""
+            bot.reply_to(message, strings[user.lang].document_indexed.format(name=name, chunks=chunks))
+            return
+
+        process_message(user_id, user_message, user, generation)
 
-    def handle_text(message: Message, user: User):
+    def handle_text(message: Message, user: User, generation: Generation):
         user_id = int(message.chat.id)
         user_message = message.text
-        process_message(user_id, user_message, user)
-
-    def process_message(user_id: int, user_message: str, user: User, image: Optional[str] = None):
-        # Truncate the user's message
-        user_message = user_message[: config.app.max_input_length]
-
-        # Create a message in chat history
-        create_message(db_session, user_id, "user", content=user_message)
-
-        # Retrieve chat history
-        db_chat_history = read_chat_history(db_session, user_id)
-
-        # Convert chat history to a list of Message objects using model_validate
-        openai_chat_history = [
-            openai.schemas.Message(
-                id = msg.id,
-                chat_id = msg.chat_id,
-                role = msg.role,
-                content = msg.content,
-                created_at = msg.created_at
-            )
-            for msg in db_chat_history
-        ]
+        process_message(user_id, user_message, user, generation)
+
+    def process_message(
+        user_id: int, user_message: str, user: User, generation: Generation, image: Optional[ImagePayload] = None
+    ):
+        # The summary covers older turns, recent ones come from the ring buffer
+        summary, openai_chat_history = build_memory(db_session, user_id, config.app.llm.chat_history_limit)
+        openai_chat_history.append(
+            openai.schemas.Message(id=0, chat_id=user_id, role="user", content=user_message, created_at=datetime.utcnow())
+        )
+
+        # Only the parts of the user's documents relevant to the question are sent
+        documents = document_index.search(db_session, user_id, user_message)
+        system_prompt = with_documents(with_summary(config.app.llm.system_prompt, summary), documents)
 
         # Load the LLM model
-        llm = LLM(config.app.llm, system_prompt=config.app.llm.system_prompt)
+        llm = LLM(config.app.llm, system_prompt=system_prompt, user_id=user_id)
 
         # Generate and send the final response
         logger.info(f"User message: {user_message}")
 
         if llm.config.stream:
-            # Inform the user about processing
-            sent_msg = bot.send_message(user_id, "...")
-            accumulated_response = ""
-
-            # Generate response and send chunks
-            for idx, chunk in enumerate(llm.invoke(openai_chat_history, image=image)):
-                accumulated_response += chunk.content
-                if idx % 20 == 0:
-                    try:
-                        bot.edit_message_text(
-                            accumulated_response, chat_id=user_id, message_id=sent_msg.message_id
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to edit message: {e}")
-                        continue
-                if idx > 200:
-                    continue
-            bot.edit_message_text(
-                accumulated_response.replace("<end_of_turn>", ""), chat_id=user_id, message_id=sent_msg.message_id
-            )
-            create_message(db_session, user_id, "assistant", content=accumulated_response)
+            # Edits are coalesced on a time interval and roll over into new messages
+            renderer = StreamRenderer(bot, user_id, reply_markup=create_stop_markup(user.lang))
+            stream = llm.invoke(openai_chat_history, image=image)
+            for chunk in stream:
+                if generation.cancelled:
+                    # Closing the stream ends the provider call and frees this worker
+                    stream.close()
+                    renderer.append(strings[user.lang].generation_stopped)
+                    break
+                renderer.append(chunk.content.replace("<end_of_turn>", ""))
+            accumulated_response = renderer.finish()
+            if generation.cancelled:
+                # A partial reply would mislead the next answers, so the stopped turn is not stored
+                return
         else:
-            # Generate and send the final response
-            response = llm.invoke(openai_chat_history, image=image)
-            bot.send_message(user_id, response.response_content)
-            create_message(db_session, user_id, "assistant", content=response.response_content)
+            # Stopping returns this worker at once, the provider call ends on its own
+            try:
+                response = llm.invoke(openai_chat_history, image=image, cancelled=generation.cancel_event)
+            except CallCancelledError:
+                return
+            if generation.cancelled:
+                return
+            accumulated_response = response.content
+            bot.send_message(user_id, accumulated_response)
+
+        # The new turn is stored together with the reply
+        create_messages(db_session, user_id, [("user", user_message), ("assistant", accumulated_response)])
+        schedule_summary(db_session, user_id)
+
+        logger.info(f"Prompt tokens for user {user_id}: {llm.prompt_tokens.total} of {llm.prompt_tokens.budget}")
 
@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Optional
+
+from omegaconf import OmegaConf
+
+from ..openai.schemas import Message
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+
+class _ChatTail:
+    """The latest messages of one chat"""
+
+    def __init__(self, capacity: int, messages: list[Message], complete: bool):  # noqa: D107
+        self.messages: deque[Message] = deque(messages, maxlen=capacity)
+        # Whether the chat has no older messages than the ones kept
+        self.complete = complete
+
+
+class MessageRingBuffer:
+    """
+    Keeps the last `capacity` messages of recently active chats in memory.
+
+    A chat is loaded once from the database and new messages are written
+    through, so recent history is read without a query. Chats not used
+    lately are dropped once more than `max_chats` are kept.
+    """
+
+    def __init__(self, capacity: int, max_chats: int):  # noqa: D107
+        self.capacity = capacity
+        self.max_chats = max_chats
+        self.chats: OrderedDict[int, _ChatTail] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, chat_id: int, limit: int) -> Optional[list[Message]]:
+        """Return the last `limit` messages of a chat, or None if they are not all in memory."""
+        with self.lock:
+            tail = self.chats.get(chat_id)
+            if tail is None or (len(tail.messages) < limit and not tail.complete):
+                return None
+            self.chats.move_to_end(chat_id)
+            messages = list(tail.messages)
+        return messages[-limit:] if limit else []
+
+    def load(self, chat_id: int, messages: list[Message]) -> None:
+        """Keep the latest messages read from the database, oldest first."""
+        with self.lock:
+            self.chats[chat_id] = _ChatTail(self.capacity, messages, complete=len(messages) < self.capacity)
+            self.chats.move_to_end(chat_id)
+            while len(self.chats) > self.max_chats:
+                self.chats.popitem(last=False)
+
+    def append(self, chat_id: int, messages: list[Message]) -> None:
+        """Add new messages to a chat that is kept in memory."""
+        with self.lock:
+            tail = self.chats.get(chat_id)
+            if tail is not None:
+                tail.messages.extend(messages)
+
+    def drop(self, chat_id: int) -> None:
+        """Forget a chat, for example after its messages were deleted."""
+        with self.lock:
+            self.chats.pop(chat_id, None)
+
+
+recent_messages = MessageRingBuffer(config.app.history.buffer_size, config.app.history.max_chats)
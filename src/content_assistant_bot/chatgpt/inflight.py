@@ -0,0 +1,108 @@
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Callable
+
+from omegaconf import OmegaConf
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+
+class Generation:
+    """One running reply of a user, which can be cancelled"""
+
+    def __init__(self, user_id: int):  # noqa: D107
+        self.user_id = user_id
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """Ask the reply to stop at its next chunk."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:  # noqa: D102
+        return self._cancelled.is_set()
+
+    @property
+    def cancel_event(self) -> threading.Event:
+        """The event set on cancel, for calls that can stop waiting on it."""
+        return self._cancelled
+
+
+class InflightRegistry:
+    """
+    Allows one running reply per user.
+
+    An input that arrives while a reply is running either cancels it
+    (`mode: cancel`, the newest input wins) or waits behind it
+    (`mode: queue`, up to `max_queued` inputs). Waiting inputs do not hold
+    a bot worker: the thread that runs the current reply runs them next.
+    """
+
+    def __init__(self, mode: str, max_queued: int):  # noqa: D107
+        self.mode = mode
+        self.max_queued = max_queued
+        self.running: dict[int, Generation] = {}
+        self.pending: dict[int, deque[Callable[[Generation], None]]] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, user_id: int, task: Callable[[Generation], None]) -> bool:
+        """
+        Run a reply for a user now, or after the running one.
+
+        Args:
+            user_id: The user.
+            task: The reply, it should stop when its generation is cancelled.
+
+        Returns:
+            bool: False if the input was rejected because the queue is full.
+        """
+        with self.lock:
+            if user_id in self.running:
+                queue = self.pending.setdefault(user_id, deque())
+                if self.mode == "cancel":
+                    self.running[user_id].cancel()
+                    queue.clear()
+                elif len(queue) >= self.max_queued:
+                    return False
+                queue.append(task)
+                return True
+            generation = self.running[user_id] = Generation(user_id)
+
+        while True:
+            try:
+                task(generation)
+            except Exception as e:
+                logger.error(f"Reply for user {user_id} failed: {e}")
+
+            with self.lock:
+                queue = self.pending.get(user_id)
+                if not queue:
+                    self.pending.pop(user_id, None)
+                    del self.running[user_id]
+                    return True
+                task = queue.popleft()
+                generation = self.running[user_id] = Generation(user_id)
+
+    def cancel(self, user_id: int) -> bool:
+        """Stop the running reply of a user, return whether there was one."""
+        with self.lock:
+            generation = self.running.get(user_id)
+        if generation is None:
+            return False
+        generation.cancel()
+        return True
+
+    def snapshot(self) -> dict:
+        """Return the number of running and waiting replies."""
+        with self.lock:
+            return {"running": len(self.running), "queued": sum(len(queue) for queue in self.pending.values())}
+
+
+inflight = InflightRegistry(config.app.inflight.mode, config.app.inflight.max_queued)
@@ -0,0 +1,16 @@
+from pathlib import Path
+
+from omegaconf import OmegaConf
+from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+strings = config.strings
+
+
+def create_stop_markup(lang: str) -> InlineKeyboardMarkup:
+    """ Create markup to stop a reply while it is streamed """
+    markup = InlineKeyboardMarkup()
+    markup.add(InlineKeyboardButton(strings[lang].stop_generation, callback_data="stop_generation"))
+    return markup
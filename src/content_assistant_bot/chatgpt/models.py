@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Column, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, Column, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import relationship
 
 from ..models import Base, TimeStampMixin
@@ -21,6 +21,8 @@ class Message(Base, TimeStampMixin):
     """Message model"""
 
     __tablename__ = "chatgpt_messages"
+    # Serves the latest messages of a chat
+    __table_args__ = (Index("ix_chatgpt_messages_chat_id_id", "chat_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     chat_id = Column(Integer, ForeignKey("chatgpt_chats.id"))
@@ -30,3 +32,29 @@ class Message(Base, TimeStampMixin):
     # Define the relationship with Chat
     chat = relationship("Chat", back_populates="messages")
 
+
+
+class ChatSummary(Base, TimeStampMixin):
+    """Rolling summary of the older messages of a chat"""
+
+    __tablename__ = "chatgpt_summaries"
+
+    chat_id = Column(BigInteger, primary_key=True)
+    content = Column(Text, nullable=False)
+    # The last message folded into the summary
+    covered_message_id = Column(Integer, nullable=False)
+
+
+class DocumentChunk(Base, TimeStampMixin):
+    """A part of a document uploaded by a user, searched when the user asks a question"""
+
+    __tablename__ = "chatgpt_document_chunks"
+    # Loads the chunks of a user in upload order
+    __table_args__ = (Index("ix_chatgpt_document_chunks_user_id_id", "user_id", "id"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, nullable=False)
+    file_unique_id = Column(String, nullable=False)
+    file_name = Column(String, nullable=True)
+    position = Column(Integer, nullable=False)
+    content = Column(Text, nullable=False)
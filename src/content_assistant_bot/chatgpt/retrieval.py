@@ -0,0 +1,209 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+from omegaconf import OmegaConf
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from ..openai.vectors import rank, term_vectors
+from .models import DocumentChunk
+from .stream import split_point
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+
+class RetrievedChunk(BaseModel):  # noqa: D101
+    file_name: Optional[str]
+    content: str
+    score: float
+
+
+def chunk_text(text: str, chunk_chars: int) -> list[str]:
+    """Split a text into chunks of at most `chunk_chars`, keeping paragraphs together when they fit."""
+    chunks = []
+    current = ""
+    for raw_paragraph in re.split(r"\n\s*\n", text):
+        paragraph = raw_paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + 2 + len(paragraph) <= chunk_chars:
+            current += "\n\n" + paragraph
+            continue
+        if current:
+            chunks.append(current)
+        rest = paragraph
+        while len(rest) > chunk_chars:
+            cut = split_point(rest, chunk_chars)
+            chunks.append(rest[:cut].rstrip())
+            rest = rest[cut:].lstrip()
+        current = rest
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class IndexSnapshot(NamedTuple):
+    """The chunks of a user index at one point in time, never changed once built"""
+
+    ids: list[int]
+    files: list[str]
+    names: list[Optional[str]]
+    contents: list[str]
+    vectors: np.ndarray
+
+
+class UserIndex:
+    """
+    Term vectors of the document chunks of one user, in upload order.
+
+    Changes build a new snapshot and swap it in with one assignment, so a
+    search reads a consistent snapshot without a lock while a document is
+    being added. Changes themselves must not run concurrently.
+    """
+
+    def __init__(self, dimensions: int):  # noqa: D107
+        self.dimensions = dimensions
+        self.snapshot = IndexSnapshot([], [], [], [], np.zeros((0, dimensions), dtype=np.float32))
+
+    def add(self, ids: list[int], files: list[str], names: list[Optional[str]], contents: list[str]) -> None:
+        """Add chunks to the index."""
+        current = self.snapshot
+        self.snapshot = IndexSnapshot(
+            current.ids + ids, current.files + files, current.names + names, current.contents + contents,
+            np.vstack([current.vectors, term_vectors(contents, self.dimensions)]),
+        )
+
+    def trim(self, max_chunks: int) -> Optional[int]:
+        """Drop the oldest chunks beyond `max_chunks`, return the id of the last dropped one."""
+        current = self.snapshot
+        excess = len(current.ids) - max_chunks
+        if excess <= 0:
+            return None
+        self.snapshot = IndexSnapshot(
+            current.ids[excess:], current.files[excess:], current.names[excess:], current.contents[excess:],
+            current.vectors[excess:],
+        )
+        return current.ids[excess - 1]
+
+    def search(self, query: str, top_k: int, min_score: float) -> list[RetrievedChunk]:
+        """Return the chunks most similar to a query by TF-IDF cosine similarity, best first."""
+        snapshot = self.snapshot
+        return [
+            RetrievedChunk(file_name=snapshot.names[i], content=snapshot.contents[i], score=score)
+            for i, score in rank(snapshot.vectors, query, top_k, min_score)
+        ]
+
+
+class DocumentIndex:
+    """
+    Finds the parts of a user's documents that are relevant to a question.
+
+    Uploaded documents are split into chunks stored in the database, and a
+    question sends only the few chunks most similar to it instead of the
+    whole files. The term vectors of recently active users are kept in
+    memory, at most `max_chunks_per_user` chunks each.
+    """
+
+    def __init__(self, settings=None):  # noqa: D107
+        self.settings = settings or config.app.retrieval
+        self.users: OrderedDict[int, UserIndex] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _get(self, db_session: Session, user_id: int) -> UserIndex:
+        with self.lock:
+            index = self.users.get(user_id)
+            if index is not None:
+                self.users.move_to_end(user_id)
+                return index
+
+        rows = (
+            db_session.query(
+                DocumentChunk.id, DocumentChunk.file_unique_id, DocumentChunk.file_name, DocumentChunk.content
+            )
+            .filter(DocumentChunk.user_id == user_id)
+            .order_by(DocumentChunk.id.asc())
+            .all()
+        )
+        db_session.close()
+        index = UserIndex(self.settings.dimensions)
+        index.add(
+            [row.id for row in rows], [row.file_unique_id for row in rows],
+            [row.file_name for row in rows], [row.content for row in rows],
+        )
+
+        with self.lock:
+            index = self.users.setdefault(user_id, index)
+            self.users.move_to_end(user_id)
+            while len(self.users) > self.settings.max_users:
+                self.users.popitem(last=False)
+        return index
+
+    def add(self, db_session: Session, user_id: int, file_unique_id: str, file_name: Optional[str], text: str) -> int:
+        """
+        Split a document into chunks, store them and add them to the user's index.
+
+        Args:
+            db_session: The database session.
+            user_id: The user who uploaded the document.
+            file_unique_id: The Telegram file_unique_id of the document.
+            file_name: The name of the document.
+            text: The text content of the document.
+
+        Returns:
+            int: The number of chunks of the document.
+        """
+        index = self._get(db_session, user_id)
+        known = index.snapshot.files.count(file_unique_id)
+        if known:
+            return known
+
+        chunks = chunk_text(text, self.settings.chunk_chars)
+        db_chunks = [
+            DocumentChunk(
+                user_id=user_id, file_unique_id=file_unique_id, file_name=file_name, position=position, content=content
+            )
+            for position, content in enumerate(chunks)
+        ]
+        db_session.add_all(db_chunks)
+        db_session.flush()
+        ids = [db_chunk.id for db_chunk in db_chunks]
+
+        with self.lock:
+            index.add(ids, [file_unique_id] * len(chunks), [file_name] * len(chunks), chunks)
+            last_dropped = index.trim(self.settings.max_chunks_per_user)
+        if last_dropped is not None:
+            db_session.query(DocumentChunk).filter(
+                DocumentChunk.user_id == user_id, DocumentChunk.id <= last_dropped
+            ).delete(synchronize_session=False)
+        db_session.commit()
+        db_session.close()
+
+        logger.info(f"Indexed {len(chunks)} chunks of {file_name} for user {user_id}")
+        return len(chunks)
+
+    def search(self, db_session: Session, user_id: int, query: str) -> list[RetrievedChunk]:
+        """Return the chunks of the user's documents most relevant to a question."""
+        # Searches read the current snapshot, only adding documents takes the lock
+        return self._get(db_session, user_id).search(query, self.settings.top_k, self.settings.min_score)
+
+
+document_index = DocumentIndex()
+
+
+def with_documents(system_prompt: Optional[str], chunks: list[RetrievedChunk]) -> Optional[str]:
+    """Add the retrieved document chunks to a system prompt."""
+    if not chunks:
+        return system_prompt
+    excerpts = "\n\n".join(f"[{chunk.file_name or 'document'}]\n{chunk.content}" for chunk in chunks)
+    context = config.app.retrieval.prompt_prefix + excerpts
+    return f"{system_prompt}\n\n{context}" if system_prompt else context
@@ -1,7 +1,10 @@
 import logging
+from datetime import datetime
 
 from sqlalchemy.orm import Session
 
+from .. import openai
+from .history import recent_messages
 from .models import Chat, Message
 
 # Load logging configuration with OmegaConf
@@ -60,6 +63,39 @@ def read_chat_history(db_session: Session, chat_id: int) -> list[Message]:
     return result
 
 
+def read_recent_messages(db_session: Session, chat_id: int, limit: int) -> list[openai.schemas.Message]:
+    """
+    Retrieve the latest messages of a chat, oldest first.
+
+    The messages come from the in-memory ring buffer when it holds them,
+    otherwise only the tail of the chat is read from the database.
+
+    Args:
+        db_session (Session): The database session.
+        chat_id (int): The ID of the chat whose history to retrieve.
+        limit (int): The maximum number of messages.
+
+    Returns:
+        list[openai.schemas.Message]: The latest messages of the chat.
+    """
+    messages = recent_messages.get(chat_id, limit)
+    if messages is not None:
+        return messages
+
+    rows = (
+        db_session.query(Message.id, Message.chat_id, Message.role, Message.content, Message.created_at)
+        .filter(Message.chat_id == chat_id)
+        .order_by(Message.id.desc())
+        .limit(max(limit, recent_messages.capacity))
+        .all()
+    )
+    db_session.close()
+
+    messages = [openai.schemas.Message.model_validate(row._asdict()) for row in reversed(rows)]
+    recent_messages.load(chat_id, messages)
+    return messages[-limit:] if limit else []
+
+
 def delete_chat(db_session: Session, user_id: int, chat_id: int) -> None:
     """
     Delete a chat and all associated messages.
@@ -68,16 +104,15 @@ def delete_chat(db_session: Session, user_id: int, chat_id: int) -> None:
         user_id (int): The ID of the user who owns the chat.
         chat_id (int): The ID of the chat to delete.
     """
-    # First, delete the messages associated with the chat
-    db_messages = db_session.query(Message).filter(Message.chat_id == chat_id).all()
-    for message in db_messages:
-        db_session.delete(message)
+    # First, delete the messages associated with the chat, without loading their contents
+    db_session.query(Message).filter(Message.chat_id == chat_id).delete(synchronize_session=False)
 
     # Then, delete the chat
     db_chat = db_session.query(Chat).filter(Chat.id == chat_id, Chat.user_id == user_id).first()
     db_session.delete(db_chat)
     db_session.commit()
     db_session.close()
+    recent_messages.drop(chat_id)
 
 
 def create_message(db_session: Session, chat_id: int, role: str, content: str) -> Message:
@@ -98,3 +133,37 @@ def create_message(db_session: Session, chat_id: int, role: str, content: str) -
     db_session.refresh(db_message)
     db_session.close()
     return db_message
+
+
+def create_messages(db_session: Session, chat_id: int, turns: list[tuple[str, str]]) -> list[openai.schemas.Message]:
+    """
+    Create several messages of a chat in one transaction.
+
+    The messages are also added to the in-memory ring buffer of the chat.
+
+    Args:
+        chat_id (int): The ID of the chat to add the messages to.
+        turns (list[tuple[str, str]]): The role and the content of each message.
+
+    Returns:
+        list[openai.schemas.Message]: The created messages.
+    """
+    now = datetime.utcnow()
+    db_messages = [
+        Message(chat_id=chat_id, role=role, content=content, created_at=now, updated_at=now)
+        for role, content in turns
+    ]
+    db_session.add_all(db_messages)
+    # Flushing assigns the ids, so nothing has to be read back after the commit
+    db_session.flush()
+    messages = [
+        openai.schemas.Message(
+            id=db_message.id, chat_id=chat_id, role=db_message.role, content=db_message.content, created_at=now
+        )
+        for db_message in db_messages
+    ]
+    db_session.commit()
+    db_session.close()
+
+    recent_messages.append(chat_id, messages)
+    return messages
@@ -0,0 +1,197 @@
+import logging
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+from omegaconf import OmegaConf
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+
+class EditRateMeter:
+    """Counts message edits per chat over a sliding time window"""
+
+    def __init__(self, window_seconds: float):  # noqa: D107
+        self.window_seconds = window_seconds
+        self.edits: dict[int, deque[float]] = {}
+        self.lock = threading.Lock()
+
+    def _trim(self, edits: deque[float], now: float) -> None:
+        while edits and now - edits[0] > self.window_seconds:
+            edits.popleft()
+
+    def record(self, chat_id: int) -> None:
+        """Add an edit of a message in a chat."""
+        now = time.monotonic()
+        with self.lock:
+            edits = self.edits.setdefault(chat_id, deque())
+            edits.append(now)
+            self._trim(edits, now)
+
+    def snapshot(self) -> list[dict]:
+        """Return the edit rate of every chat with edits in the window."""
+        now = time.monotonic()
+        rows = []
+        with self.lock:
+            for chat_id, edits in list(self.edits.items()):
+                self._trim(edits, now)
+                if not edits:
+                    del self.edits[chat_id]
+                    continue
+                rows.append({
+                    "chat_id": chat_id,
+                    "edits": len(edits),
+                    "per_second": round(len(edits) / self.window_seconds, 3),
+                })
+        return rows
+
+
+edit_rates = EditRateMeter(config.app.stream.rate_window_seconds)
+
+
+def split_point(text: str, max_length: int) -> int:
+    """Return where to cut a text that is too long, preferring a line or word boundary."""
+    for separator in ("\n", " "):
+        index = text.rfind(separator, max_length // 2, max_length)
+        if index != -1:
+            return index + 1
+    return max_length
+
+
+class StreamRenderer:
+    """
+    Shows a streamed reply in Telegram messages.
+
+    Chunks are buffered and the message is edited at most once per
+    `interval` seconds, and only when its text changed. When the text grows
+    past `max_length` the full part stays in the current message and the
+    rest continues in a new one. `reply_markup` is kept on the message being
+    written and removed by `finish`, which always renders the final text.
+    The last text of a message is retried when Telegram asks to wait, and
+    sent as a new message if the edit still fails.
+    """
+
+    def __init__(  # noqa: D107
+        self, bot: TeleBot, chat_id: int,
+        interval: Optional[float] = None, max_length: Optional[int] = None,
+        placeholder: str = "...", meter: Optional[EditRateMeter] = None, reply_markup=None
+    ):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.interval = config.app.stream.edit_interval_seconds if interval is None else interval
+        self.max_length = max_length or config.app.stream.max_message_length
+        self.placeholder = placeholder
+        self.meter = meter or edit_rates
+        self.reply_markup = reply_markup
+
+        self.chunks: list[str] = []
+        self.pending: list[str] = []
+        self.current = ""
+        self.sent = placeholder
+        self.edits = 0
+        self.messages = 1
+        self.started = time.monotonic()
+        self.last_render = self.started
+        self.message_id = bot.send_message(chat_id, placeholder, reply_markup=reply_markup).message_id
+        self.markup_shown = reply_markup is not None
+
+    def append(self, text: str) -> None:
+        """Add a chunk of the reply and render it if the interval has passed."""
+        if not text:
+            return
+        self.chunks.append(text)
+        self.pending.append(text)
+        if time.monotonic() - self.last_render >= self.interval:
+            self.render()
+
+    def render(self, final: bool = False) -> None:
+        """Show the buffered text, moving on to new messages when it is too long."""
+        self.last_render = time.monotonic()
+        if self.pending:
+            self.current += "".join(self.pending)
+            self.pending.clear()
+
+        while len(self.current) > self.max_length:
+            cut = split_point(self.current, self.max_length)
+            head, self.current = self.current[:cut], self.current[cut:].lstrip()
+            # Only the message being written keeps the markup
+            self._settle(head.rstrip())
+            self.message_id = self.bot.send_message(
+                self.chat_id, self.placeholder, reply_markup=self.reply_markup
+            ).message_id
+            self.sent = self.placeholder
+            self.markup_shown = self.reply_markup is not None
+            self.messages += 1
+
+        if final:
+            self._settle(self.current or self.sent)
+        else:
+            self._edit(self.current or self.sent)
+
+    def _edit(self, text: str, with_markup: bool = True) -> None:
+        try:
+            self._try_edit(text, with_markup)
+        except Exception as e:
+            # The next render retries with the newer text
+            logger.error(f"Failed to edit message: {e}")
+
+    def _settle(self, text: str) -> None:
+        # No later render fixes the last text of a message, so it is retried and sent anew as a last resort
+        for attempt in range(config.app.stream.final_edit_retries + 1):
+            try:
+                self._try_edit(text, with_markup=False)
+                return
+            except ApiTelegramException as e:
+                if "message is not modified" in e.description:
+                    # Shown by an earlier edit whose answer was lost
+                    self.sent = text
+                    self.markup_shown = False
+                    return
+                logger.error(f"Failed to edit message: {e}")
+                if e.error_code != 429 or attempt == config.app.stream.final_edit_retries:
+                    break
+                time.sleep((e.result_json.get("parameters") or {}).get("retry_after", 1))
+            except Exception as e:
+                logger.error(f"Failed to edit message: {e}")
+                break
+
+        try:
+            self.message_id = self.bot.send_message(self.chat_id, text).message_id
+        except Exception as e:
+            logger.error(f"Failed to send the final text of a message: {e}")
+            return
+        self.sent = text
+        self.markup_shown = False
+        self.messages += 1
+
+    def _try_edit(self, text: str, with_markup: bool) -> None:
+        reply_markup = self.reply_markup if with_markup else None
+        if text == self.sent and (reply_markup is not None) == self.markup_shown:
+            return
+        self.bot.edit_message_text(
+            text, chat_id=self.chat_id, message_id=self.message_id, reply_markup=reply_markup
+        )
+        self.sent = text
+        self.markup_shown = reply_markup is not None
+        self.edits += 1
+        self.meter.record(self.chat_id)
+
+    def finish(self) -> str:
+        """Render the final text, remove the markup and return the whole reply."""
+        self.reply_markup = None
+        self.render(final=True)
+        elapsed = time.monotonic() - self.started
+        logger.info(
+            f"Streamed reply to chat {self.chat_id}: {self.edits} edits in {self.messages} messages "
+            f"over {elapsed:.1f}s ({self.edits / max(elapsed, 1e-3):.2f} edits/s)"
+        )
+        return "".join(self.chunks)
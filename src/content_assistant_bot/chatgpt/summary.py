@@ -0,0 +1,187 @@
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from omegaconf import OmegaConf
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from .. import openai
+from ..database.core import get_session
+from ..openai.budget import get_tokenizer
+from ..openai.client import LLM
+from .models import ChatSummary, Message
+from .service import read_recent_messages
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+# Summaries are written here, never on the reply path
+summary_executor = ThreadPoolExecutor(max_workers=config.app.summary.max_workers, thread_name_prefix="chat_summary")
+
+
+class ConversationSummary(BaseModel):  # noqa: D101
+    chat_id: int
+    content: str
+    covered_message_id: int
+
+
+class SummaryStore:
+    """Caches the summary of recently active chats, including chats that have none yet"""
+
+    def __init__(self, max_chats: int):  # noqa: D107
+        self.max_chats = max_chats
+        self.items: OrderedDict[int, Optional[ConversationSummary]] = OrderedDict()
+        self.in_progress: set[int] = set()
+        self.lock = threading.Lock()
+
+    def get(self, db_session: Session, chat_id: int) -> Optional[ConversationSummary]:
+        """Return the summary of a chat, reading it from the database once."""
+        with self.lock:
+            if chat_id in self.items:
+                self.items.move_to_end(chat_id)
+                return self.items[chat_id]
+
+        row = db_session.query(ChatSummary).filter(ChatSummary.chat_id == chat_id).first()
+        summary = (
+            ConversationSummary(chat_id=chat_id, content=row.content, covered_message_id=row.covered_message_id)
+            if row else None
+        )
+        db_session.close()
+        self.put(chat_id, summary)
+        return summary
+
+    def put(self, chat_id: int, summary: Optional[ConversationSummary]) -> None:
+        """Cache the summary of a chat."""
+        with self.lock:
+            self.items[chat_id] = summary
+            self.items.move_to_end(chat_id)
+            while len(self.items) > self.max_chats:
+                self.items.popitem(last=False)
+
+    def start(self, chat_id: int) -> bool:
+        """Mark a chat as being summarized, False if it already is."""
+        with self.lock:
+            if chat_id in self.in_progress:
+                return False
+            self.in_progress.add(chat_id)
+            return True
+
+    def finish(self, chat_id: int) -> None:
+        """Mark the summary of a chat as done."""
+        with self.lock:
+            self.in_progress.discard(chat_id)
+
+
+summaries = SummaryStore(config.app.history.max_chats)
+
+
+def build_memory(
+    db_session: Session, chat_id: int, limit: int
+) -> tuple[Optional[ConversationSummary], list[openai.schemas.Message]]:
+    """
+    Get the summary of a chat and the recent messages it does not cover yet.
+
+    Args:
+        db_session: The database session.
+        chat_id: The chat.
+        limit: The maximum number of recent messages.
+
+    Returns:
+        tuple: The summary, if any, and the recent messages, oldest first.
+    """
+    summary = summaries.get(db_session, chat_id)
+    messages = read_recent_messages(db_session, chat_id, limit)
+    if summary:
+        messages = [message for message in messages if message.id > summary.covered_message_id]
+    return summary, messages
+
+
+def with_summary(system_prompt: Optional[str], summary: Optional[ConversationSummary]) -> Optional[str]:
+    """Add the summary of the earlier conversation to a system prompt."""
+    if summary is None:
+        return system_prompt
+    memory = config.app.summary.prompt_prefix + summary.content
+    return f"{system_prompt}\n\n{memory}" if system_prompt else memory
+
+
+def schedule_summary(db_session: Session, chat_id: int) -> Optional[Future]:
+    """
+    Start folding older messages into the summary when the unsummarized history is too long.
+
+    Args:
+        db_session: The database session.
+        chat_id: The chat that just got new messages.
+
+    Returns:
+        Optional[Future]: The background job, if one was started.
+    """
+    settings = config.app.summary
+    if not settings.enabled:
+        return None
+
+    summary, messages = build_memory(db_session, chat_id, config.app.history.buffer_size)
+    if len(messages) <= settings.keep_messages:
+        return None
+    tokenizer = get_tokenizer(settings.llm.model_name)
+    tokens = sum(tokenizer.count(message.content) for message in messages)
+    if tokens < settings.trigger_tokens or not summaries.start(chat_id):
+        return None
+
+    logger.info(f"Summarizing chat {chat_id}: {len(messages)} messages, {tokens} tokens since the last summary")
+    return summary_executor.submit(fold_history, chat_id)
+
+
+def fold_history(chat_id: int) -> Optional[ConversationSummary]:
+    """
+    Fold the messages not covered by the summary, except the latest ones, into the summary.
+
+    Args:
+        chat_id: The chat to summarize.
+
+    Returns:
+        Optional[ConversationSummary]: The new summary, if one was written.
+    """
+    settings = config.app.summary
+    db_session = get_session()
+    try:
+        summary = summaries.get(db_session, chat_id)
+        covered = summary.covered_message_id if summary else 0
+        rows = (
+            db_session.query(Message.id, Message.role, Message.content)
+            .filter(Message.chat_id == chat_id, Message.id > covered)
+            .order_by(Message.id.asc())
+            .limit(settings.max_fold_messages + settings.keep_messages)
+            .all()
+        )
+        folded = rows[: -settings.keep_messages] if settings.keep_messages else rows
+        if not folded:
+            return None
+
+        transcript = "\n".join(f"{row.role}: {row.content}" for row in folded)
+        prompt = settings.user_prompt.format(summary=summary.content if summary else "-", messages=transcript)
+        llm = LLM(settings.llm, system_prompt=settings.llm.system_prompt, user_id=chat_id)
+        response = llm.invoke([
+            openai.schemas.Message(id=0, chat_id=chat_id, role="user", content=prompt, created_at=datetime.utcnow())
+        ])
+
+        new_summary = ConversationSummary(chat_id=chat_id, content=response.content, covered_message_id=folded[-1].id)
+        db_session.merge(ChatSummary(**new_summary.model_dump()))
+        db_session.commit()
+        summaries.put(chat_id, new_summary)
+        logger.info(f"Folded {len(folded)} messages of chat {chat_id} into its summary")
+        return new_summary
+    except Exception as e:
+        logger.error(f"Failed to summarize chat {chat_id}: {e}")
+        return None
+    finally:
+        summaries.finish(chat_id)
+        db_session.close()
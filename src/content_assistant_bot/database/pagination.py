@@ -0,0 +1,94 @@
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+# Cursors go into callback data, which Telegram limits to 64 bytes
+CURSOR_TIME_FORMAT = "%Y%m%d%H%M%S%f"
+
+
+class Page(NamedTuple):
+    """One page of a list, newest first"""
+
+    items: list
+    # Cursors to pass back for the neighbouring pages, None when there is none
+    previous_cursor: Optional[str]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(item) -> str:
+    """Encode the position of an item as `<created_at>-<id>`."""
+    return f"{item.created_at.strftime(CURSOR_TIME_FORMAT)}-{item.id}"
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Read the position encoded by `encode_cursor`."""
+    created_at, item_id = cursor.split("-")
+    return datetime.strptime(created_at, CURSOR_TIME_FORMAT), int(item_id)
+
+
+def paginate(query: Query, model, limit: int, cursor: Optional[str] = None, direction: str = "next") -> Page:
+    """
+    Read one page of a query by keyset pagination on (created_at, id).
+
+    Unlike OFFSET, the database seeks straight to the cursor through the
+    (owner_id, created_at, id) index, so deep pages cost as much as the
+    first one and rows added meanwhile do not shift the pages.
+
+    Args:
+        query: The query of the whole list, already filtered by owner.
+        model: The model with `created_at` and `id` columns.
+        limit: Items per page.
+        cursor: The cursor of the page to move away from, None for the first page.
+        direction: "next" for older items than the cursor, "prev" for newer ones.
+
+    Returns:
+        Page: The items, newest first, and the cursors of the neighbouring pages.
+    """
+    newer = direction == "prev"
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        if newer:
+            query = query.filter(or_(
+                model.created_at > created_at, and_(model.created_at == created_at, model.id > item_id)
+            ))
+        else:
+            query = query.filter(or_(
+                model.created_at < created_at, and_(model.created_at == created_at, model.id < item_id)
+            ))
+
+    if newer:
+        query = query.order_by(model.created_at.asc(), model.id.asc())
+    else:
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+
+    # One more row tells whether there is another page that way
+    rows = query.limit(limit + 1).all()
+    more = len(rows) > limit
+    items = rows[:limit]
+    if newer:
+        items.reverse()
+    if not items:
+        return Page(items, None, None)
+
+    has_previous = more if newer else cursor is not None
+    has_next = cursor is not None if newer else more
+    return Page(
+        items,
+        encode_cursor(items[0]) if has_previous else None,
+        encode_cursor(items[-1]) if has_next else None,
+    )
+
+
+def page_callback(prefix: str, direction: str, cursor: str) -> str:
+    """Build the callback data of a page button."""
+    return f"{prefix}_{direction}_{cursor}"
+
+
+def parse_page_callback(data: Optional[str], prefix: str) -> tuple[Optional[str], str]:
+    """Read the cursor and direction of a page button, or the first page for any other callback."""
+    if not data or not data.startswith(prefix + "_"):
+        return None, "next"
+    direction, cursor = data[len(prefix) + 1:].split("_", 1)
+    return cursor, direction
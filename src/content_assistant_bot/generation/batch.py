@@ -0,0 +1,136 @@
+import logging
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Optional
+
+from omegaconf import OmegaConf
+from sqlalchemy.orm import Session
+from telebot import TeleBot
+
+from ..account import service as account_services
+from ..database.core import get_session
+from ..posts.models import Post
+from .service import create_draft_posts, generate_for_style, read_style, read_style_examples
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+strings = config.strings
+
+# Batch jobs run here so that the handler thread is released right away
+jobs_executor = ThreadPoolExecutor(max_workers=config.app.batch.max_jobs, thread_name_prefix="batch_restyle")
+
+
+def split_texts(raw: str) -> list[str]:
+    """ Split an uploaded text into separate texts on separator lines """
+    separator = re.escape(config.app.batch.separator)
+    parts = re.split(rf"^\s*{separator}\s*$", raw, flags=re.MULTILINE)
+    return [part.strip() for part in parts if part.strip()][: config.app.batch.max_items]
+
+
+def read_post_texts(db_session: Session, owner_id: int) -> list[str]:
+    """ Get the contents of the latest posts of a user """
+    rows = (
+        db_session.query(Post.content)
+        .filter(Post.owner_id == owner_id, Post.content != "")
+        .order_by(Post.id.desc())
+        .limit(config.app.batch.max_items)
+        .all()
+    )
+    return [row.content for row in rows]
+
+
+def submit_batch_restyle(bot: TeleBot, user_id: int, lang: str, style_id: int, texts: list[str]) -> Optional[Future]:
+    """
+    Reserve a credit per text and start restyling the texts in the background.
+
+    Returns:
+        Optional[Future]: The running batch, None if the balance does not cover the texts.
+    """
+    reserved = len(texts)
+    if not account_services.reserve_credits(user_id, reserved, "batch_restyle"):
+        return None
+    logger.info(f"Queued batch restyle of {len(texts)} texts for user {user_id}")
+    try:
+        return jobs_executor.submit(run_batch_restyle, bot, user_id, lang, style_id, texts, reserved)
+    except Exception:
+        account_services.refund_credits(user_id, reserved, "batch_restyle")
+        raise
+
+
+def run_batch_restyle(
+    bot: TeleBot, user_id: int, lang: str, style_id: int, texts: list[str], reserved: int = 0
+) -> None:
+    """
+    Rewrite texts in a style and save the results as draft posts.
+
+    Texts are generated with bounded concurrency, progress is reported by
+    editing one message and the drafts are inserted in one statement. The
+    credits reserved when the batch was queued are settled once for all
+    created drafts, or given back if the batch fails.
+
+    Args:
+        bot: The Telegram bot instance.
+        user_id: The owner of the drafts.
+        lang: The user's language.
+        style_id: The style to apply.
+        texts: The texts to rewrite.
+        reserved: The credits reserved for the batch.
+    """
+    db_session = get_session()
+    settled = False
+    try:
+        style = read_style(db_session, style_id)
+        examples = read_style_examples(db_session, style)
+        total = len(texts)
+        progress_message = bot.send_message(user_id, strings[lang].batch_started.format(total=total))
+
+        results: list = [None] * total
+        done = 0
+        last_report = time.monotonic()
+        with ThreadPoolExecutor(max_workers=config.app.batch.max_concurrency) as executor:
+            futures = {executor.submit(generate_for_style, style, examples, text): index for index, text in enumerate(texts)}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to restyle text {futures[future]} for user {user_id}: {e}")
+                done += 1
+
+                if done < total and time.monotonic() - last_report >= config.app.batch.progress_interval_seconds:
+                    last_report = time.monotonic()
+                    try:
+                        bot.edit_message_text(
+                            strings[lang].batch_progress.format(done=done, total=total),
+                            chat_id=user_id, message_id=progress_message.message_id
+                        )
+                    except Exception as e:
+                        logger.error(f"Failed to report batch progress: {e}")
+
+        # An empty completion is not a draft, and is not paid for
+        generated = [result for result in results if result and result[0].strip()]
+        created = create_draft_posts(db_session, [content for content, _ in generated], style_id, user_id)
+
+        # Settle the reservation for all created drafts at once
+        used = sum(account_services.credits_for_usage(usage) for _, usage in generated)
+        debited = account_services.settle_reservation(user_id, reserved, used, "batch_restyle")
+        settled = True
+
+        bot.edit_message_text(
+            strings[lang].batch_finished.format(created=created, total=total, debited=debited),
+            chat_id=user_id, message_id=progress_message.message_id
+        )
+        logger.info(f"Batch restyle for user {user_id} created {created} of {total} drafts")
+    except Exception as e:
+        logger.error(f"Batch restyle for user {user_id} failed: {e}")
+        if not settled:
+            account_services.refund_credits(user_id, reserved, "batch_restyle")
+        bot.send_message(user_id, strings[lang].batch_failed)
+    finally:
+        db_session.close()
@@ -0,0 +1,85 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from omegaconf import OmegaConf
+
+from ..openai.vectors import rank, term_vectors
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+# Separator of the examples in the legacy Style.examples column
+LEGACY_SEPARATOR = "\n\n---\n\n"
+
+
+def example_hash(text: str) -> str:
+    """ Hash an example so that copies differing only in case or spacing are found """
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def encode_vector(text: str) -> bytes:
+    """ Compute the stored term vector of an example """
+    return term_vectors([text], config.app.examples.dimensions)[0].tobytes()
+
+
+class StyleExamples:
+    """ The examples of one style with their term vectors """
+
+    def __init__(self, contents: list[str], vectors: list[Optional[bytes]]):  # noqa: D107
+        self.contents = contents
+        dimensions = config.app.examples.dimensions
+        rows = [
+            np.frombuffer(vector, dtype=np.float32)
+            if vector is not None and len(vector) == dimensions * 4
+            # Stored before the dimensions changed, or never computed
+            else term_vectors([content], dimensions)[0]
+            for content, vector in zip(contents, vectors, strict=True)
+        ]
+        self.vectors = np.vstack(rows) if rows else np.zeros((0, dimensions), dtype=np.float32)
+
+    def select(self, content: str, k: Optional[int] = None) -> list[str]:
+        """ Return the k examples most similar to the input text, most similar first """
+        k = k or config.app.examples.top_k
+        if len(self.contents) <= k:
+            return list(self.contents)
+        ranked = rank(self.vectors, content, k)
+        if not ranked:
+            # Nothing in common with the input, the first examples still show the style
+            return self.contents[:k]
+        return [self.contents[i] for i, _ in ranked]
+
+
+class StyleExamplesCache:
+    """ LRU cache of the loaded examples of recently used styles """
+
+    def __init__(self, max_styles: int):  # noqa: D107
+        self.max_styles = max_styles
+        self.items: OrderedDict[int, StyleExamples] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, style_id: int) -> Optional[StyleExamples]:  # noqa: D102
+        with self.lock:
+            examples = self.items.get(style_id)
+            if examples is not None:
+                self.items.move_to_end(style_id)
+            return examples
+
+    def put(self, style_id: int, examples: StyleExamples) -> None:  # noqa: D102
+        with self.lock:
+            self.items[style_id] = examples
+            self.items.move_to_end(style_id)
+            while len(self.items) > self.max_styles:
+                self.items.popitem(last=False)
+
+    def drop(self, style_id: int) -> None:  # noqa: D102
+        with self.lock:
+            self.items.pop(style_id, None)
+
+
+style_examples_cache = StyleExamplesCache(config.app.examples.max_cached_styles)
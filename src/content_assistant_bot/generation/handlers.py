@@ -3,27 +3,34 @@ from datetime import datetime
 from pathlib import Path
 
 from omegaconf import OmegaConf
+from sqlalchemy.orm import Session
 from telebot import TeleBot, types
 from telebot.states import State, StatesGroup
 
-from ..account import service as account_services
 from ..database.core import get_session
+from ..database.pagination import parse_page_callback
+from ..openai.files import file_cache
+from .batch import read_post_texts, split_texts, submit_batch_restyle
+from .jobs import generation_queue
 from .markup import (
+    create_batch_source_markup,
     create_cancel_button,
     create_generation_menu_markup,
     create_post_actions_markup,
     create_style_list_markup,
-    create_style_options_markup
+    create_style_options_markup,
+    create_variants_markup
 )
+from .models import GenerationJob
 from .service import (
     create_post,
     create_style,
     edit_content,
-    generate_with_style,
     publish_post,
     read_post,
     read_style,
-    read_styles_by_owner,
+    read_style_examples,
+    read_styles_page,
     schedule_post,
     update_post,
     delete_style
@@ -40,6 +47,9 @@ strings = config.strings
 # Load the database session
 db_session = get_session()
 
+# Telegram rejects longer messages
+MESSAGE_MAX_LENGTH = 4096
+
 # Define States
 class GenerationState(StatesGroup):
     """ Generation states """
@@ -53,6 +63,7 @@ class GenerationState(StatesGroup):
     post_title = State()
     post_schedule = State()
     post_actions = State()
+    batch_texts = State()
 
 
 def create_post_list_markup(lang, posts):
@@ -65,6 +76,18 @@ def create_post_list_markup(lang, posts):
     return markup
 
 
+def format_variants(lang: str, drafts: list[str]) -> str:
+    """ Put all drafts into one message, shortening each so that the message fits """
+    header = strings[lang].variants_preview
+    titles = [strings[lang].variant_title.format(number=index + 1) for index in range(len(drafts))]
+    room = (MESSAGE_MAX_LENGTH - len(header) - sum(len(title) + 4 for title in titles)) // max(len(drafts), 1)
+    parts = [
+        f"{title}\n{draft if len(draft) <= room else draft[: room - 1] + '…'}"
+        for title, draft in zip(titles, drafts, strict=True)
+    ]
+    return "\n\n".join([header, *parts])
+
+
 def register_handlers(bot: TeleBot):
     """Register generation handlers"""
     logger.info("Registering generation handlers")
@@ -111,7 +134,9 @@ def register_handlers(bot: TeleBot):
         
         # Show style details
         style_description = f"{strings[user.lang].style_name}: {style.name}\n\n"
-        style_description += f"{strings[user.lang].style_examples}:\n{style.examples[:200]}..."
+        examples = read_style_examples(db_session, style).contents
+        preview = examples[0][:200] if examples else ""
+        style_description += f"{strings[user.lang].style_examples} ({len(examples)}):\n{preview}..."
         
         bot.edit_message_text(
             chat_id=user.id,
@@ -140,7 +165,8 @@ def register_handlers(bot: TeleBot):
         
         if success:
             # Return to styles list
-            styles = read_styles_by_owner(db_session, user.id)
+            page = read_styles_page(db_session, user.id)
+            styles = page.items
             
             if not styles:
                 markup = types.InlineKeyboardMarkup()
@@ -154,7 +180,7 @@ def register_handlers(bot: TeleBot):
                     reply_markup=markup
                 )
             else:
-                markup = create_style_list_markup(user.lang, styles)
+                markup = create_style_list_markup(user.lang, styles, page)
                 
                 bot.edit_message_text(
                     chat_id=user.id,
@@ -166,12 +192,17 @@ def register_handlers(bot: TeleBot):
             bot.answer_callback_query(call.id, strings[user.lang].style_delete_failed)
 
     # Now modify the style selection handler to use view_style instead of directly using the style
-    @bot.callback_query_handler(func=lambda call: call.data == "select_style")
+    @bot.callback_query_handler(func=lambda call: call.data == "select_style" or call.data.startswith("styles_page_"))
     def select_style(call: types.CallbackQuery, data: dict):
         user = data["user"]
         data["state"].set(GenerationState.select_style)
 
-        styles = read_styles_by_owner(db_session, user.id)
+        # Page buttons carry a cursor, "select_style" opens the newest page
+        cursor, direction = parse_page_callback(call.data, "styles_page")
+        page = read_styles_page(db_session, user.id, cursor, direction)
+        if cursor and not page.items:
+            page = read_styles_page(db_session, user.id)
+        styles = page.items
         
         if not styles:
             markup = types.InlineKeyboardMarkup()
@@ -186,7 +217,7 @@ def register_handlers(bot: TeleBot):
             )
             return
         
-        markup = create_style_list_markup(user.lang, styles)
+        markup = create_style_list_markup(user.lang, styles, page)
         
         bot.edit_message_text(
             chat_id=user.id,
@@ -205,7 +236,7 @@ def register_handlers(bot: TeleBot):
             bot.answer_callback_query(call.id, strings[user.lang].style_not_found)
             return
         
-        data["state"].add_data(style_id=style_id)
+        data["state"].add_data(style_id=style_id, variants=1)
         data["state"].set(GenerationState.post_content)
         
         bot.edit_message_text(
@@ -215,6 +246,123 @@ def register_handlers(bot: TeleBot):
             reply_markup=create_cancel_button(user.lang)
         )
 
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("variants_style_"))
+    def use_style_variants(call: types.CallbackQuery, data: dict):
+        user = data["user"]
+        style_id = int(call.data.split("_")[2])
+        style = read_style(db_session, style_id)
+
+        if not style:
+            bot.answer_callback_query(call.id, strings[user.lang].style_not_found)
+            return
+
+        data["state"].add_data(style_id=style_id, variants=config.app.variants.count)
+        data["state"].set(GenerationState.post_content)
+
+        bot.edit_message_text(
+            chat_id=user.id,
+            message_id=call.message.message_id,
+            text=strings[user.lang].enter_post_content.format(style_name=style.name),
+            reply_markup=create_cancel_button(user.lang)
+        )
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("pick_variant_"))
+    def pick_variant(call: types.CallbackQuery, data: dict):
+        user = data["user"]
+        index = int(call.data.split("_")[2])
+
+        with data["state"].data() as state_data:
+            drafts = state_data.pop("drafts", None) or []
+            style_id = state_data.get("style_id")
+
+        if index >= len(drafts):
+            bot.answer_callback_query(call.id, strings[user.lang].variants_expired)
+            return
+
+        # Only the chosen draft is kept
+        post = create_post(db_session, title="", content=drafts[index], style_id=style_id, owner_id=user.id)
+
+        bot.edit_message_text(
+            chat_id=user.id,
+            message_id=call.message.message_id,
+            text=strings[user.lang].post_preview + "\n\n" + post.content,
+            reply_markup=create_post_actions_markup(user.lang, post.id)
+        )
+        data["state"].set(GenerationState.post_actions)
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("batch_style_"))
+    def batch_style_menu(call: types.CallbackQuery, data: dict):
+        user = data["user"]
+        style_id = int(call.data.split("_")[2])
+        style = read_style(db_session, style_id)
+
+        if not style:
+            bot.answer_callback_query(call.id, strings[user.lang].style_not_found)
+            return
+
+        bot.edit_message_text(
+            chat_id=user.id,
+            message_id=call.message.message_id,
+            text=strings[user.lang].batch_menu.format(style_name=style.name),
+            reply_markup=create_batch_source_markup(user.lang, style_id)
+        )
+
+    def start_batch_restyle(user, style_id: int, texts: list[str], data: dict):
+        """ Reserve the credits and hand the texts over to a background batch job """
+        if not texts:
+            bot.send_message(user.id, strings[user.lang].batch_no_texts, reply_markup=create_generation_menu_markup(user.lang))
+            return
+
+        if submit_batch_restyle(bot, user.id, user.lang, style_id, texts) is None:
+            bot.send_message(
+                user.id,
+                strings[user.lang].batch_not_enough_balance.format(required=len(texts), balance=user.balance),
+                reply_markup=create_generation_menu_markup(user.lang)
+            )
+            return
+
+        data["state"].set(GenerationState.menu)
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("batch_posts_"))
+    def batch_saved_posts(call: types.CallbackQuery, data: dict):
+        user = data["user"]
+        style_id = int(call.data.split("_")[2])
+
+        texts = read_post_texts(db_session, user.id)
+        start_batch_restyle(user, style_id, texts, data)
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("batch_upload_"))
+    def batch_upload(call: types.CallbackQuery, data: dict):
+        user = data["user"]
+        style_id = int(call.data.split("_")[2])
+
+        data["state"].add_data(style_id=style_id)
+        data["state"].set(GenerationState.batch_texts)
+
+        bot.edit_message_text(
+            chat_id=user.id,
+            message_id=call.message.message_id,
+            text=strings[user.lang].enter_batch_texts,
+            reply_markup=create_cancel_button(user.lang)
+        )
+
+    @bot.message_handler(content_types=["text", "document"], state=GenerationState.batch_texts)
+    def process_batch_texts(message: types.Message, data: dict):
+        user = data["user"]
+
+        if message.content_type == "document":
+            raw_texts = str(
+                file_cache.get_bytes(bot, message.document.file_id, message.document.file_unique_id),
+                "utf-8", errors="ignore"
+            )
+        else:
+            raw_texts = message.text
+
+        with data["state"].data() as state_data:
+            style_id = state_data["style_id"]
+
+        start_batch_restyle(user, style_id, split_texts(raw_texts), data)
+
     @bot.callback_query_handler(func=lambda call: call.data == "create_style")
     def create_style_start(call: types.CallbackQuery, data: dict):
         user = data["user"]
@@ -223,7 +371,7 @@ def register_handlers(bot: TeleBot):
         
         markup = types.InlineKeyboardMarkup(row_width=1)
         markup.add(
-            types.InlineKeyboardButton(strings[user.lang].done, callback_data="style_examples_done"),
+            types.InlineKeyboardButton(strings[user.lang].done, callback_data="create_style_examples_done"),
             types.InlineKeyboardButton(strings[user.lang].cancel, callback_data="generation_menu")
         )
         
@@ -237,20 +385,18 @@ def register_handlers(bot: TeleBot):
     @bot.message_handler(state=GenerationState.style_examples)
     def process_style_examples(message: types.Message, data: dict):
         user = data["user"]
-        print("BLAH")
+        max_examples = config.app.examples.max_examples
         with data["state"].data() as state_data:
             # Append new example to the list
             examples = state_data.get("examples", [])
             examples.append(message.text)
             state_data["examples"] = examples
-        
-        # Limit to 10 examples
+
+        # Only the examples closest to each input go into a prompt, so a style can collect many
         example_count = len(examples)
-        
-        if example_count >= 10:
+
+        if example_count >= max_examples:
             # If we reached limit, proceed to next state
-            concatenated_examples = "\n\n---\n\n".join(examples)
-            state_data["examples"] = concatenated_examples
             data["state"].set(GenerationState.style_name)
             
             bot.send_message(
@@ -268,7 +414,7 @@ def register_handlers(bot: TeleBot):
             
             bot.send_message(
                 user.id,
-                strings[user.lang].example_added.format(count=example_count, max=10),
+                strings[user.lang].example_added.format(count=example_count, max=max_examples),
                 reply_markup=markup
             )
 
@@ -281,12 +427,6 @@ def register_handlers(bot: TeleBot):
             if not examples:
                 bot.answer_callback_query(call.id, strings[user.lang].no_examples)
                 return
-            
-            print("examples", examples)
-            # Join all examples with separators
-            concatenated_examples = "\n\n---\n\n".join(examples)
-        
-        data["state"].add_data(concatenated_examples=concatenated_examples)
 
         data["state"].set(GenerationState.style_name)
         
@@ -304,12 +444,12 @@ def register_handlers(bot: TeleBot):
 
         with data["state"].data() as state_data:
             name = state_data["name"]
-            concatenated_examples = state_data["concatenated_examples"]
-            
+            examples = state_data.get("examples", [])
+
         style = create_style(
             db_session,
             name=name,
-            examples=concatenated_examples,
+            examples=examples,
             owner_id=user.id
         )
 
@@ -323,59 +463,73 @@ def register_handlers(bot: TeleBot):
         data["state"].set(GenerationState.menu)
 
 
+    def deliver_job(job: GenerationJob, drafts: list[str], job_session: Session) -> None:
+        # Runs in a queue worker, which must not share the session of the handlers
+        if job.variants > 1:
+            # All drafts come from one request, the user keeps one of them
+            try:
+                bot.add_data(job.user_id, job.user_id, drafts=drafts)
+            except RuntimeError as e:
+                # The user left the generation menu while the job was queued
+                logger.warning(f"Could not keep the drafts of job {job.id}: {e}")
+            bot.send_message(
+                job.user_id,
+                format_variants(job.lang, drafts),
+                reply_markup=create_variants_markup(job.lang, len(drafts))
+            )
+            return
+
+        # Create a draft post
+        post = create_post(
+            job_session,
+            title="",  # Empty title initially
+            content=drafts[0],
+            style_id=job.style_id,
+            owner_id=job.user_id
+        )
+        bot.send_message(
+            job.user_id,
+            strings[job.lang].post_preview + "\n\n" + drafts[0],
+            reply_markup=create_post_actions_markup(job.lang, post.id)
+        )
+
+    def fail_job(job: GenerationJob) -> None:
+        bot.send_message(
+            job.user_id,
+            strings[job.lang].generation_failed,
+            reply_markup=create_generation_menu_markup(job.lang)
+        )
+
+    generation_queue.start(deliver_job, fail_job)
+
     @bot.message_handler(state=GenerationState.post_content)
     def process_post_content(message: types.Message, data: dict):
         user = data["user"]
 
         with data["state"].data() as state_data:
             style_id = state_data["style_id"]
+            variants = state_data.get("variants", 1)
 
-            try:
-                # Check user balance
-                if user.balance < 1:
-                    bot.send_message(
-                        user.id,
-                        strings[user.lang].not_enough_balance,
-                        reply_markup=create_generation_menu_markup(user.lang)
-                    )
-                    data["state"].set(GenerationState.menu)
-                    return
-
-                # Send please wait message
-                bot.send_message(
-                    user.id,
-                    strings[user.lang].please_wait
-                )
-
-                # Generate content based on style
-                generated_content = generate_with_style(message.text, style_id, db_session)
-
-                # Create a draft post
-                post = create_post(
-                    db_session,
-                    title="",  # Empty title initially
-                    content=generated_content,
-                    style_id=style_id,
-                    owner_id=user.id
-                )
+        try:
+            # The credit is reserved now and the draft arrives when a worker has generated it
+            position = generation_queue.submit(user.id, user.lang, style_id, message.text, variants)
+        except Exception as e:
+            bot.send_message(
+                user.id,
+                f"Error: {e}"
+            )
+            return
 
-                markup = create_post_actions_markup(user.lang, post.id)
+        if position is None:
+            bot.send_message(
+                user.id,
+                strings[user.lang].not_enough_balance,
+                reply_markup=create_generation_menu_markup(user.lang)
+            )
+            data["state"].set(GenerationState.menu)
+            return
 
-                bot.send_message(
-                    user.id,
-                    strings[user.lang].post_preview + "\n\n" + generated_content,
-                    reply_markup=markup
-                )
-                
-                # debit user balance
-                # Debit balance
-                account_services.debit_balance(user.id, 1)
-        
-            except Exception as e:
-                bot.send_message(
-                    user.id,
-                    f"Error: {e}"
-                )
+        bot.send_message(user.id, strings[user.lang].generation_queued.format(position=position))
         data["state"].set(GenerationState.post_actions)
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith("edit_post_"))
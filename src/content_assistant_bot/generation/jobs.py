@@ -0,0 +1,209 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Optional
+
+from omegaconf import OmegaConf
+from sqlalchemy.orm import Session
+
+from ..account import service as account_services
+from ..database.core import get_session
+from .models import GenerationJob
+from .service import generate_variants_with_style, generate_with_style
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+
+class GenerationQueue:
+    """
+    Runs post generations in worker threads instead of bot handlers.
+
+    A job is stored in `generation_jobs` together with the credits reserved
+    for it, so a handler only reserves and enqueues and replies right away.
+    A worker generates the drafts, hands them to `deliver` with its own
+    database session and settles the reservation for the credits actually
+    used; a failed job is refunded and reported through `fail`. Jobs left
+    unfinished by a restart are queued again on `start`.
+    """
+
+    def __init__(self, settings=None, session_factory: Callable[[], Session] = get_session):  # noqa: D107
+        self.settings = settings or config.app.jobs
+        self.session_factory = session_factory
+        self.jobs: queue.Queue[int] = queue.Queue()
+        # Enqueue time of the jobs that did not start yet
+        self.enqueued: dict[int, float] = {}
+        self.waits: deque[float] = deque(maxlen=self.settings.wait_window)
+        self.running = 0
+        self.lock = threading.Lock()
+        self.deliver: Optional[Callable[[GenerationJob, list[str], Session], None]] = None
+        self.fail: Optional[Callable[[GenerationJob], None]] = None
+        self.workers: list[threading.Thread] = []
+
+    def start(
+        self, deliver: Callable[[GenerationJob, list[str], Session], None], fail: Callable[[GenerationJob], None]
+    ) -> None:
+        """ Start the workers and queue the jobs that were not finished """
+        self.deliver = deliver
+        self.fail = fail
+        if self.workers:
+            return
+
+        db_session = self.session_factory()
+        try:
+            unfinished = (
+                db_session.query(GenerationJob.id, GenerationJob.created_at)
+                .filter(GenerationJob.status.in_(["queued", "running"]))
+                .order_by(GenerationJob.id.asc())
+                .all()
+            )
+            if unfinished:
+                db_session.query(GenerationJob).filter(GenerationJob.id.in_([row.id for row in unfinished])).update(
+                    {GenerationJob.status: "queued"}, synchronize_session=False
+                )
+                db_session.commit()
+        except Exception as e:
+            logger.error(f"Could not read unfinished generation jobs: {e}")
+            unfinished = []
+        finally:
+            db_session.close()
+
+        now = time.time()
+        for row in unfinished:
+            # created_at is naive UTC
+            created = row.created_at.replace(tzinfo=UTC).timestamp() if row.created_at else now
+            self._put(row.id, min(created, now))
+        if unfinished:
+            logger.info(f"Queued {len(unfinished)} unfinished generation jobs again")
+
+        for index in range(self.settings.workers):
+            worker = threading.Thread(target=self._work, name=f"generation_job_{index}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, user_id: int, lang: str, style_id: int, content: str, variants: int = 1) -> Optional[int]:
+        """
+        Reserve credits for a generation and queue it.
+
+        Returns:
+            Optional[int]: The position of the job in the queue, None if the balance is too low.
+        """
+        reserved = self.settings.reserve_credits
+        if not account_services.reserve_credits(user_id, reserved):
+            return None
+
+        db_session = self.session_factory()
+        try:
+            job = GenerationJob(
+                user_id=user_id, lang=lang, style_id=style_id, content=content,
+                variants=variants, status="queued", reserved_credits=reserved,
+            )
+            db_session.add(job)
+            db_session.commit()
+            job_id = job.id
+        except Exception:
+            account_services.refund_credits(user_id, reserved)
+            raise
+        finally:
+            db_session.close()
+
+        position = self.jobs.qsize() + 1
+        self._put(job_id, time.time())
+        logger.info(f"Queued generation job {job_id} for user {user_id}")
+        return position
+
+    def _put(self, job_id: int, enqueued_at: float) -> None:
+        with self.lock:
+            self.enqueued[job_id] = enqueued_at
+        self.jobs.put(job_id)
+
+    def _work(self) -> None:
+        while True:
+            job_id = self.jobs.get()
+            with self.lock:
+                enqueued_at = self.enqueued.pop(job_id, None)
+                if enqueued_at is not None:
+                    self.waits.append(time.time() - enqueued_at)
+                self.running += 1
+            try:
+                self.run(job_id)
+            except Exception as e:
+                logger.error(f"Generation job {job_id} crashed: {e}")
+            finally:
+                with self.lock:
+                    self.running -= 1
+                self.jobs.task_done()
+
+    def run(self, job_id: int) -> None:
+        """ Generate the drafts of a job, deliver them and settle its credits """
+        db_session = self.session_factory()
+        try:
+            # Only one worker can move a job out of the queued status
+            claimed = (
+                db_session.query(GenerationJob)
+                .filter(GenerationJob.id == job_id, GenerationJob.status == "queued")
+                .update(
+                    {GenerationJob.status: "running", GenerationJob.started_at: datetime.utcnow()},
+                    synchronize_session=False,
+                )
+            )
+            db_session.commit()
+            if not claimed:
+                return
+            job = db_session.query(GenerationJob).filter(GenerationJob.id == job_id).first()
+
+            try:
+                if job.variants > 1:
+                    drafts, usage = generate_variants_with_style(job.content, job.style_id, db_session, job.variants)
+                else:
+                    content, usage = generate_with_style(job.content, job.style_id, db_session)
+                    drafts = [content]
+                self.deliver(job, drafts, db_session)
+            except Exception as e:
+                logger.error(f"Generation job {job_id} failed: {e}")
+                account_services.refund_credits(job.user_id, job.reserved_credits, f"generation_job:{job_id}")
+                job.status = "failed"
+                job.error = str(e)
+                job.debited_credits = 0
+                try:
+                    self.fail(job)
+                except Exception as e:
+                    logger.error(f"Could not report failed generation job {job_id}: {e}")
+            else:
+                used = account_services.credits_for_usage(usage)
+                job.debited_credits = account_services.settle_reservation(
+                    job.user_id, job.reserved_credits, used, f"generation_job:{job_id}"
+                )
+                job.status = "done"
+            job.finished_at = datetime.utcnow()
+            db_session.commit()
+        finally:
+            db_session.close()
+
+    def snapshot(self) -> dict:
+        """ Return the queue depth and how long recent jobs waited for a worker """
+        now = time.time()
+        with self.lock:
+            waits = sorted(self.waits)
+            oldest = min(self.enqueued.values(), default=None)
+            running = self.running
+        return {
+            "depth": self.jobs.qsize(),
+            "running": running,
+            "oldest_wait_seconds": round(now - oldest, 1) if oldest is not None else 0,
+            "wait_p50_seconds": round(waits[len(waits) // 2], 2) if waits else 0,
+            "wait_max_seconds": round(waits[-1], 2) if waits else 0,
+        }
+
+
+generation_queue = GenerationQueue()
@@ -1,9 +1,12 @@
 import logging
 from pathlib import Path
+from typing import Optional
 
 from omegaconf import OmegaConf
 from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from ..database.pagination import Page, page_callback
+
 
 # Load configuration
 CURRENT_DIR = Path(__file__).parent
@@ -41,11 +44,23 @@ def create_post_actions_markup(lang, post_id):
     return markup
 
 
-def create_style_list_markup(lang, styles):
-    """ Create markup with list of styles """
+def create_style_list_markup(lang, styles, page: Optional[Page] = None):
+    """ Create markup with list of styles, with page buttons when there are more styles """
     markup = InlineKeyboardMarkup(row_width=1)
     for style in styles:
         markup.add(InlineKeyboardButton(style.name, callback_data=f"view_style_{style.id}"))
+    # The cursors of the neighbouring pages travel in the callback data
+    buttons = []
+    if page and page.previous_cursor:
+        buttons.append(InlineKeyboardButton(
+            strings[lang].previous_page, callback_data=page_callback("styles_page", "prev", page.previous_cursor)
+        ))
+    if page and page.next_cursor:
+        buttons.append(InlineKeyboardButton(
+            strings[lang].next_page, callback_data=page_callback("styles_page", "next", page.next_cursor)
+        ))
+    if buttons:
+        markup.row(*buttons)
     markup.add(InlineKeyboardButton(strings[lang].back, callback_data="generation_menu"))
     return markup
 
@@ -61,7 +76,31 @@ def create_style_options_markup(lang: str, style_id: int) -> InlineKeyboardMarku
     markup = InlineKeyboardMarkup(row_width=1)
     markup.add(
         InlineKeyboardButton(strings[lang].use_style, callback_data=f"style_{style_id}"),
+        InlineKeyboardButton(strings[lang].use_style_variants, callback_data=f"variants_style_{style_id}"),
+        InlineKeyboardButton(strings[lang].batch_restyle, callback_data=f"batch_style_{style_id}"),
         InlineKeyboardButton(strings[lang].delete_style, callback_data=f"delete_style_{style_id}"),
         InlineKeyboardButton(strings[lang].back, callback_data="select_style")
     )
-    return markup
\ No newline at end of file
+    return markup
+
+
+def create_batch_source_markup(lang: str, style_id: int) -> InlineKeyboardMarkup:
+    """ Create markup to choose what to restyle in a batch """
+    markup = InlineKeyboardMarkup(row_width=1)
+    markup.add(
+        InlineKeyboardButton(strings[lang].batch_saved_posts, callback_data=f"batch_posts_{style_id}"),
+        InlineKeyboardButton(strings[lang].batch_upload, callback_data=f"batch_upload_{style_id}"),
+        InlineKeyboardButton(strings[lang].back, callback_data=f"view_style_{style_id}")
+    )
+    return markup
+
+
+def create_variants_markup(lang: str, count: int) -> InlineKeyboardMarkup:
+    """ Create markup to pick one of the generated drafts """
+    markup = InlineKeyboardMarkup(row_width=count)
+    markup.add(*[
+        InlineKeyboardButton(strings[lang].pick_variant.format(number=index + 1), callback_data=f"pick_variant_{index}")
+        for index in range(count)
+    ])
+    markup.add(InlineKeyboardButton(strings[lang].cancel, callback_data="generation_menu"))
+    return markup
@@ -1,18 +1,67 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import deferred
 
-from ..auth.models import User
+from ..auth.models import User  # noqa: F401 - registers the table styles.owner_id refers to
 from ..models import Base, TimeStampMixin
 
 
 class Style(Base, TimeStampMixin):
     """ Style model for storing post generation styles """
     __tablename__ = "styles"
+    # Serves the pages of a user's styles
+    __table_args__ = (Index("ix_styles_owner_id_created_at_id", "owner_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
-    examples = Column(Text, nullable=True)  # JSON-serialized examples or references
+    # Legacy examples joined by "---", moved to style_examples on first use and only loaded then
+    examples = deferred(Column(Text, nullable=True))
     owner_id = Column(Integer, ForeignKey("users.id"))
 
     #owner = relationship("User")
     #posts = relationship("Post", back_populates="style")
+
+
+class StyleExample(Base, TimeStampMixin):
+    """ One example post of a style """
+    __tablename__ = "style_examples"
+    # The same text is stored once per style
+    __table_args__ = (UniqueConstraint("style_id", "content_hash", name="uq_style_examples_style_id_hash"),)
+
+    id = Column(Integer, primary_key=True)
+    style_id = Column(Integer, ForeignKey("styles.id"), nullable=False, index=True)
+    content = Column(Text, nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    # Hashed term frequencies as float32 bytes, compared with the input text
+    vector = Column(LargeBinary, nullable=True)
+
+
+class GenerationJob(Base, TimeStampMixin):
+    """ A queued request to generate a post, with the credits reserved for it """
+    __tablename__ = "generation_jobs"
+    # Finds unfinished jobs after a restart
+    __table_args__ = (Index("ix_generation_jobs_status_id", "status", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, nullable=False)
+    lang = Column(String, nullable=False)
+    style_id = Column(Integer, ForeignKey("styles.id"), nullable=False)
+    content = Column(Text, nullable=False)
+    variants = Column(Integer, nullable=False, default=1)
+    # queued, running, done or failed
+    status = Column(String, nullable=False, default="queued")
+    reserved_credits = Column(Integer, nullable=False, default=0)
+    debited_credits = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -4,13 +4,17 @@ import random
 from typing import List, Optional
 from pathlib import Path
 
-from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, load_only
 from omegaconf import OmegaConf
 
+from ..database.pagination import Page, paginate
 from ..posts.models import Post
-from .models import Style
+from .examples import LEGACY_SEPARATOR, StyleExamples, encode_vector, example_hash, style_examples_cache
+from .models import Style, StyleExample
 from ..openai.client import LLM
 from ..openai import schemas as openai_schemas
+from ..openai.schemas import LLMCallUsage
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -23,11 +27,10 @@ strings = config.strings
 
 
 # Style services
-def create_style(db_session: Session, name: str, examples: str, owner_id: int) -> Style:
-    """ Create a new style """
+def create_style(db_session: Session, name: str, examples: list[str], owner_id: int) -> Style:
+    """ Create a new style with its examples """
     style = Style(
         name=name,
-        examples=examples,
         owner_id=owner_id,
         created_at=datetime.now(),
         updated_at=datetime.now()
@@ -35,9 +38,63 @@ def create_style(db_session: Session, name: str, examples: str, owner_id: int) -
     db_session.add(style)
     db_session.commit()
     db_session.refresh(style)
+    add_style_examples(db_session, style.id, examples)
     return style
 
 
+def add_style_examples(db_session: Session, style_id: int, examples: list[str]) -> int:
+    """ Store new examples of a style with their vectors and return how many were added """
+    known = {
+        row.content_hash
+        for row in db_session.query(StyleExample.content_hash).filter(StyleExample.style_id == style_id)
+    }
+    now = datetime.now()
+    rows = []
+    for example in examples:
+        content = example.strip()
+        content_hash = example_hash(content)
+        if not content or content_hash in known:
+            continue
+        known.add(content_hash)
+        rows.append({
+            "style_id": style_id,
+            "content": content,
+            "content_hash": content_hash,
+            "vector": encode_vector(content),
+            "created_at": now,
+            "updated_at": now,
+        })
+    if rows:
+        db_session.execute(insert(StyleExample), rows)
+        db_session.commit()
+        style_examples_cache.drop(style_id)
+    return len(rows)
+
+
+def read_style_examples(db_session: Session, style: Style) -> StyleExamples:
+    """ Get the examples of a style, moving legacy examples to their own rows first """
+    examples = style_examples_cache.get(style.id)
+    if examples is not None:
+        return examples
+
+    query = (
+        db_session.query(StyleExample.content, StyleExample.vector)
+        .filter(StyleExample.style_id == style.id)
+        .order_by(StyleExample.id.asc())
+    )
+    rows = query.all()
+    if not rows and style.examples:
+        # The blob is cleared even when none of its parts is usable, so it is migrated only once
+        added = add_style_examples(db_session, style.id, style.examples.split(LEGACY_SEPARATOR))
+        style.examples = None
+        db_session.commit()
+        rows = query.all() if added else []
+
+    examples = StyleExamples([row.content for row in rows], [row.vector for row in rows])
+    style_examples_cache.put(style.id, examples)
+    return examples
+
+
 def read_style(db_session: Session, style_id: int) -> Optional[Style]:
     """ Get a style by ID """
     return db_session.query(Style).filter(Style.id == style_id).first()
@@ -48,15 +105,29 @@ def read_styles_by_owner(db_session: Session, owner_id: int, skip: int = 0, limi
     return db_session.query(Style).filter(Style.owner_id == owner_id).offset(skip).limit(limit).all()
 
 
-def update_style(db_session: Session, style_id: int, name: str, description: str, examples: str) -> Optional[Style]:
-    """ Update a style """
+def read_styles_page(
+    db_session: Session, owner_id: int, cursor: Optional[str] = None, direction: str = "next", limit: int = 10
+) -> Page:
+    """ Get one page of a user's styles, newest first, with only the columns the list shows """
+    query = (
+        db_session.query(Style)
+        .options(load_only(Style.id, Style.name, Style.created_at))
+        .filter(Style.owner_id == owner_id)
+    )
+    return paginate(query, Style, limit, cursor, direction)
+
+
+def update_style(
+    db_session: Session, style_id: int, name: str, description: str, examples: list[str]
+) -> Optional[Style]:
+    """ Update a style, adding the examples it does not have yet """
     style = db_session.query(Style).filter(Style.id == style_id).first()
     if style:
         style.name = name
-        style.examples = examples
         style.updated_at = datetime.now()
         db_session.commit()
         db_session.refresh(style)
+        add_style_examples(db_session, style_id, examples)
     return style
 
 
@@ -64,8 +135,10 @@ def delete_style(db_session: Session, style_id: int) -> bool:
     """ Delete a style """
     style = db_session.query(Style).filter(Style.id == style_id).first()
     if style:
+        db_session.query(StyleExample).filter(StyleExample.style_id == style_id).delete(synchronize_session=False)
         db_session.delete(style)
         db_session.commit()
+        style_examples_cache.drop(style_id)
         return True
     return False
 
@@ -142,36 +215,81 @@ def delete_post(db_session: Session, post_id: int) -> bool:
     return False
 
 
-# AI generation services (mock implementations)
-def generate_with_style(content: str, style_id: int, db_session: Session) -> str:
-    """ Generate or edit content according to the specified style """
-    style = read_style(db_session, style_id)
-    if not style:
-        return content
-    
-    # Load the LLM model
-    llm = LLM(config.app.llm, system_prompt=config.app.llm.system_prompt)
+# AI generation services
+def build_style_prompt(examples: StyleExamples, content: str) -> str:
+    """ Build the user input asking to rewrite content in a style, with the examples closest to it """
+    style_content = f"Примеры: {LEGACY_SEPARATOR.join(examples.select(content))}"
+    return f"{style_content}\n\nИсходный текст: {content}"
 
-    style_content = f"Примеры: {style.examples}"
-    user_input = f"{style_content}\n\nИсходный текст: {content}"
 
-    # Convert chat history to a list of Message objects using model_validate
-    openai_chat_history = [
+def build_style_history(style: Style, examples: StyleExamples, content: str) -> list[openai_schemas.Message]:
+    """ Build the chat history asking to rewrite content in a style """
+    return [
         openai_schemas.Message(
             id = random.randint(1, 10000),
             chat_id = style.owner_id,
             role = "user",
-            content = user_input,
+            content = build_style_prompt(examples, content),
             created_at = datetime.now()
         )
     ]
-    
-    # This would be replaced with actual AI-based generation
-    logger.info(f"Generating content with style: {style.name}")
-    
+
+
+def generate_for_style(style: Style, examples: StyleExamples, content: str) -> tuple[str, Optional[LLMCallUsage]]:
+    """ Rewrite content in an already loaded style, without touching the database """
+    # Load the LLM model
+    llm = LLM(config.app.llm, system_prompt=config.app.llm.system_prompt, user_id=style.owner_id)
+
     # Generate and send the final response
-    response = llm.invoke(openai_chat_history)
-    return response.content
+    response = llm.invoke(build_style_history(style, examples, content))
+    return response.content, llm.usage
+
+
+def generate_variants_with_style(
+    content: str, style_id: int, db_session: Session, n: int
+) -> tuple[list[str], Optional[LLMCallUsage]]:
+    """ Generate several alternative drafts of content in a style with one LLM request """
+    style = read_style(db_session, style_id)
+    if not style:
+        return [content], None
+
+    logger.info(f"Generating {n} variants with style: {style.name}")
+    llm = LLM(config.app.llm, system_prompt=config.app.llm.system_prompt, user_id=style.owner_id)
+    examples = read_style_examples(db_session, style)
+    return llm.invoke_variants(build_style_history(style, examples, content), n), llm.usage
+
+
+def generate_with_style(content: str, style_id: int, db_session: Session) -> tuple[str, Optional[LLMCallUsage]]:
+    """ Generate or edit content according to the specified style, with the usage of the LLM call """
+    style = read_style(db_session, style_id)
+    if not style:
+        return content, None
+
+    logger.info(f"Generating content with style: {style.name}")
+    return generate_for_style(style, read_style_examples(db_session, style), content)
+
+
+def create_draft_posts(db_session: Session, contents: list[str], style_id: int, owner_id: int) -> int:
+    """ Insert many draft posts in one statement and return how many were created """
+    if not contents:
+        return 0
+    now = datetime.now()
+    db_session.execute(
+        insert(Post),
+        [
+            {
+                "title": "",
+                "content": content,
+                "style_id": style_id,
+                "owner_id": owner_id,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for content in contents
+        ]
+    )
+    db_session.commit()
+    return len(contents)
 
 
 def edit_content(content: str) -> str:
@@ -185,7 +303,9 @@ def delete_style_by_id(db_session: Session, style_id: int) -> bool:
     """ Delete a style by ID """
     style = db_session.query(Style).filter(Style.id == style_id).first()
     if style:
+        db_session.query(StyleExample).filter(StyleExample.style_id == style_id).delete(synchronize_session=False)
         db_session.delete(style)
         db_session.commit()
+        style_examples_cache.drop(style_id)
         return True
     return False
\ No newline at end of file
@@ -0,0 +1,131 @@
+import logging
+from functools import lru_cache
+from typing import Optional
+
+import tiktoken
+
+from .schemas import Message, PromptTokens
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tokens spent on role markers and separators for every chat message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Rough ratio used when no tokenizer is available for a model
+CHARS_PER_TOKEN = 4
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+class Tokenizer:
+    """Counts and truncates text in model tokens"""
+
+    def __init__(self, encoding=None):  # noqa: D107
+        self.encoding = encoding
+
+    def count(self, text: str) -> int:
+        """Return the number of tokens in the text."""
+        if not text:
+            return 0
+        if self.encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut the text down to at most `max_tokens` tokens."""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is None:
+            return text[: max_tokens * CHARS_PER_TOKEN]
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens])
+
+
+@lru_cache(maxsize=32)
+def get_tokenizer(model_name: Optional[str] = None) -> Tokenizer:
+    """
+    Load the tokenizer for a model once and reuse it.
+
+    Falls back to the generic encoding for models unknown to tiktoken
+    (e.g. deepseek-chat) and to a character estimate when its encoding
+    files are not available.
+    """
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model_name or "")
+        except KeyError:
+            encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+        return Tokenizer(encoding)
+    except Exception as e:
+        logger.warning(f"Tokenizer for {model_name} is not available, estimating tokens by length: {e}")
+        return Tokenizer()
+
+
+class ContextBudgeter:
+    """
+    Fills the prompt by priority up to a token budget.
+
+    The system prompt goes first, then the latest input (truncated if it
+    alone exceeds the budget), then earlier messages from the newest to the
+    oldest until the budget or the message limit is reached.
+    """
+
+    def __init__(self, model_name: Optional[str], max_prompt_tokens: int, history_limit: Optional[int] = None):  # noqa: D107
+        self.tokenizer = get_tokenizer(model_name)
+        self.max_prompt_tokens = max_prompt_tokens
+        self.history_limit = history_limit
+
+    def _message_tokens(self, text: str) -> int:
+        return self.tokenizer.count(text) + MESSAGE_OVERHEAD_TOKENS
+
+    def fit(self, chat_history: list[Message], system_prompt: Optional[str] = None) -> tuple[list[Message], PromptTokens]:
+        """
+        Select the messages that fit into the budget.
+
+        Args:
+            chat_history: Messages in chronological order, the last one is the latest input.
+            system_prompt: The system prompt, always included.
+
+        Returns:
+            The selected messages in chronological order and their token counts.
+        """
+        usage = PromptTokens(budget=self.max_prompt_tokens)
+        if system_prompt:
+            usage.system = self._message_tokens(system_prompt)
+        remaining = self.max_prompt_tokens - usage.system
+
+        if not chat_history:
+            return [], usage
+
+        # The latest input is kept even if it has to be shortened
+        latest = chat_history[-1]
+        input_tokens = self._message_tokens(latest.content)
+        if input_tokens > remaining:
+            content = self.tokenizer.truncate(latest.content, remaining - MESSAGE_OVERHEAD_TOKENS)
+            latest = latest.model_copy(update={"content": content})
+            input_tokens = self._message_tokens(content)
+            usage.input_truncated = True
+        usage.input = input_tokens
+        remaining -= input_tokens
+
+        # Walk back from the most recent history until the budget is spent
+        selected: list[Message] = []
+        older = chat_history[:-1]
+        if self.history_limit is not None:
+            older = older[len(older) - self.history_limit :] if self.history_limit > 0 else []
+        for message in reversed(older):
+            tokens = self._message_tokens(message.content)
+            if tokens > remaining:
+                break
+            selected.append(message)
+            usage.history += tokens
+            remaining -= tokens
+
+        usage.history_messages = len(selected)
+        usage.dropped_messages = len(chat_history) - 1 - len(selected)
+        selected.reverse()
+        selected.append(latest)
+        return selected, usage
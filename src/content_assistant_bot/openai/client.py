@@ -1,74 +1,218 @@
-import os
-from typing import Any, Optional, Union
+import json
+import logging
+import threading
+import time
+from typing import Any, Iterator, Optional, Union
 
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
-from langchain_deepseek import ChatDeepSeek
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages.ai import add_ai_message_chunks
+from omegaconf import DictConfig, OmegaConf
 from PIL.Image import Image
 
-from .schemas import Message, ModelConfig
+from .budget import ContextBudgeter, get_tokenizer
+from .router import router
+from .schemas import ImagePayload, LLMCallUsage, Message, ModelConfig, PromptTokens
+from .usage import usage_recorder
 from .utils import image_to_base64
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Providers that accept the `n` parameter for several choices per request
+N_CHOICES_PROVIDERS = {"openai", "stub"}
+
+VARIANTS_INSTRUCTION = (
+    "Write {n} different variants of the answer. "
+    "Return only a JSON array of {n} strings, one string per variant, without any other text."
+)
+
+
+def parse_variants(content: str) -> list[str]:
+    """Read the JSON array of variants from a response, or keep the whole response as one variant."""
+    start, end = content.find("["), content.rfind("]")
+    if start != -1 and end > start:
+        try:
+            variants = json.loads(content[start : end + 1])
+            variants = [str(variant).strip() for variant in variants if str(variant).strip()]
+            if variants:
+                return variants
+        except json.JSONDecodeError:
+            logger.warning("Could not parse variants, using the whole response")
+    return [content.strip()]
+
+
+def to_model_config(config: Union[ModelConfig, DictConfig, dict, None]) -> Optional[ModelConfig]:
+    """Convert a module's `llm` config section into a ModelConfig."""
+    if config is None or isinstance(config, ModelConfig):
+        return config
+    if isinstance(config, DictConfig):
+        config = OmegaConf.to_container(config, resolve=True)
+    return ModelConfig.model_validate(config)
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+
 
 class LLM:
-    def __init__(self, config: ModelConfig, system_prompt: Optional[str] = None):  # noqa: D107
-        self.config = config
+    def __init__(self, config: ModelConfig, system_prompt: Optional[str] = None, user_id: Optional[int] = None):  # noqa: D107
+        self.config = to_model_config(config)
         self.system_prompt = system_prompt
+        self.user_id = user_id
+        self.prompt_tokens: Optional[PromptTokens] = None
+        # Usage of the latest call, complete once a stream is consumed
+        self.usage: Optional[LLMCallUsage] = None
 
-    def invoke(
-        self, chat_history: list[Message],
-        config: Optional[ModelConfig] = None,
-        image: Optional[Image] = None
-    ) -> Union[str, Any]:
-        """Run the model with the given chat history and configuration"""
-
-        if config is None and self.config is not None:
-            config = self.config
-        else:
+    def _resolve_config(self, config: Optional[ModelConfig]) -> ModelConfig:
+        config = to_model_config(config) or self.config
+        if config is None:
             raise ValueError("Model configuration is required")
+        return config
 
-        if config.provider == "deepseek":
-            llm_client = ChatDeepSeek(
-                model_name=config.model_name, max_tokens=config.max_tokens,
-                temperature=config.temperature
-            )
-        else:
-            llm_client = ChatOpenAI(
-                model_name=config.model_name, max_tokens=config.max_tokens,
-                base_url=os.getenv("OPENAI_API_URL"),
-                temperature=config.temperature
-            )
-    
-        print(os.getenv("DEEPSEEK_API_KEY"))
+    def _build_messages(
+        self, chat_history: list[Message], config: ModelConfig,
+        system_prompt: Optional[str], image: Optional[Union[Image, ImagePayload]] = None
+    ) -> list[BaseMessage]:
+        """Fit the history into the token budget and convert it to chat messages"""
+        # Fit the system prompt, the latest input and as much history as the token budget allows
+        budgeter = ContextBudgeter(config.model_name, config.max_prompt_tokens, config.chat_history_limit)
+        chat_history, self.prompt_tokens = budgeter.fit(chat_history, system_prompt)
+        logger.info(f"Prompt tokens for {config.model_name}: {self.prompt_tokens.model_dump()}")
 
-        chat_history = chat_history[-config.chat_history_limit :]
         role_message_map = {"user": HumanMessage, "assistant": AIMessage}
         messages = [
             role_message_map[message.role](content=[{"type": "text", "text": message.content}])
             for message in chat_history
             if message.role in role_message_map
         ]
-        
-        print(config)
 
         # If system prompt is provided, add it to the messages
-        if self.system_prompt:
-            messages.insert(0, SystemMessage(content=[{"type": "text", "text": self.system_prompt}]))
+        if system_prompt:
+            messages.insert(0, SystemMessage(content=[{"type": "text", "text": system_prompt}]))
 
         # Handle the image if provided
         if image:
             message = HumanMessage(content=[{"type": "text", "text": "Received the following image(s):"}])
-            image_base64 = image_to_base64(image)
+            # Photos from Telegram come already encoded, see `images.prepare_photo`
+            if not isinstance(image, ImagePayload):
+                image = ImagePayload(mime_type="image/jpeg", data=image_to_base64(image))
             message.content.append(
                 {
                     "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"},
+                    "image_url": {"url": image.url},
                 }
             )
             messages.append(message)
 
-        if config.stream:
-            return llm_client.stream(messages)
+        return messages
+
+    def invoke(
+        self, chat_history: list[Message],
+        config: Optional[ModelConfig] = None,
+        image: Optional[Union[Image, ImagePayload]] = None,
+        cancelled: Optional[threading.Event] = None
+    ) -> Union[str, Any]:
+        """Run the model with the given chat history and configuration"""
+        config = self._resolve_config(config)
+        messages = self._build_messages(chat_history, config, self.system_prompt, image)
+
+        # The router picks a healthy provider and fails over to the configured fallbacks
+        started = time.monotonic()
+        try:
+            if config.stream:
+                stream = router.stream(config, messages, prompt_tokens=self.prompt_tokens.total)
+                return self._metered_stream(config, stream, started)
+            else:
+                # Once `cancelled` is set the router stops waiting and frees this thread
+                response = router.invoke(config, messages, prompt_tokens=self.prompt_tokens.total, cancelled=cancelled)
+        except Exception:
+            self._record(config, started, ok=False)
+            raise
+        self._record(config, started, [response])
+        return response
+
+    def _record(
+        self, config: ModelConfig, started: float, responses: Optional[list[Any]] = None,
+        ttft: Optional[float] = None, ok: bool = True
+    ) -> None:
+        """Meter a call, counting tokens locally when the provider sent no usage"""
+        responses = responses or []
+        metadata = responses[0].response_metadata if responses else {}
+        usage = next((response.usage_metadata for response in responses if response.usage_metadata), None)
+        if usage:
+            prompt_tokens, completion_tokens = usage["input_tokens"], usage["output_tokens"]
         else:
-            response = llm_client.invoke(messages)
-            return response
+            tokenizer = get_tokenizer(config.model_name)
+            prompt_tokens = self.prompt_tokens.total if self.prompt_tokens else 0
+            completion_tokens = sum(tokenizer.count(_text(response.content)) for response in responses)
+
+        self.usage = LLMCallUsage(
+            provider=metadata.get("provider", config.provider or "openai"),
+            model=metadata.get("model", config.model_name or ""),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            ttft_ms=round(ttft * 1000) if ttft is not None else None,
+            latency_ms=round((time.monotonic() - started) * 1000),
+            ok=ok,
+        )
+        usage_recorder.record(self.user_id, self.usage)
+
+    def _metered_stream(self, config: ModelConfig, stream: Iterator[Any], started: float) -> Iterator[Any]:
+        chunks: list[Any] = []
+        ttft, ok = None, True
+        try:
+            for chunk in stream:
+                if not chunks:
+                    ttft = time.monotonic() - started
+                chunks.append(chunk)
+                yield chunk
+        except Exception:
+            ok = False
+            raise
+        finally:
+            if hasattr(stream, "close"):
+                stream.close()
+            # Chunks add up to the whole message, including the usage sent with the last one
+            message = add_ai_message_chunks(chunks[0], *chunks[1:]) if chunks else None
+            self._record(config, started, [message] if message is not None else [], ttft=ttft, ok=ok)
+
+    def invoke_variants(self, chat_history: list[Message], n: int, config: Optional[ModelConfig] = None) -> list[str]:
+        """
+        Get `n` alternative answers from a single request.
+
+        Providers that support the `n` parameter return `n` choices; for the
+        others the model is asked for a JSON array of `n` answers.
+
+        Args:
+            chat_history: The chat history, the last message is the input.
+            n: The number of variants.
+            config: The model configuration, the instance's one by default.
+
+        Returns:
+            list[str]: Up to `n` answers.
+        """
+        config = self._resolve_config(config).model_copy(update={"stream": False})
+        started = time.monotonic()
+
+        if config.provider in N_CHOICES_PROVIDERS:
+            config = config.model_copy(update={"n": n})
+            messages = self._build_messages(chat_history, config, self.system_prompt)
+            try:
+                responses = router.invoke(config, messages, prompt_tokens=self.prompt_tokens.total, n=n)
+            except Exception:
+                self._record(config, started, ok=False)
+                raise
+            self._record(config, started, responses)
+            return [response.content for response in responses]
+
+        system_prompt = "\n\n".join(filter(None, [self.system_prompt, VARIANTS_INSTRUCTION.format(n=n)]))
+        messages = self._build_messages(chat_history, config, system_prompt)
+        try:
+            response = router.invoke(config, messages, prompt_tokens=self.prompt_tokens.total)
+        except Exception:
+            self._record(config, started, ok=False)
+            raise
+        self._record(config, started, [response])
+        return parse_variants(response.content)[:n]
@@ -0,0 +1,253 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Optional
+
+from omegaconf import OmegaConf
+from telebot import TeleBot
+
+from .utils import download_file_to_path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+
+class FileCache:
+    """
+    Content-addressed cache of Telegram file downloads.
+
+    Files are keyed by `file_unique_id`, which is the same for every copy
+    of a file, so a forwarded photo or document is downloaded only once.
+    A memory tier keeps recent files as bytes and a disk tier keeps them as
+    files; both evict the least recently used entries past their size
+    limit. `get_file` answers are cached too, their file paths stay valid
+    for an hour.
+    """
+
+    def __init__(self, settings=None):  # noqa: D107
+        self.settings = settings or config.files
+        self.memory: OrderedDict[str, bytes] = OrderedDict()
+        self.memory_size = 0
+        self.disk: OrderedDict[str, int] = OrderedDict()
+        self.disk_size = 0
+        self.metadata: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "metadata_hits": 0, "metadata_misses": 0}
+        self.lock = threading.Lock()
+
+        self.directory = Path(self.settings.disk_dir).expanduser()
+        if not self.directory.is_absolute():
+            raise ValueError(f"The file cache directory must be an absolute path, got {self.directory}")
+        # Paths handed out by `open_path`, linked to the cached files so that eviction cannot remove them
+        self.checkouts = self.directory / "checkouts"
+        self.disk_loaded = False
+
+    def _load_disk(self) -> None:
+        # Called with the lock held, the directory is only created once a file needs it
+        if self.disk_loaded:
+            return
+        self.checkouts.mkdir(parents=True, exist_ok=True)
+        for path in self.checkouts.iterdir():
+            path.unlink()
+        # Files left by a previous run are reused, oldest first in eviction order
+        for path in sorted(self.directory.iterdir(), key=lambda path: path.stat().st_mtime):
+            if path.suffix == ".part":
+                path.unlink()
+            elif path.is_file():
+                self.disk[path.name] = path.stat().st_size
+                self.disk_size += path.stat().st_size
+        self.disk_loaded = True
+
+    def get_file_info(self, bot: TeleBot, file_id: str) -> Any:
+        """Return the `get_file` answer for a file, cached for `metadata_ttl_seconds`."""
+        now = time.monotonic()
+        with self.lock:
+            cached = self.metadata.get(file_id)
+            if cached is not None and now - cached[0] < self.settings.metadata_ttl_seconds:
+                self.metadata.move_to_end(file_id)
+                self.counters["metadata_hits"] += 1
+                return cached[1]
+            self.counters["metadata_misses"] += 1
+
+        file_info = bot.get_file(file_id)
+        with self.lock:
+            self.metadata[file_id] = (now, file_info)
+            self.metadata.move_to_end(file_id)
+            while len(self.metadata) > self.settings.metadata_max_items:
+                self.metadata.popitem(last=False)
+        return file_info
+
+    def get_bytes(self, bot: TeleBot, file_id: str, file_unique_id: str) -> memoryview:
+        """
+        Return the content of a file, downloading it only on a miss.
+
+        Args:
+            bot: The Telegram bot instance.
+            file_id: The id used to download the file.
+            file_unique_id: The id that identifies the content.
+
+        Returns:
+            memoryview: A read-only view of the cached content.
+        """
+        with self.lock:
+            data = self.memory.get(file_unique_id)
+            if data is not None:
+                self.memory.move_to_end(file_unique_id)
+                self.counters["memory_hits"] += 1
+                return memoryview(data)
+            # An open file stays readable if the cache evicts it meanwhile
+            file = self._open_disk(file_unique_id)
+
+        if file is not None:
+            with file:
+                data = file.read()
+        else:
+            data = Path(self._download(bot, file_id, file_unique_id)).read_bytes()
+        self._remember(file_unique_id, data)
+        return memoryview(data)
+
+    @contextmanager
+    def open_path(self, bot: TeleBot, file_id: str, file_unique_id: str, suffix: str = "") -> Iterator[str]:
+        """
+        Give the path of a cached copy of a file, downloading it only on a miss.
+
+        The path is a link to the cached file that stays readable until the
+        block exits, even if the cache evicts the file meanwhile.
+
+        Args:
+            bot: The Telegram bot instance.
+            file_id: The id used to download the file.
+            file_unique_id: The id that identifies the content.
+            suffix: The extension of the path, kept for readers that need it.
+
+        Yields:
+            str: The path of the file.
+        """
+        checkout = self.checkouts / f"{uuid.uuid4().hex}{suffix}"
+        with self.lock:
+            found = self._checkout(file_unique_id, checkout)
+        if not found:
+            with self.lock:
+                data = self.memory.get(file_unique_id)
+            if data is not None:
+                self._write(file_unique_id, data)
+            else:
+                self._download(bot, file_id, file_unique_id)
+            with self.lock:
+                found = self._checkout(file_unique_id, checkout)
+        if not found:
+            # Evicted right away by another file stored meanwhile
+            checkout.write_bytes(self.get_bytes(bot, file_id, file_unique_id))
+
+        try:
+            yield str(checkout)
+        finally:
+            try:
+                checkout.unlink()
+            except OSError as e:
+                logger.warning(f"Failed to remove cached file link {checkout}: {e}")
+
+    def _checkout(self, file_unique_id: str, checkout: Path) -> bool:
+        # Called with the lock held, so the file cannot be evicted before it is linked
+        self._load_disk()
+        if file_unique_id not in self.disk:
+            return False
+        self.disk.move_to_end(file_unique_id)
+        self.counters["disk_hits"] += 1
+        try:
+            os.link(self.directory / file_unique_id, checkout)
+        except OSError:
+            shutil.copyfile(self.directory / file_unique_id, checkout)
+        return True
+
+    def _open_disk(self, file_unique_id: str) -> Optional[BinaryIO]:
+        # Called with the lock held, so the file cannot be evicted before it is opened
+        self._load_disk()
+        if file_unique_id not in self.disk:
+            return None
+        self.disk.move_to_end(file_unique_id)
+        self.counters["disk_hits"] += 1
+        return open(self.directory / file_unique_id, "rb")
+
+    def _temporary_path(self, name: str) -> str:
+        with self.lock:
+            self._load_disk()
+        # A unique temporary name per writer, so a reader never sees a partial file
+        with tempfile.NamedTemporaryFile(dir=self.directory, prefix=name, suffix=".part", delete=False) as file:
+            return file.name
+
+    def _write(self, file_unique_id: str, data: bytes) -> None:
+        partial = self._temporary_path(file_unique_id)
+        try:
+            Path(partial).write_bytes(data)
+            os.replace(partial, self.directory / file_unique_id)
+        except BaseException:
+            Path(partial).unlink(missing_ok=True)
+            raise
+        self._store(file_unique_id, len(data))
+
+    def _download(self, bot: TeleBot, file_id: str, file_unique_id: str) -> str:
+        with self.lock:
+            self.counters["misses"] += 1
+        file_info = self.get_file_info(bot, file_id)
+        path = self.directory / file_unique_id
+        partial = self._temporary_path(file_unique_id)
+        try:
+            size = download_file_to_path(bot, file_info.file_path, partial)
+            os.replace(partial, path)
+        except BaseException:
+            Path(partial).unlink(missing_ok=True)
+            raise
+        self._store(file_unique_id, size)
+        return str(path)
+
+    def _remember(self, file_unique_id: str, data: bytes) -> None:
+        if len(data) > self.settings.memory_max_bytes:
+            return
+        with self.lock:
+            if file_unique_id in self.memory:
+                self.memory_size -= len(self.memory.pop(file_unique_id))
+            self.memory[file_unique_id] = data
+            self.memory_size += len(data)
+            while self.memory_size > self.settings.memory_max_bytes:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_size -= len(evicted)
+
+    def _store(self, name: str, size: int) -> None:
+        with self.lock:
+            self.disk_size -= self.disk.pop(name, 0)
+            self.disk[name] = size
+            self.disk_size += size
+            while self.disk_size > self.settings.disk_max_bytes and len(self.disk) > 1:
+                old_name, old_size = self.disk.popitem(last=False)
+                self.disk_size -= old_size
+                # Removed under the lock, so a file is never linked after it is dropped from the index
+                try:
+                    os.remove(self.directory / old_name)
+                except OSError as e:
+                    logger.warning(f"Failed to evict cached file {old_name}: {e}")
+
+    def metrics(self) -> dict:
+        """Return the hit and miss counters and the size of each tier."""
+        with self.lock:
+            return {
+                **self.counters,
+                "memory_files": len(self.memory),
+                "memory_bytes": self.memory_size,
+                "disk_files": len(self.disk),
+                "disk_bytes": self.disk_size,
+            }
+
+
+file_cache = FileCache()
@@ -0,0 +1,125 @@
+import base64
+import io
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+from omegaconf import OmegaConf
+from PIL import Image
+from telebot import TeleBot
+from telebot.types import PhotoSize
+
+from .files import file_cache
+from .schemas import ImagePayload
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+class PayloadCache:
+    """LRU cache of encoded images, bounded by the total payload size"""
+
+    def __init__(self, max_bytes: int):  # noqa: D107
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items: OrderedDict[str, ImagePayload] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[ImagePayload]:
+        """Return a cached payload and mark it as recently used."""
+        with self.lock:
+            payload = self.items.get(key)
+            if payload is not None:
+                self.items.move_to_end(key)
+            return payload
+
+    def put(self, key: str, payload: ImagePayload) -> None:
+        """Cache a payload, evicting the least recently used ones beyond the size limit."""
+        with self.lock:
+            if key in self.items:
+                self.size -= len(self.items.pop(key).data)
+            self.items[key] = payload
+            self.size += len(payload.data)
+            while self.size > self.max_bytes and len(self.items) > 1:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= len(evicted.data)
+
+
+payload_cache = PayloadCache(config.images.cache_max_bytes)
+
+
+def pick_photo_size(photos: list[PhotoSize], target_side: int) -> PhotoSize:
+    """Return the smallest photo size whose longer side reaches the target, or the largest one."""
+    for photo in sorted(photos, key=lambda photo: photo.width * photo.height):
+        if max(photo.width, photo.height) >= target_side:
+            return photo
+    return max(photos, key=lambda photo: photo.width * photo.height)
+
+
+def encode_image(
+    data: Union[bytes, memoryview], max_side: Optional[int] = None,
+    image_format: Optional[str] = None, quality: Optional[int] = None
+) -> ImagePayload:
+    """
+    Downscale an image and encode it for a vision request.
+
+    JPEG sources are decoded in draft mode close to the target size, so a
+    large photo is never fully decoded.
+
+    Args:
+        data: The source image file.
+        max_side: The longest side of the result in pixels.
+        image_format: `JPEG` or `WEBP`.
+        quality: The encoder quality, 1 to 100.
+
+    Returns:
+        ImagePayload: The base64 encoded image with its mime type.
+    """
+    max_side = max_side or config.images.max_side
+    image_format = (image_format or config.images.format).upper()
+    quality = quality or config.images.quality
+
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", (max_side, max_side))
+    image = image.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    buffered = io.BytesIO()
+    image.save(buffered, format=image_format, quality=quality)
+    return ImagePayload(mime_type=MIME_TYPES[image_format], data=base64.b64encode(buffered.getbuffer()).decode())
+
+
+def prepare_photo(bot: TeleBot, photos: list[PhotoSize]) -> ImagePayload:
+    """
+    Get the payload of a Telegram photo for a vision request.
+
+    The smallest size that meets the target resolution is downloaded and
+    encoded once; the payload is cached by the photo's `file_unique_id`.
+
+    Args:
+        bot: The Telegram bot instance.
+        photos: The sizes of the photo, as in `message.photo`.
+
+    Returns:
+        ImagePayload: The encoded photo.
+    """
+    photo = pick_photo_size(photos, config.images.max_side)
+    payload = payload_cache.get(photo.file_unique_id)
+    if payload is not None:
+        return payload
+
+    payload = encode_image(file_cache.get_bytes(bot, photo.file_id, photo.file_unique_id))
+    payload_cache.put(photo.file_unique_id, payload)
+    logger.info(
+        f"Encoded photo {photo.width}x{photo.height} ({photo.file_size or 0} bytes) "
+        f"into {len(payload.data)} base64 bytes"
+    )
+    return payload
@@ -0,0 +1,230 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+from omegaconf import OmegaConf
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+WINDOW_SECONDS = 60.0
+
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class KeyPoolSaturatedError(Exception):
+    """Raised when no key frees up before the queue timeout"""
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a rate limit reset header such as `1s`, `6m0s` or `120ms` into seconds."""
+    if not value:
+        return None
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def load_keys(env_name: str) -> list[str]:
+    """Read keys from `<ENV>S` (comma separated) or, failing that, from `<ENV>`."""
+    keys = os.getenv(f"{env_name}S") or os.getenv(env_name) or ""
+    return [key.strip() for key in keys.split(",") if key.strip()]
+
+
+class KeyLease:
+    """A request slot taken on a key, settled once the response is known"""
+
+    def __init__(self, state: "KeyState", tokens: list):  # noqa: D107
+        self.state = state
+        self._tokens = tokens
+
+    @property
+    def key(self) -> str:  # noqa: D102
+        return self.state.key
+
+
+class KeyState:
+    """Requests and tokens sent with one key over the last minute"""
+
+    def __init__(self, key: str, requests_per_minute: int, tokens_per_minute: int):  # noqa: D107
+        self.key = key
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests: deque[float] = deque()
+        self.tokens: deque[list] = deque()
+        self.blocked_until = 0.0
+
+    def _expire(self, now: float) -> None:
+        while self.requests and now - self.requests[0] >= WINDOW_SECONDS:
+            self.requests.popleft()
+        while self.tokens and now - self.tokens[0][0] >= WINDOW_SECONDS:
+            self.tokens.popleft()
+
+    def used_tokens(self) -> int:  # noqa: D102
+        return sum(entry[1] for entry in self.tokens)
+
+    def load(self, now: float) -> float:
+        """Return the busiest of the request and token utilization, from 0 to 1."""
+        self._expire(now)
+        return max(len(self.requests) / self.requests_per_minute, self.used_tokens() / self.tokens_per_minute)
+
+    def has_capacity(self, now: float, tokens: int) -> bool:  # noqa: D102
+        self._expire(now)
+        if now < self.blocked_until:
+            return False
+        if len(self.requests) >= self.requests_per_minute:
+            return False
+        # A single request bigger than the whole budget is let through on an idle key
+        return not self.tokens or self.used_tokens() + tokens <= self.tokens_per_minute
+
+    def next_release(self, now: float) -> float:
+        """Return in how many seconds some capacity frees up."""
+        candidates = [self.blocked_until - now]
+        if self.requests:
+            candidates.append(self.requests[0] + WINDOW_SECONDS - now)
+        if self.tokens:
+            candidates.append(self.tokens[0][0] + WINDOW_SECONDS - now)
+        return max(min(candidates), 0.05)
+
+
+class ApiKeyPool:
+    """
+    Spreads calls of one provider over several API keys.
+
+    Each call takes the least loaded key that still has request and token
+    capacity in the current minute. When every key is saturated the caller
+    waits in line until a key frees up or the queue timeout passes.
+    """
+
+    def __init__(self, provider: str, keys: list[str], requests_per_minute: int, tokens_per_minute: int, queue_timeout: float):  # noqa: D107
+        self.provider = provider
+        self.states = [KeyState(key, requests_per_minute, tokens_per_minute) for key in keys]
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, tokens: int, timeout: Optional[float] = None) -> KeyLease:
+        """
+        Take a request slot on the least loaded key.
+
+        Args:
+            tokens: Estimated tokens of the call (prompt and completion).
+            timeout: Seconds to wait for capacity, the pool's queue timeout by default.
+
+        Raises:
+            KeyPoolSaturatedError: If no key frees up in time.
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        give_up_at = time.monotonic() + timeout
+        with self.condition:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    available = [state for state in self.states if state.has_capacity(now, tokens)]
+                    if available:
+                        state = min(available, key=lambda s: s.load(now))
+                        state.requests.append(now)
+                        entry = [now, tokens]
+                        state.tokens.append(entry)
+                        return KeyLease(state, entry)
+
+                    wait_for = min(state.next_release(now) for state in self.states)
+                    if now + wait_for > give_up_at:
+                        raise KeyPoolSaturatedError(f"All {self.provider} keys are saturated")
+                    self.condition.wait(wait_for)
+            finally:
+                self.waiting -= 1
+
+    def settle(self, lease: KeyLease, tokens: Optional[int] = None, headers: Optional[dict] = None) -> None:
+        """
+        Replace the estimate with the actual usage and apply rate limit headers.
+
+        Args:
+            lease: The lease returned by `acquire`.
+            tokens: Tokens actually used, if the provider reported them.
+            headers: Response headers with `x-ratelimit-*` values, if any.
+        """
+        with self.condition:
+            if tokens is not None:
+                lease._tokens[1] = tokens
+            if headers:
+                self._apply_headers(lease.state, headers)
+            self.condition.notify_all()
+
+    @staticmethod
+    def _apply_headers(state: KeyState, headers: dict) -> None:
+        headers = {name.lower(): value for name, value in headers.items()}
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is not None and str(remaining).isdigit() and int(remaining) == 0:
+                reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}")) or WINDOW_SECONDS
+                state.blocked_until = max(state.blocked_until, time.monotonic() + reset)
+
+    def utilization(self) -> list[dict]:
+        """Return the per-key usage of the current minute, with keys masked."""
+        now = time.monotonic()
+        with self.condition:
+            return [
+                {
+                    "key": f"...{state.key[-4:]}",
+                    "requests": len(state.requests),
+                    "tokens": state.used_tokens(),
+                    "load": round(state.load(now), 3),
+                    "blocked": now < state.blocked_until,
+                }
+                for state in self.states
+            ]
+
+
+class KeyPools:
+    """The key pools of all providers, created on first use"""
+
+    def __init__(self, settings=None):  # noqa: D107
+        self.settings = settings or config.key_pools
+        self._pools: dict[str, Optional[ApiKeyPool]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: Optional[str]) -> Optional[ApiKeyPool]:
+        """Return the pool of a provider, or None when it has no keys configured."""
+        provider = provider or "openai"
+        with self._lock:
+            if provider not in self._pools:
+                self._pools[provider] = self._create(provider)
+            return self._pools[provider]
+
+    def _create(self, provider: str) -> Optional[ApiKeyPool]:
+        settings = self.settings.providers.get(provider)
+        if settings is None:
+            return None
+        keys = load_keys(settings.env)
+        if not keys:
+            return None
+        logger.info(f"Using {len(keys)} API key(s) for {provider}")
+        return ApiKeyPool(
+            provider, keys, settings.requests_per_minute, settings.tokens_per_minute,
+            self.settings.queue_timeout_seconds
+        )
+
+    def metrics(self) -> dict[str, dict]:
+        """Return utilization and queue length of every pool in use."""
+        with self._lock:
+            pools = [pool for pool in self._pools.values() if pool is not None]
+        return {pool.provider: {"waiting": pool.waiting, "keys": pool.utilization()} for pool in pools}
+
+
+key_pools = KeyPools()
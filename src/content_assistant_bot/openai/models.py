@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, String
+
+from ..models import Base
+
+
+class LLMUsage(Base):
+    """ Tokens and latency of one LLM call """
+    __tablename__ = "llm_usage"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, nullable=True, index=True)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False, index=True)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    ttft_ms = Column(Integer, nullable=True)
+    latency_ms = Column(Integer, nullable=False)
+    ok = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
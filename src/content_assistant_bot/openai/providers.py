@@ -0,0 +1,45 @@
+import os
+from typing import Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_deepseek import ChatDeepSeek
+from langchain_openai import ChatOpenAI
+
+from .schemas import ModelConfig
+from .stub import StubChatModel
+
+
+def create_chat_model(config: ModelConfig, api_key: Optional[str] = None) -> BaseChatModel:
+    """
+    Create the chat client for the provider of a model configuration.
+
+    Args:
+        config: The model configuration.
+        api_key: The key to use, the provider's environment variable by default.
+
+    Returns:
+        BaseChatModel: The client for `deepseek`, `stub` or any OpenAI compatible provider.
+    """
+    if config.provider == "stub":
+        return StubChatModel(model_name=config.model_name or "stub", n=config.n, **config.stub)
+
+    # Headers and stream usage feed the per-key rate tracking
+    options = {"include_response_headers": True, "stream_usage": True}
+    if api_key:
+        options["api_key"] = api_key
+
+    if config.provider == "deepseek":
+        return ChatDeepSeek(
+            model_name=config.model_name, max_tokens=config.max_tokens,
+            temperature=config.temperature,
+            timeout=config.deadline_seconds, max_retries=config.max_retries,
+            **options
+        )
+
+    return ChatOpenAI(
+        model_name=config.model_name, max_tokens=config.max_tokens,
+        base_url=os.getenv("OPENAI_API_URL"),
+        temperature=config.temperature, n=config.n,
+        timeout=config.deadline_seconds, max_retries=config.max_retries,
+        **options
+    )
@@ -0,0 +1,487 @@
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from omegaconf import OmegaConf
+
+from .keys import ApiKeyPool, KeyLease, KeyPools, KeyPoolSaturatedError, key_pools
+from .providers import create_chat_model
+from .schemas import ModelConfig
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+# How often a cancellable invoke checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.1
+
+
+class CallCancelledError(Exception):
+    """Raised when the caller cancelled an invoke before it returned"""
+
+
+class ProviderUnavailableError(Exception):
+    """Raised when no provider of a use case could answer"""
+
+    def __init__(self, errors: list[str]):  # noqa: D107
+        super().__init__("All providers failed: " + "; ".join(errors))
+        self.errors = errors
+
+
+class ProviderStats:
+    """Rolling latency and error rate of one provider and model"""
+
+    def __init__(self, window_size: int):  # noqa: D107
+        self.calls: deque[tuple[float, bool]] = deque(maxlen=window_size)
+        self.lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool) -> None:
+        """Add a finished call to the window."""
+        with self.lock:
+            self.calls.append((latency, ok))
+
+    def reset(self) -> None:
+        """Forget the calls of the window."""
+        with self.lock:
+            self.calls.clear()
+
+    @property
+    def count(self) -> int:  # noqa: D102
+        return len(self.calls)
+
+    @property
+    def error_rate(self) -> float:  # noqa: D102
+        with self.lock:
+            if not self.calls:
+                return 0.0
+            return sum(1 for _, ok in self.calls if not ok) / len(self.calls)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Return the latency percentile of successful calls, if any."""
+        with self.lock:
+            latencies = sorted(latency for latency, ok in self.calls if ok)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(percentile * len(latencies)))
+        return latencies[index]
+
+
+class CircuitBreaker:
+    """
+    Stops sending calls to a provider that keeps failing.
+
+    The circuit opens when the error rate of the window reaches the
+    threshold, rejects calls for `open_seconds`, then lets one trial call
+    through and closes again if it succeeds.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, stats: ProviderStats, failure_rate_threshold: float, min_calls: int, open_seconds: float):  # noqa: D107
+        self.stats = stats
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Return whether a call may be sent now."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give back a trial call that was never sent, so that the next call can be the trial."""
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                # opened_at is kept, the open period has already passed
+                self.state = self.OPEN
+
+    def on_result(self, ok: bool) -> None:
+        """Update the circuit after a call finished."""
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                if ok:
+                    self.state = self.CLOSED
+                    self.stats.reset()
+                else:
+                    self._open()
+            elif (
+                self.state == self.CLOSED
+                and self.stats.count >= self.min_calls
+                and self.stats.error_rate >= self.failure_rate_threshold
+            ):
+                self._open()
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+
+class _Attempt:
+    """One call to a provider, recorded exactly once"""
+
+    def __init__(self, router: "ProviderRouter", model_config: ModelConfig):  # noqa: D107
+        self.router = router
+        self.config = model_config
+        self.started = time.monotonic()
+        self.latency: Optional[float] = None
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def mark_first_token(self) -> None:
+        """Fix the latency of a stream at its first chunk."""
+        self.latency = time.monotonic() - self.started
+
+    def finish(self, ok: bool) -> None:
+        """Record the call in the stats of its provider."""
+        with self.lock:
+            if self.finished:
+                return
+            self.finished = True
+        latency = self.latency if self.latency is not None else time.monotonic() - self.started
+        self.router.record(self.config, latency, ok)
+
+
+class ProviderRouter:
+    """
+    Routes LLM calls across the providers of a use case.
+
+    A model config lists its ordered `fallbacks`; each entry overrides
+    fields of the primary config (usually `provider` and `model_name`).
+    Calls go to the first provider whose circuit is closed, are bounded by
+    a deadline and move on to the next provider on error or timeout. With
+    `hedge: true`, a second request is sent to the next provider when the
+    primary is slower than its usual tail latency, and the first answer wins.
+    Latency is the total call time for `invoke` and the time to first
+    token for `stream`. Each call takes a key from the provider's key pool
+    before its deadline starts, so waiting for a free key is not counted
+    against the provider.
+    """
+
+    def __init__(  # noqa: D107
+        self, client_factory: Callable[..., BaseChatModel] = create_chat_model,
+        settings=None, pools: Optional[KeyPools] = None
+    ):
+        self.client_factory = client_factory
+        self.settings = settings or config.router
+        self.key_pools = pools or key_pools
+        self._stats: dict[tuple[str, str], ProviderStats] = {}
+        self._breakers: dict[tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.settings.max_workers, thread_name_prefix="llm")
+
+    @staticmethod
+    def _key(model_config: ModelConfig) -> tuple[str, str]:
+        return model_config.provider or "openai", model_config.model_name or ""
+
+    def _health(self, model_config: ModelConfig) -> tuple[ProviderStats, CircuitBreaker]:
+        key = self._key(model_config)
+        with self._lock:
+            if key not in self._stats:
+                stats = ProviderStats(self.settings.window_size)
+                self._stats[key] = stats
+                self._breakers[key] = CircuitBreaker(
+                    stats, self.settings.failure_rate_threshold, self.settings.min_calls, self.settings.open_seconds
+                )
+            return self._stats[key], self._breakers[key]
+
+    def record(self, model_config: ModelConfig, latency: float, ok: bool) -> None:
+        """Record a finished call and update the circuit of its provider."""
+        stats, breaker = self._health(model_config)
+        stats.record(latency, ok)
+        breaker.on_result(ok)
+        if not ok:
+            logger.warning(f"LLM call to {self._key(model_config)} failed after {latency:.2f}s")
+
+    def candidates(self, model_config: ModelConfig) -> list[ModelConfig]:
+        """Return the primary config followed by its fallbacks."""
+        fallbacks = [model_config.model_copy(update={**fallback, "fallbacks": []}) for fallback in model_config.fallbacks]
+        return [model_config, *fallbacks]
+
+    def _deadline(self, model_config: ModelConfig) -> float:
+        return model_config.deadline_seconds or self.settings.deadline_seconds
+
+    def _hedge_delay(self, model_config: ModelConfig) -> Optional[float]:
+        stats, _ = self._health(model_config)
+        if stats.count < self.settings.min_calls:
+            return None
+        tail = stats.latency_percentile(self.settings.hedge_percentile)
+        if tail is None:
+            return None
+        return max(tail, self.settings.hedge_min_seconds)
+
+    def _allowed(self, model_config: ModelConfig) -> bool:
+        return self._health(model_config)[1].allow()
+
+    def _not_sent(self, model_config: ModelConfig) -> None:
+        # A call allowed by the circuit but dropped before it reached the provider
+        self._health(model_config)[1].release()
+
+    def _lease(
+        self, model_config: ModelConfig, tokens: int, timeout: Optional[float] = None
+    ) -> tuple[Optional[ApiKeyPool], Optional[KeyLease]]:
+        pool = self.key_pools.get(model_config.provider)
+        if pool is None:
+            return None, None
+        return pool, pool.acquire(tokens + (model_config.max_tokens or 0), timeout)
+
+    @staticmethod
+    def _settle(pool: Optional[ApiKeyPool], lease: Optional[KeyLease], usage: Optional[dict], headers: Optional[dict]) -> None:
+        if pool is not None:
+            pool.settle(lease, (usage or {}).get("total_tokens"), headers)
+
+    def _client(self, model_config: ModelConfig, lease: Optional[KeyLease]) -> BaseChatModel:
+        # The deadline is also the request timeout, so a hung provider does not hold a worker thread forever
+        bounded = model_config.model_copy(update={"deadline_seconds": self._deadline(model_config)})
+        return self.client_factory(bounded, lease.key if lease else None)
+
+    @staticmethod
+    def _first_chunk(client: BaseChatModel, messages: list[BaseMessage]) -> tuple[Iterator[Any], Any]:
+        iterator = iter(client.stream(messages))
+        return iterator, next(iterator, None)
+
+    @staticmethod
+    def _close_late_stream(future: Future) -> None:
+        # A stream that started after its deadline is closed as soon as it starts, ending the request
+        if future.cancelled() or future.exception() is not None:
+            return
+        iterator, _ = future.result()
+        if hasattr(iterator, "close"):
+            iterator.close()
+
+    @staticmethod
+    def _tag(message: Any, model_config: ModelConfig) -> None:
+        # Tells the caller which provider answered after a failover
+        message.response_metadata["provider"] = model_config.provider or "openai"
+        message.response_metadata["model"] = model_config.model_name or ""
+
+    def _submit(
+        self, model_config: ModelConfig, messages: list[BaseMessage], tokens: int,
+        lease_timeout: Optional[float] = None, n: int = 1
+    ) -> tuple[Future, _Attempt]:
+        pool, lease = self._lease(model_config, tokens, lease_timeout)
+        attempt = _Attempt(self, model_config)
+
+        def call():
+            try:
+                if n > 1:
+                    # All choices come back in one result with the usage of the whole request
+                    result = self._client(model_config, lease).generate([messages])
+                    response = [generation.message for generation in result.generations[0]]
+                    usage = (result.llm_output or {}).get("token_usage")
+                    headers = response[0].response_metadata.get("headers") if response else None
+                else:
+                    response = self._client(model_config, lease).invoke(messages)
+                    usage, headers = response.usage_metadata, response.response_metadata.get("headers")
+            except Exception:
+                attempt.finish(False)
+                self._settle(pool, lease, None, None)
+                raise
+            attempt.finish(True)
+            self._settle(pool, lease, usage, headers)
+            for message in response if isinstance(response, list) else [response]:
+                self._tag(message, model_config)
+            return response
+
+        def release_unsent(future: Future) -> None:
+            # A call cancelled before it started never reaches the provider
+            if future.cancelled():
+                self._settle(pool, lease, {"total_tokens": 0}, None)
+                self._not_sent(model_config)
+
+        future = self._executor.submit(call)
+        future.add_done_callback(release_unsent)
+        return future, attempt
+
+    def invoke(
+        self, model_config: ModelConfig, messages: list[BaseMessage], prompt_tokens: int = 0, n: int = 1,
+        cancelled: Optional[threading.Event] = None
+    ) -> Any:
+        """
+        Get a complete response, failing over between providers.
+
+        Args:
+            model_config: The model configuration with its fallbacks.
+            messages: The prompt.
+            prompt_tokens: Prompt size, used to reserve token capacity on an API key.
+            n: With more than one, the list of the choices of a single request is returned.
+            cancelled: When set, the invoke stops waiting and returns its worker.
+
+        Raises:
+            ProviderUnavailableError: If every provider failed or was skipped.
+            CallCancelledError: If `cancelled` was set before a response came.
+        """
+        pending = self.candidates(model_config)
+        errors: list[str] = []
+
+        while pending:
+            primary = pending.pop(0)
+            if not self._allowed(primary):
+                errors.append(f"{self._key(primary)}: circuit open")
+                continue
+
+            try:
+                future, attempt = self._submit(primary, messages, prompt_tokens, n=n)
+            except KeyPoolSaturatedError as e:
+                self._not_sent(primary)
+                errors.append(f"{self._key(primary)}: {e}")
+                continue
+            attempts = {future: attempt}
+            deadline = time.monotonic() + self._deadline(primary)
+
+            hedge_delay = self._hedge_delay(primary) if model_config.hedge else None
+            if hedge_delay is not None and pending:
+                done, _ = wait([future], timeout=hedge_delay)
+                if not done:
+                    while pending:
+                        hedge = pending.pop(0)
+                        if not self._allowed(hedge):
+                            continue
+                        try:
+                            # A hedge is only worth sending if a key is free right away
+                            hedge_future, hedge_attempt = self._submit(hedge, messages, prompt_tokens, lease_timeout=0, n=n)
+                        except KeyPoolSaturatedError:
+                            self._not_sent(hedge)
+                            continue
+                        logger.info(f"Hedging slow call to {self._key(primary)} with {self._key(hedge)}")
+                        attempts[hedge_future] = hedge_attempt
+                        break
+
+            while attempts:
+                timeout = max(deadline - time.monotonic(), 0)
+                if cancelled is not None:
+                    timeout = min(timeout, CANCEL_POLL_SECONDS)
+                done, _ = wait(attempts, timeout=timeout, return_when=FIRST_COMPLETED)
+                if cancelled is not None and cancelled.is_set():
+                    # Queued calls are dropped, a running one is recorded by its worker when it ends
+                    for cancelled_future in attempts:
+                        cancelled_future.cancel()
+                    raise CallCancelledError("The call was cancelled")
+                if not done:
+                    if time.monotonic() < deadline:
+                        continue
+                    for timed_out_future, timed_out in attempts.items():
+                        # Frees the worker if the call has not started, the request timeout ends it otherwise
+                        timed_out_future.cancel()
+                        timed_out.finish(False)
+                        errors.append(f"{self._key(timed_out.config)}: deadline exceeded")
+                    break
+                for finished in done:
+                    finished_attempt = attempts.pop(finished)
+                    try:
+                        return finished.result()
+                    except Exception as e:
+                        errors.append(f"{self._key(finished_attempt.config)}: {e}")
+
+        raise ProviderUnavailableError(errors)
+
+    def stream(self, model_config: ModelConfig, messages: list[BaseMessage], prompt_tokens: int = 0) -> Iterator[Any]:
+        """
+        Stream a response, failing over until a provider sends its first chunk.
+
+        Once the first chunk arrived the stream is bound to that provider.
+
+        Args:
+            model_config: The model configuration with its fallbacks.
+            messages: The prompt.
+            prompt_tokens: Prompt size, used to reserve token capacity on an API key.
+
+        Raises:
+            ProviderUnavailableError: If no provider started streaming.
+        """
+        errors: list[str] = []
+        for candidate in self.candidates(model_config):
+            if not self._allowed(candidate):
+                errors.append(f"{self._key(candidate)}: circuit open")
+                continue
+
+            try:
+                pool, lease = self._lease(candidate, prompt_tokens)
+            except KeyPoolSaturatedError as e:
+                self._not_sent(candidate)
+                errors.append(f"{self._key(candidate)}: {e}")
+                continue
+
+            attempt = _Attempt(self, candidate)
+            try:
+                opened = self._executor.submit(self._first_chunk, self._client(candidate, lease), messages)
+                iterator, first = opened.result(timeout=self._deadline(candidate))
+            except FutureTimeoutError:
+                opened.cancel()
+                opened.add_done_callback(self._close_late_stream)
+                attempt.finish(False)
+                self._settle(pool, lease, None, None)
+                errors.append(f"{self._key(candidate)}: no first token before the deadline")
+                continue
+            except Exception as e:
+                attempt.finish(False)
+                self._settle(pool, lease, None, None)
+                errors.append(f"{self._key(candidate)}: {e}")
+                continue
+
+            attempt.mark_first_token()
+            return self._relay(attempt, pool, lease, first, iterator)
+
+        raise ProviderUnavailableError(errors)
+
+    def _relay(
+        self, attempt: _Attempt, pool: Optional[ApiKeyPool], lease: Optional[KeyLease], first: Any, iterator: Iterator[Any]
+    ) -> Iterator[Any]:
+        ok = True
+        usage, headers = None, None
+        try:
+            if first is not None:
+                self._tag(first, attempt.config)
+                for chunk in itertools.chain([first], iterator):
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    headers = headers or (getattr(chunk, "response_metadata", None) or {}).get("headers")
+                    yield chunk
+        except Exception:
+            ok = False
+            raise
+        finally:
+            # Stops the provider's response when the caller stopped reading early
+            if hasattr(iterator, "close"):
+                iterator.close()
+            attempt.finish(ok)
+            self._settle(pool, lease, usage, headers)
+
+    def snapshot(self) -> list[dict]:
+        """Return the health of every provider and model seen so far."""
+        with self._lock:
+            items = list(self._stats.items())
+        return [
+            {
+                "provider": provider,
+                "model": model,
+                "calls": stats.count,
+                "error_rate": round(stats.error_rate, 3),
+                "p50": stats.latency_percentile(0.5),
+                "p95": stats.latency_percentile(0.95),
+                "circuit": self._breakers[(provider, model)].state,
+            }
+            for (provider, model), stats in items
+        ]
+
+
+router = ProviderRouter()
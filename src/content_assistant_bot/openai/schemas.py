@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Literal, Optional
+from typing import Any, Literal, Optional
 
 from pydantic import BaseModel
 
@@ -28,10 +28,54 @@ class ModelConfig(BaseModel):  # noqa: D101
     provider: Optional[str] = None
     max_input_length: Optional[int] = None
     max_tokens: Optional[int] = None
-    chat_history_limit: int = 10
+    chat_history_limit: Optional[int] = 10
+    max_prompt_tokens: int = 8000
     temperature: float = 0.5
     stream: Optional[bool] = True
+    n: int = 1
     system_prompt: Optional[str] = None
+    deadline_seconds: Optional[float] = None
+    max_retries: int = 1
+    hedge: bool = False
+    fallbacks: list[dict[str, Any]] = []
+    stub: dict[str, Any] = {}  # Timing and error injection of the `stub` provider
+
+
+class PromptTokens(BaseModel):  # noqa: D101
+    budget: int
+    system: int = 0
+    input: int = 0
+    history: int = 0
+    history_messages: int = 0
+    dropped_messages: int = 0
+    input_truncated: bool = False
+
+    @property
+    def total(self) -> int:  # noqa: D102
+        return self.system + self.input + self.history
+
+
+class LLMCallUsage(BaseModel):  # noqa: D101
+    provider: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    ttft_ms: Optional[int] = None  # Time to first token, streamed calls only
+    latency_ms: int
+    ok: bool = True
+
+    @property
+    def total_tokens(self) -> int:  # noqa: D102
+        return self.prompt_tokens + self.completion_tokens
+
+
+class ImagePayload(BaseModel):  # noqa: D101
+    mime_type: str
+    data: str  # Base64 encoded image
+
+    @property
+    def url(self) -> str:  # noqa: D102
+        return f"data:{self.mime_type};base64,{self.data}"
 
 
 class ModelResponse(BaseModel):  # noqa: D101
@@ -0,0 +1,110 @@
+import random
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Error injection draws from one generator per seed, so a run with the same calls fails the same way
+_error_generators: dict[int, random.Random] = {}
+_error_lock = threading.Lock()
+
+
+class StubError(RuntimeError):
+    """Error injected by the stub provider"""
+
+
+def _message_text(message: BaseMessage) -> str:
+    """Return the text parts of a message."""
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(part.get("text", "") for part in message.content if isinstance(part, dict))
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Local chat model that answers deterministically without any network call.
+
+    The reply repeats the latest user input, so the same prompt always gives
+    the same answer. It is selected with `provider: stub`, and the `stub`
+    section of a model config sets its timing and failures for load tests:
+    `ttft_seconds`, `token_delay_seconds`, `chunk_size` (words per streamed
+    chunk), `reply_words` (pads or cuts the reply to a fixed length),
+    `error_rate`, `error_after_chunks` (streams fail after this many chunks
+    instead of before the first one) and `seed`.
+    """
+
+    model_name: str = "stub"
+    n: int = 1
+    ttft_seconds: float = 0.0
+    token_delay_seconds: float = 0.0
+    chunk_size: int = 1
+    reply_words: Optional[int] = None
+    error_rate: float = 0.0
+    error_after_chunks: Optional[int] = None
+    seed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _reply(self, messages: list[BaseMessage]) -> str:
+        latest = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+        text = _message_text(latest) if latest else ""
+        reply = f"[{self.model_name}] {text}"
+        if self.reply_words is None:
+            return reply
+        words = reply.split(" ")
+        filler = (f"word{index}" for index in range(len(words), self.reply_words))
+        return " ".join([*words[: self.reply_words], *filler])
+
+    def _usage(self, messages: list[BaseMessage], reply: str) -> dict:
+        input_tokens = sum(len(_message_text(message).split()) for message in messages)
+        output_tokens = len(reply.split()) * self.n
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _should_fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with _error_lock:
+            generator = _error_generators.setdefault(self.seed, random.Random(self.seed))
+            return generator.random() < self.error_rate
+
+    def _generate(
+        self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        reply = self._reply(messages)
+        time.sleep(self.ttft_seconds + self.token_delay_seconds * len(reply.split(" ")))
+        if self._should_fail():
+            raise StubError("Injected stub error")
+
+        usage = self._usage(messages, reply)
+        if self.n == 1:
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply, usage_metadata=usage))])
+        return ChatResult(generations=[
+            ChatGeneration(message=AIMessage(content=f"{reply} ({index + 1})", usage_metadata=usage))
+            for index in range(self.n)
+        ])
+
+    def _stream(
+        self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager: Any = None, **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        reply = self._reply(messages)
+        words = reply.split(" ")
+        fail = self._should_fail()
+        time.sleep(self.ttft_seconds)
+        if fail and self.error_after_chunks is None:
+            raise StubError("Injected stub error")
+
+        chunk_size = max(self.chunk_size, 1)
+        for index, start in enumerate(range(0, len(words), chunk_size)):
+            if fail and index == self.error_after_chunks:
+                raise StubError("Injected stub error in the middle of the stream")
+            if index:
+                time.sleep(self.token_delay_seconds * chunk_size)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=" ".join(words[start : start + chunk_size]) + " "))
+
+        # The usage comes with the last chunk, as with `stream_usage` of the real providers
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, reply)))
@@ -0,0 +1,186 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from omegaconf import OmegaConf
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from ..database.core import get_session
+from .models import LLMUsage
+from .schemas import LLMCallUsage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+
+class UsageRecorder:
+    """
+    Buffers LLM usage rows and writes them in batches.
+
+    Rows are inserted in one statement when `batch_size` rows are waiting
+    or every `flush_interval_seconds`, whichever comes first, and once more
+    when the process exits.
+    """
+
+    def __init__(  # noqa: D107
+        self, batch_size: int, flush_interval_seconds: float,
+        session_factory: Callable[[], Session] = get_session
+    ):
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.session_factory = session_factory
+        self.rows: list[dict] = []
+        self.lock = threading.Lock()
+        self.flusher: Optional[threading.Thread] = None
+        self.wakeup = threading.Event()
+
+    def record(self, user_id: Optional[int], usage: LLMCallUsage) -> None:
+        """Queue the usage of one call."""
+        row = {"user_id": user_id, "created_at": datetime.utcnow(), **usage.model_dump()}
+        with self.lock:
+            self.rows.append(row)
+            full = len(self.rows) >= self.batch_size
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self._run, name="llm_usage", daemon=True)
+                self.flusher.start()
+        if full:
+            self.wakeup.set()
+
+    def flush(self) -> int:
+        """Write the queued rows and return how many were written."""
+        with self.lock:
+            rows, self.rows = self.rows, []
+        if not rows:
+            return 0
+
+        db_session = self.session_factory()
+        try:
+            db_session.execute(insert(LLMUsage), rows)
+            db_session.commit()
+        except Exception as e:
+            logger.error(f"Failed to write {len(rows)} LLM usage rows: {e}")
+            return 0
+        finally:
+            db_session.close()
+        return len(rows)
+
+    def _run(self) -> None:
+        while True:
+            self.wakeup.wait(self.flush_interval_seconds)
+            self.wakeup.clear()
+            self.flush()
+
+
+usage_recorder = UsageRecorder(config.usage.batch_size, config.usage.flush_interval_seconds)
+atexit.register(usage_recorder.flush)
+
+
+def usage_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Return the price in USD of a call, 0 for models without a configured price."""
+    price = config.usage.pricing.get(model)
+    if price is None:
+        return 0.0
+    return (prompt_tokens * price.prompt + completion_tokens * price.completion) / 1_000_000
+
+
+def cost_per_user(db_session: Session, since: Optional[datetime] = None, limit: Optional[int] = None) -> list[dict]:
+    """
+    Aggregate the tokens and the cost of LLM calls per user.
+
+    Args:
+        db_session: The database session.
+        since: Only count calls made after this time.
+        limit: Return only the most expensive users.
+
+    Returns:
+        list[dict]: Rows with `user_id`, `calls`, `prompt_tokens`, `completion_tokens` and `cost`, most expensive first.
+    """
+    query = db_session.query(
+        LLMUsage.user_id,
+        LLMUsage.model,
+        func.count(LLMUsage.id),
+        func.sum(LLMUsage.prompt_tokens),
+        func.sum(LLMUsage.completion_tokens),
+    )
+    if since is not None:
+        query = query.filter(LLMUsage.created_at >= since)
+
+    # Prices are per model, so rows are grouped by model first and summed per user here
+    totals: dict[Optional[int], dict] = defaultdict(
+        lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+    )
+    for user_id, model, calls, prompt_tokens, completion_tokens in query.group_by(LLMUsage.user_id, LLMUsage.model):
+        total = totals[user_id]
+        total["calls"] += calls
+        total["prompt_tokens"] += prompt_tokens or 0
+        total["completion_tokens"] += completion_tokens or 0
+        total["cost"] += usage_cost(model, prompt_tokens or 0, completion_tokens or 0)
+
+    rows = [{"user_id": user_id, **total, "cost": round(total["cost"], 6)} for user_id, total in totals.items()]
+    rows.sort(key=lambda row: row["cost"], reverse=True)
+    return rows[:limit] if limit else rows
+
+
+def _percentile_per_model(
+    db_session: Session, column, since: Optional[datetime], percentile: float
+) -> dict[tuple[str, str], tuple[int, int]]:
+    # Every row is ranked within its model and only the row at the percentile is returned
+    partition = (LLMUsage.provider, LLMUsage.model)
+    query = select(
+        LLMUsage.provider,
+        LLMUsage.model,
+        column.label("value"),
+        func.row_number().over(partition_by=partition, order_by=column).label("position"),
+        func.count().over(partition_by=partition).label("calls"),
+    ).where(LLMUsage.ok.is_(True), column.is_not(None))
+    if since is not None:
+        query = query.where(LLMUsage.created_at >= since)
+    ranked = query.subquery()
+
+    # The row at index int(percentile * calls) of the sorted values, or the last one
+    target = percentile * ranked.c.calls
+    rows = db_session.execute(
+        select(ranked.c.provider, ranked.c.model, ranked.c.calls, ranked.c.value).where(
+            ranked.c.position - 1 <= target,
+            or_(target < ranked.c.position, ranked.c.position == ranked.c.calls),
+        )
+    )
+    return {(provider, model): (calls, value) for provider, model, calls, value in rows}
+
+
+def latency_per_model(db_session: Session, since: Optional[datetime] = None, percentile: float = 0.95) -> list[dict]:
+    """
+    Compute the latency percentile of successful LLM calls per model.
+
+    The percentiles are picked by the database, so only one row per model
+    is loaded whatever the number of calls.
+
+    Args:
+        db_session: The database session.
+        since: Only count calls made after this time.
+        percentile: The percentile, 0.95 for p95.
+
+    Returns:
+        list[dict]: Rows with `provider`, `model`, `calls`, `latency_ms` and `ttft_ms`.
+    """
+    latencies = _percentile_per_model(db_session, LLMUsage.latency_ms, since, percentile)
+    ttfts = _percentile_per_model(db_session, LLMUsage.ttft_ms, since, percentile)
+    return [
+        {
+            "provider": provider,
+            "model": model,
+            "calls": calls,
+            "latency_ms": latency_ms,
+            "ttft_ms": ttfts.get((provider, model), (0, None))[1],
+        }
+        for (provider, model), (calls, latency_ms) in latencies.items()
+    ]
@@ -1,13 +1,21 @@
 import base64
 import io
 import os
+from pathlib import Path
 
+import requests
+from omegaconf import OmegaConf
 from PIL import Image
+from telebot import apihelper
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
 
 
 def image_to_base64(image: Image) -> str:
     """
-    Converts a PIL Image to a base64 string.
+    Converts a PIL Image to a base64 JPEG string.
 
     Args:
         image (Image): The image to convert.
@@ -16,8 +24,8 @@ def image_to_base64(image: Image) -> str:
         str: Base64 encoded string of the image.
     """
     buffered = io.BytesIO()
-    image.save(buffered, format="PNG")  # or any other format
-    return base64.b64encode(buffered.getvalue()).decode()
+    image.convert("RGB").save(buffered, format="JPEG", quality=85)
+    return base64.b64encode(buffered.getbuffer()).decode()
 
 
 def download_file_on_disk(bot, file_id: str, file_path: str) -> None:
@@ -57,6 +65,34 @@ def download_file_in_memory(bot, file_id: str) -> io.BytesIO:
     return file_object
 
 
+def download_file_to_path(bot, file_path: str, destination: str, chunk_size: int = 1 << 16) -> int:
+    """
+    Streams a file from Telegram servers to a local path without holding it in memory.
+
+    Args:
+        bot: The Telegram bot instance.
+        file_path: The file path returned by `bot.get_file`.
+        destination: The local path to write to.
+        chunk_size: The number of bytes read at a time.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    url_template = apihelper.FILE_URL or "https://api.telegram.org/file/bot{0}/{1}"
+    written = 0
+    # The read timeout bounds each wait for a chunk, not the whole download
+    timeout = (config.files.connect_timeout_seconds, config.files.read_timeout_seconds)
+    with requests.get(
+        url_template.format(bot.token, file_path), stream=True, proxies=apihelper.proxy, timeout=timeout
+    ) as response:
+        response.raise_for_status()
+        with open(destination, "wb") as file:
+            for chunk in response.iter_content(chunk_size):
+                file.write(chunk)
+                written += len(chunk)
+    return written
+
+
 def extract_latex_block(text: str) -> str:
     """
     Extracts the LaTeX block ```latex ... ``` from the given text.
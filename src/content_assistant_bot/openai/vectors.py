@@ -0,0 +1,55 @@
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def term_vectors(texts: list[str], dimensions: int) -> np.ndarray:
+    """Hash the words of each text into a row of sublinear term frequencies."""
+    vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+    for row, text in enumerate(texts):
+        # crc32 gives the same columns in every process, unlike hash()
+        counts = Counter(zlib.crc32(token.encode()) % dimensions for token in TOKEN_PATTERN.findall(text.lower()))
+        if counts:
+            columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            vectors[row, columns] = 1 + np.log(values)
+    return vectors
+
+
+def rank(vectors: np.ndarray, query: str, top_k: int, min_score: float = 0.0) -> list[tuple[int, float]]:
+    """
+    Find the rows most similar to a query by TF-IDF cosine similarity.
+
+    Args:
+        vectors: Term vectors of the searched texts, as made by `term_vectors`.
+        query: The text to compare with.
+        top_k: The maximum number of rows to return.
+        min_score: Rows less similar than this are left out.
+
+    Returns:
+        list[tuple[int, float]]: The row index and similarity of the best rows, best first.
+    """
+    if not len(vectors):
+        return []
+    query_vector = term_vectors([query], vectors.shape[1])[0]
+    if not query_vector.any():
+        return []
+
+    # Words found in many of the texts say little about which one is meant
+    frequency = np.count_nonzero(vectors, axis=0)
+    idf = (np.log((1 + len(vectors)) / (1 + frequency)) + 1).astype(np.float32)
+    matrix = vectors * idf
+    query_vector *= idf
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector)
+    scores = matrix @ query_vector / np.maximum(norms, 1e-12)
+
+    if len(scores) > top_k:
+        top = np.argpartition(-scores, top_k)[:top_k]
+    else:
+        top = np.arange(len(scores))
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [(int(i), float(scores[i])) for i in top if scores[i] >= min_score]
@@ -1,4 +1,7 @@
+import io
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 
@@ -8,16 +11,23 @@ from telebot.states import State, StatesGroup
 
 from ..channels.models import Channel
 from ..database.core import get_session
+from ..database.pagination import parse_page_callback
 from ..menu.markup import create_menu_markup
+from ..openai.files import file_cache
 from ..scheduler import service as scheduler_services
+from .importing import import_posts, parse_posts
 from .markup import (
     create_cancel_button,
     create_post_action_markup,
     create_post_edit_actions_markup,
     create_post_scheduling_markup,
     create_posts_list_markup,
+    create_publish_channels_markup,
 )
-from .service import create_post, publish_post, read_post, read_posts_by_owner, update_post_content
+from .media import add_post_media, build_album, read_post_media
+from .publishing import publish_to_channels
+from .search import search_posts
+from .service import create_post, read_post, read_posts_page, update_post_content
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -30,6 +40,11 @@ strings = config.strings
 # Load the database session
 db_session = get_session()
 
+# Posts created from albums by media_group_id, Telegram delivers every album item as its own message
+album_posts: OrderedDict[str, int] = OrderedDict()
+album_lock = threading.Lock()
+MAX_ALBUM_POSTS = 100
+
 class PostState(StatesGroup):
     """ Post states """
     menu = State()
@@ -43,12 +58,30 @@ class PostState(StatesGroup):
     select_channel = State() 
     create_post_title = State()
     create_post_content = State()
+    search = State()
+    import_file = State()
 
 
 def register_handlers(bot: TeleBot):
     """Register item handlers"""
     logger.info("Registering item handlers")
 
+    # Registered first, so that the command is not taken for input of a post
+    @bot.message_handler(commands=["search"])
+    def search_command(message: types.Message, data: dict):
+        user = data["user"]
+        query = message.text.partition(" ")[2].strip()
+
+        if not query:
+            data["state"].set(PostState.search)
+            bot.send_message(
+                chat_id=user.id,
+                text=strings[user.lang].enter_search_query,
+                reply_markup=create_cancel_button(user.lang)
+            )
+            return
+        send_search_results(user, query, data)
+
     # Post management handlers
     @bot.callback_query_handler(func=lambda call: call.data == "create")
     def posts_menu(call: types.CallbackQuery, data: dict):
@@ -77,6 +110,25 @@ def register_handlers(bot: TeleBot):
             reply_markup=create_cancel_button(user.lang)
         )
     
+    def add_to_album(message: types.Message) -> bool:
+        """ Add an album item to the post created from an earlier item, False if there is none yet """
+        post_id = album_posts.get(message.media_group_id)
+        if post_id is None:
+            return False
+        add_post_media(db_session, post_id, message.photo[-1].file_id)
+        # Telegram keeps the caption of an album on one of its items
+        post = read_post(db_session, post_id)
+        if message.caption and post and not post.content:
+            post.content = message.caption
+            db_session.commit()
+        return True
+
+    # Registered before the post content, the first item of an album moves the state on
+    @bot.message_handler(content_types=['photo'], func=lambda message: message.media_group_id in album_posts)
+    def process_album_item(message: types.Message, data: dict):
+        with album_lock:
+            add_to_album(message)
+
     @bot.message_handler(content_types=['text', 'photo'], state=PostState.create_post_content)
     def process_post_content(message: types.Message, data: dict):
         user = data["user"]
@@ -95,8 +147,17 @@ def register_handlers(bot: TeleBot):
             # If caption exists, use it as content
             content = message.caption or ""
         
-        # Create new post
-        new_post = create_post(db_session, title, content, user.id, photo_id)
+        # Create new post, or add to the one created from the same album
+        if message.media_group_id:
+            with album_lock:
+                if add_to_album(message):
+                    return
+                new_post = create_post(db_session, title, content, user.id, photo_id)
+                album_posts[message.media_group_id] = new_post.id
+                while len(album_posts) > MAX_ALBUM_POSTS:
+                    album_posts.popitem(last=False)
+        else:
+            new_post = create_post(db_session, title, content, user.id, photo_id)
         
         if new_post:
             # Send success message and show the new post
@@ -132,13 +193,18 @@ def register_handlers(bot: TeleBot):
                 reply_markup=create_menu_markup(user.lang)
             )
 
-    @bot.callback_query_handler(func=lambda call: call.data == "list_posts")
+    @bot.callback_query_handler(func=lambda call: call.data == "list_posts" or call.data.startswith("posts_page_"))
     def my_posts(call: types.CallbackQuery, data: dict):
         user = data["user"]
         data["state"].set(PostState.my_posts)
 
-        posts = read_posts_by_owner(db_session, user.id)
-        markup = create_posts_list_markup(user.lang, posts)
+        # Page buttons carry a cursor, anything else opens the newest page
+        cursor, direction = parse_page_callback(getattr(call, "data", None), "posts_page")
+        page = read_posts_page(db_session, user.id, cursor, direction)
+        if cursor and not page.items:
+            page = read_posts_page(db_session, user.id)
+        posts = page.items
+        markup = create_posts_list_markup(user.lang, posts, page)
 
         if not posts:
             bot.edit_message_text(
@@ -155,6 +221,99 @@ def register_handlers(bot: TeleBot):
                 reply_markup=markup
             )
 
+    @bot.callback_query_handler(func=lambda call: call.data == "search_posts")
+    def ask_search_query(call: types.CallbackQuery, data: dict):
+        user = data["user"]
+        data["state"].set(PostState.search)
+
+        bot.edit_message_text(
+            chat_id=user.id,
+            message_id=call.message.message_id,
+            text=strings[user.lang].enter_search_query,
+            reply_markup=create_cancel_button(user.lang)
+        )
+
+    @bot.message_handler(state=PostState.search)
+    def process_search_query(message: types.Message, data: dict):
+        send_search_results(data["user"], message.text or "", data)
+
+    def send_search_results(user, query: str, data: dict):
+        data["state"].set(PostState.my_posts)
+        # The query stays in the state for the page buttons
+        data["state"].add_data(search_query=query)
+
+        page = search_posts(db_session, user.id, query)
+        bot.send_message(
+            chat_id=user.id,
+            text=strings[user.lang].search_results if page.items else strings[user.lang].no_search_results,
+            reply_markup=create_posts_list_markup(user.lang, page.items, page, "posts_search")
+        )
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("posts_search_"))
+    def search_results_page(call: types.CallbackQuery, data: dict):
+        user = data["user"]
+        with data["state"].data() as data_items:
+            query = data_items.get("search_query")
+        if not query:
+            my_posts(call, data)
+            return
+
+        # The cursor of a search page is an offset, the same for both directions
+        cursor, _ = parse_page_callback(call.data, "posts_search")
+        page = search_posts(db_session, user.id, query, cursor)
+        bot.edit_message_text(
+            chat_id=user.id,
+            message_id=call.message.message_id,
+            text=strings[user.lang].search_results if page.items else strings[user.lang].no_search_results,
+            reply_markup=create_posts_list_markup(user.lang, page.items, page, "posts_search")
+        )
+
+    @bot.callback_query_handler(func=lambda call: call.data == "import_posts")
+    def ask_import_file(call: types.CallbackQuery, data: dict):
+        user = data["user"]
+        data["state"].set(PostState.import_file)
+
+        bot.edit_message_text(
+            chat_id=user.id,
+            message_id=call.message.message_id,
+            text=strings[user.lang].enter_import_file,
+            reply_markup=create_cancel_button(user.lang)
+        )
+
+    @bot.message_handler(content_types=["document"], state=PostState.import_file)
+    def process_import_file(message: types.Message, data: dict):
+        user = data["user"]
+        document = message.document
+        content = file_cache.get_bytes(bot, document.file_id, document.file_unique_id)
+
+        # The posts are inserted as they are parsed, a broken file leaves none of them
+        try:
+            result = import_posts(db_session, user.id, parse_posts(document.file_name, io.BytesIO(content)))
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Error importing posts of user {user.id}: {e}")
+            bot.send_message(
+                chat_id=user.id,
+                text=strings[user.lang].import_failed.format(error=e),
+                reply_markup=create_cancel_button(user.lang)
+            )
+            return
+
+        scheduled = scheduler_services.schedule_publish_posts(result.schedules)
+        lines = [strings[user.lang].import_summary.format(created=result.created, scheduled=scheduled)]
+        if result.skipped:
+            lines.append(strings[user.lang].import_skipped.format(skipped=result.skipped))
+        if result.unscheduled:
+            lines.append(strings[user.lang].import_unscheduled.format(unscheduled=result.unscheduled))
+
+        data["state"].set(PostState.my_posts)
+        page = read_posts_page(db_session, user.id)
+        bot.send_message(
+            chat_id=user.id,
+            text="\n".join(lines),
+            reply_markup=create_posts_list_markup(user.lang, page.items, page)
+        )
+
     @bot.callback_query_handler(func=lambda call: call.data.startswith("view_post_"))
     def view_post(call: types.CallbackQuery, data: dict):
         user = data["user"]
@@ -165,11 +324,12 @@ def register_handlers(bot: TeleBot):
         post = read_post(db_session, post_id)
 
         if not post:
+            page = read_posts_page(db_session, user.id)
             bot.edit_message_text(
                 chat_id=user.id,
                 message_id=call.message.message_id,
                 text=strings[user.lang].post_not_found,
-                reply_markup=create_posts_list_markup(user.lang, read_posts_by_owner(db_session, user.id))
+                reply_markup=create_posts_list_markup(user.lang, page.items, page)
             )
             return
 
@@ -188,11 +348,20 @@ def register_handlers(bot: TeleBot):
 
         markup = create_post_action_markup(user.lang, post.id)
 
-
-        if post.photo_id:
+        media = read_post_media(db_session, post)
+        if len(media) > 1:
+            # A media group cannot carry buttons, they come with the text
+            bot.send_media_group(chat_id=user.id, media=build_album(media[:config.app.publishing.max_album_size]))
+            bot.send_message(
+                chat_id=user.id,
+                text=message_text,
+                reply_markup=markup,
+                parse_mode="HTML"
+            )
+        elif media:
             bot.send_photo(
                 chat_id=user.id,
-                photo=post.photo_id,
+                photo=media[0][1],
                 caption=message_text,
                 reply_markup=markup,
                 parse_mode="HTML"
@@ -229,67 +398,82 @@ def register_handlers(bot: TeleBot):
             )
             return
 
-        # Create markup with user channels
-        markup = types.InlineKeyboardMarkup(row_width=1)
-        for channel in channels:
-            markup.add(types.InlineKeyboardButton(
-                text=channel.name,
-                callback_data=f"channel_{channel.id}_post_{post_id}"
-            ))
-        
-        # Add back button
-        markup.add(types.InlineKeyboardButton(
-            text=strings[user.lang].back_button,
-            callback_data=f"view_post_{post_id}"
-        ))
-        
+        # The channels ticked so far, the post goes to all of them at once
+        data["state"].add_data(publish_channels=[])
+
         bot.send_message(
             user.id,
-            text=strings[user.lang].select_channel_for_publish,
-            reply_markup=markup
+            text=strings[user.lang].select_channels_for_publish,
+            reply_markup=create_publish_channels_markup(user.lang, channels, set(), post_id)
         )
 
-    @bot.callback_query_handler(func=lambda call: call.data.startswith("channel_"), state=PostState.select_channel)
+    @bot.callback_query_handler(
+        func=lambda call: call.data.startswith(("publish_toggle_", "publish_all_")), state=PostState.select_channel
+    )
     def handle_channel_selection(call: types.CallbackQuery, data: dict):
         user = data["user"]
         
-        # Extract channel_id and post_id from callback data
-        # Format: channel_{channel_id}_post_{post_id}
+        # Extract post_id and channel_id from callback data
+        # Format: publish_toggle_{post_id}_{channel_id} or publish_all_{post_id}
         parts = call.data.split("_")
-        channel_id = int(parts[1])
-        post_id = int(parts[3])
-        
-        # Get the selected channel to verify it exists and belongs to the user
-        channel = db_session.query(Channel).filter(
-            Channel.id == channel_id,
-            Channel.owner_id == user.id
-        ).first()
-        
-        if not channel:
-            bot.answer_callback_query(
-                call.id,
-                text=strings[user.lang].channel_not_found,
-                show_alert=True
-            )
-            return
-        
-        # Now publish the post to the selected channel
-        success = publish_post(db_session, bot, post_id, channel_id)
-        
-        if success:
-            bot.answer_callback_query(
-                call.id,
-                text=strings[user.lang].post_published_success,
-                show_alert=True
-            )
-            # Return to my posts
-            my_posts(call, data)
+        post_id = int(parts[2])
+
+        channels = db_session.query(Channel).filter(Channel.owner_id == user.id).all()
+        with data["state"].data() as data_items:
+            selected = set(data_items.get("publish_channels") or [])
+
+        if parts[1] == "all":
+            selected = {channel.id for channel in channels}
         else:
+            selected ^= {int(parts[3])}
+        data["state"].add_data(publish_channels=sorted(selected))
+
+        bot.edit_message_reply_markup(
+            chat_id=user.id,
+            message_id=call.message.message_id,
+            reply_markup=create_publish_channels_markup(user.lang, channels, selected, post_id)
+        )
+
+    @bot.callback_query_handler(
+        func=lambda call: call.data.startswith("publish_send_"), state=PostState.select_channel
+    )
+    def handle_publish_selected(call: types.CallbackQuery, data: dict):
+        user = data["user"]
+        post_id = int(call.data.split("_")[2])
+
+        with data["state"].data() as data_items:
+            selected = data_items.get("publish_channels") or []
+
+        if not selected:
             bot.answer_callback_query(
                 call.id,
-                text=strings[user.lang].post_published_error,
+                text=strings[user.lang].no_channels_selected,
                 show_alert=True
             )
+            return
+        bot.answer_callback_query(call.id)
+
+        # Sent to every channel concurrently, the user gets one summary
+        publications = publish_to_channels(db_session, bot, post_id, selected)
+        names = {
+            channel.id: channel.name
+            for channel in db_session.query(Channel).filter(Channel.id.in_(selected))
+        }
+        sent = [publication for publication in publications if publication.status == "sent"]
+        lines = [strings[user.lang].publish_summary.format(sent=len(sent), total=len(publications))]
+        for publication in publications:
+            if publication.status == "sent":
+                lines.append(f"✅ {names.get(publication.channel_id)}")
+            else:
+                lines.append(f"❌ {names.get(publication.channel_id)}: {publication.error}")
+
+        data["state"].set(PostState.view_post)
+        bot.edit_message_text(
+            chat_id=user.id,
+            message_id=call.message.message_id,
+            text="\n".join(lines),
+            reply_markup=create_post_action_markup(user.lang, post_id)
+        )
     
     @bot.callback_query_handler(func=lambda call: call.data.startswith("schedule_post_"))
     def handle_schedule_post(call: types.CallbackQuery, data: dict):
@@ -359,8 +543,8 @@ def register_handlers(bot: TeleBot):
                 Channel.id == channel_id,
                 Channel.owner_id == user.id
             ).first()
-            success = scheduler_services.schedule_publish_post(
-                db_session, channel.link, post_id, scheduled_time
+            success = channel is not None and scheduler_services.schedule_publish_post(
+                db_session, channel.id, post_id, scheduled_time
             )
 
         if success:
@@ -415,8 +599,8 @@ def register_handlers(bot: TeleBot):
                 Channel.id == channel_id,
                 Channel.owner_id == user.id
             ).first()
-            success = scheduler_services.schedule_publish_post(
-                db_session, channel.link, post_id, scheduled_time
+            success = channel is not None and scheduler_services.schedule_publish_post(
+                db_session, channel.id, post_id, scheduled_time
             )
 
         if success:
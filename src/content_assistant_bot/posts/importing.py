@@ -0,0 +1,253 @@
+import csv
+import io
+import json
+import logging
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional
+
+from omegaconf import OmegaConf
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..channels.models import Channel
+from ..channels.service import channel_tag
+from .models import Post
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+# Separator of the posts in a Markdown file
+MARKDOWN_SEPARATOR = "---"
+# Metadata lines allowed at the top of a Markdown post
+MARKDOWN_FIELDS = ("channel:", "publish_at:")
+
+
+class ImportedPost(NamedTuple):
+    """ One post read from an uploaded file """
+
+    title: str
+    content: str
+    # Name, link or @username of one of the user's channels
+    channel: Optional[str] = None
+    publish_at: Optional[str] = None
+
+
+class ImportResult(NamedTuple):
+    """ What an import created and which publications it asks for """
+
+    created: int
+    skipped: int
+    # (post_id, channel_id, publish_at) of the posts to publish later
+    schedules: list[tuple[int, int, datetime]]
+    # Posts with a channel or publish time that could not be used
+    unscheduled: int
+
+
+class PostImportError(ValueError):
+    """ The uploaded file cannot be imported """
+
+
+def _text_stream(stream: BinaryIO) -> io.TextIOWrapper:
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+
+
+def _from_record(record: dict) -> ImportedPost:
+    fields = {str(key).strip().lower(): value for key, value in record.items()}
+    return ImportedPost(
+        title=str(fields.get("title") or "").strip(),
+        content=str(fields.get("content") or fields.get("text") or "").strip(),
+        channel=str(fields.get("channel") or "").strip() or None,
+        publish_at=str(fields.get("publish_at") or "").strip() or None,
+    )
+
+
+def parse_csv(stream: BinaryIO) -> Iterator[ImportedPost]:
+    """ Read posts from CSV rows with `title`, `content` and optional `channel` and `publish_at` columns """
+    for row in csv.DictReader(_text_stream(stream)):
+        yield _from_record(row)
+
+
+def parse_json(stream: BinaryIO) -> Iterator[ImportedPost]:
+    """ Read posts from a JSON array of objects, or from JSON Lines """
+    text = _text_stream(stream)
+    first = text.read(1)
+    while first and first.isspace():
+        first = text.read(1)
+    if first == "[":
+        for record in json.loads(first + text.read()):
+            yield _from_record(record)
+        return
+
+    line = first + text.readline()
+    try:
+        record = json.loads(line) if line.strip() else None
+    except json.JSONDecodeError:
+        # One object spread over several lines, with the posts under "posts"
+        for record in json.loads(line + text.read()).get("posts", []):
+            yield _from_record(record)
+        return
+
+    if record is not None:
+        yield _from_record(record)
+
+    # JSON Lines are read one line at a time
+    for line in text:
+        if line.strip():
+            yield _from_record(json.loads(line))
+
+
+def parse_markdown(stream: BinaryIO) -> Iterator[ImportedPost]:
+    """
+    Read posts from Markdown separated by `---` lines.
+
+    A leading `# ` heading becomes the title, and `channel:` and
+    `publish_at:` lines right after it set where and when to publish.
+    """
+    lines: list[str] = []
+    for line in _text_stream(stream):
+        if line.strip() == MARKDOWN_SEPARATOR:
+            yield _markdown_post(lines)
+            lines = []
+        else:
+            lines.append(line.rstrip("\r\n"))
+    yield _markdown_post(lines)
+
+
+def _markdown_post(lines: list[str]) -> ImportedPost:
+    while lines and not lines[0].strip():
+        lines.pop(0)
+    title = ""
+    if lines and lines[0].startswith("# "):
+        title = lines.pop(0)[2:].strip()
+    fields = {}
+    while lines and lines[0].strip().lower().startswith(MARKDOWN_FIELDS):
+        key, _, value = lines.pop(0).partition(":")
+        fields[key.strip().lower()] = value.strip()
+    return ImportedPost(
+        title, "\n".join(lines).strip(), fields.get("channel") or None, fields.get("publish_at") or None
+    )
+
+
+PARSERS = {
+    ".csv": parse_csv,
+    ".json": parse_json,
+    ".jsonl": parse_json,
+    ".md": parse_markdown,
+    ".markdown": parse_markdown,
+    ".txt": parse_markdown,
+}
+
+
+def parse_posts(file_name: str, stream: BinaryIO) -> Iterator[ImportedPost]:
+    """
+    Read the posts of an uploaded file, one at a time.
+
+    CSV, JSON Lines and Markdown are parsed as they are read. A zip archive
+    is read member by member, each parsed by its own extension, and members
+    larger than `max_file_bytes` uncompressed are refused before reading.
+
+    Raises:
+        PostImportError: If the file type is not supported or the archive is too large.
+    """
+    extension = Path(file_name or "").suffix.lower()
+    if extension == ".zip":
+        with zipfile.ZipFile(stream) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or Path(member.filename).suffix.lower() not in PARSERS:
+                    continue
+                if member.file_size > config.app.imports.max_file_bytes:
+                    raise PostImportError(f"{member.filename} is too large")
+                with archive.open(member) as member_stream:
+                    yield from parse_posts(member.filename, member_stream)
+        return
+
+    parser = PARSERS.get(extension)
+    if parser is None:
+        raise PostImportError(f"Unsupported file type {extension or file_name}")
+    yield from parser(stream)
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    # The scheduler works in naive local time, so a time with an offset is converted to it
+    return parsed.astimezone().replace(tzinfo=None) if parsed.tzinfo is not None else parsed
+
+
+def import_posts(db_session: Session, owner_id: int, posts: Iterable[ImportedPost]) -> ImportResult:
+    """
+    Save imported posts, inserting them in batches with one statement each.
+
+    A post with both a channel of the user and a future publish time is
+    scheduled for it; the schedules are returned so that they can be
+    registered together.
+
+    Args:
+        db_session: The database session.
+        owner_id: The user importing the posts.
+        posts: The posts, as read by `parse_posts`.
+
+    Returns:
+        ImportResult: The number of created and skipped posts and the publications to schedule.
+    """
+    channels = {}
+    for channel in db_session.query(Channel).filter(Channel.owner_id == owner_id):
+        for key in (channel.name, channel.link, channel_tag(channel.link)):
+            channels[key.strip().lower()] = channel.id
+
+    created = skipped = unscheduled = 0
+    schedules = []
+    batch: list[tuple[dict, Optional[int], Optional[datetime]]] = []
+    now = datetime.now()
+
+    def flush():
+        # executemany with RETURNING gives the ids in the order of the rows
+        ids = db_session.execute(
+            insert(Post).returning(Post.id, sort_by_parameter_order=True), [row for row, _, _ in batch]
+        ).scalars().all()
+        for post_id, (_, channel_id, publish_at) in zip(ids, batch, strict=True):
+            if publish_at is not None:
+                schedules.append((post_id, channel_id, publish_at))
+        batch.clear()
+
+    for post in posts:
+        if not post.content or created >= config.app.imports.max_posts:
+            skipped += 1
+            continue
+
+        channel_id = channels.get(post.channel.lower()) if post.channel else None
+        publish_at = _parse_time(post.publish_at)
+        if channel_id is None or publish_at is None or publish_at <= now:
+            if post.channel or post.publish_at:
+                unscheduled += 1
+            channel_id = publish_at = None
+
+        batch.append(({
+            "title": post.title,
+            "content": post.content,
+            "owner_id": owner_id,
+            "scheduled_time": publish_at,
+            "is_published": False,
+            "created_at": now,
+            "updated_at": now,
+        }, channel_id, publish_at))
+        created += 1
+        if len(batch) >= config.app.imports.batch_size:
+            flush()
+    if batch:
+        flush()
+    db_session.commit()
+
+    logger.info(f"Imported {created} posts for user {owner_id}, {len(schedules)} to schedule")
+    return ImportResult(created, skipped, schedules, unscheduled)
@@ -2,10 +2,13 @@ import logging
 import logging.config
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 
 from omegaconf import OmegaConf
 from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from ..channels.models import Channel
+from ..database.pagination import Page, page_callback
 from .models import Post
 
 # Load configuration
@@ -37,8 +40,10 @@ def create_posts_menu_markup(lang: str) -> InlineKeyboardMarkup:
     return markup
 
 
-def create_posts_list_markup(lang: str, posts: list[Post]) -> InlineKeyboardMarkup:
-    """ Create the posts list markup """
+def create_posts_list_markup(
+    lang: str, posts: list[Post], page: Optional[Page] = None, page_prefix: str = "posts_page"
+) -> InlineKeyboardMarkup:
+    """ Create the posts list markup, with page buttons when there are more posts """
     markup = InlineKeyboardMarkup()
     for post in posts:
         # Show published status in the button title
@@ -47,10 +52,44 @@ def create_posts_list_markup(lang: str, posts: list[Post]) -> InlineKeyboardMark
         button_text = f"{status} {title}"
         markup.add(InlineKeyboardButton(button_text, callback_data=f"view_post_{post.id}"))
 
+    # The cursors of the neighbouring pages travel in the callback data
+    buttons = []
+    if page and page.previous_cursor:
+        buttons.append(InlineKeyboardButton(
+            strings[lang].previous_page, callback_data=page_callback(page_prefix, "prev", page.previous_cursor)
+        ))
+    if page and page.next_cursor:
+        buttons.append(InlineKeyboardButton(
+            strings[lang].next_page, callback_data=page_callback(page_prefix, "next", page.next_cursor)
+        ))
+    if buttons:
+        markup.row(*buttons)
+    markup.row(
+        InlineKeyboardButton(strings[lang].search_posts, callback_data="search_posts"),
+        InlineKeyboardButton(strings[lang].import_posts, callback_data="import_posts"),
+    )
     markup.add(InlineKeyboardButton(strings[lang].back_to_menu, callback_data="menu"))
     return markup
 
 
+def create_publish_channels_markup(
+    lang: str, channels: list[Channel], selected: set[int], post_id: int
+) -> InlineKeyboardMarkup:
+    """ Create the markup for ticking the channels to publish a post to """
+    markup = InlineKeyboardMarkup(row_width=1)
+    for channel in channels:
+        mark = "✅" if channel.id in selected else "⬜"
+        markup.add(InlineKeyboardButton(
+            f"{mark} {channel.name}", callback_data=f"publish_toggle_{post_id}_{channel.id}"
+        ))
+    markup.add(InlineKeyboardButton(strings[lang].select_all_channels, callback_data=f"publish_all_{post_id}"))
+    markup.add(InlineKeyboardButton(
+        strings[lang].publish_selected.format(count=len(selected)), callback_data=f"publish_send_{post_id}"
+    ))
+    markup.add(InlineKeyboardButton(strings[lang].back_button, callback_data=f"view_post_{post_id}"))
+    return markup
+
+
 def create_post_action_markup(lang: str, post_id: int) -> InlineKeyboardMarkup:
     """ Create the post action markup """
     markup = InlineKeyboardMarkup()
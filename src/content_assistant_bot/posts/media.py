@@ -0,0 +1,41 @@
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from telebot.types import InputMedia, InputMediaPhoto, InputMediaVideo
+
+from .models import Post, PostMedia
+
+INPUT_MEDIA = {"photo": InputMediaPhoto, "video": InputMediaVideo}
+
+
+def add_post_media(db_session: Session, post_id: int, file_id: str, media_type: str = "photo") -> int:
+    """ Append a photo or video to the album of a post and return the album size """
+    position = db_session.query(func.coalesce(func.max(PostMedia.position) + 1, 0)).filter(
+        PostMedia.post_id == post_id
+    ).scalar()
+    db_session.add(PostMedia(post_id=post_id, position=position, media_type=media_type, file_id=file_id))
+    db_session.commit()
+    return position + 1
+
+
+def read_post_media(db_session: Session, post: Post) -> list[tuple[str, str]]:
+    """ Get the (media_type, file_id) of the album of a post, in order """
+    rows = (
+        db_session.query(PostMedia.media_type, PostMedia.file_id)
+        .filter(PostMedia.post_id == post.id)
+        .order_by(PostMedia.position.asc())
+        .all()
+    )
+    if rows:
+        return [(row.media_type, row.file_id) for row in rows]
+    # Posts saved before albums keep their only photo in photo_id
+    return [("photo", post.photo_id)] if post.photo_id else []
+
+
+def build_album(media: list[tuple[str, str]], caption: Optional[str] = None) -> list[InputMedia]:
+    """ Build a media group from stored file_ids, with the caption on the first item as Telegram shows it """
+    return [
+        INPUT_MEDIA[media_type](file_id, caption=caption if index == 0 else None)
+        for index, (media_type, file_id) in enumerate(media)
+    ]
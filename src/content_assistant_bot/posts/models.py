@@ -1,12 +1,15 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 
+from ..channels.models import Channel  # noqa: F401 - registers the table post_publications refers to
 from ..models import Base, TimeStampMixin
 
 
 class Post(Base, TimeStampMixin):
     """ Post model for storing generated content """
     __tablename__ = "posts"
+    # Serves the pages of a user's posts
+    __table_args__ = (Index("ix_posts_owner_id_created_at_id", "owner_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True)
     title = Column(String, nullable=True)
@@ -19,3 +22,31 @@ class Post(Base, TimeStampMixin):
 
     # owner = relationship("User", back_populates="posts", lazy="joined")
     # style = relationship("Style", back_populates="posts", lazy="joined")
+
+
+class PostPublication(Base, TimeStampMixin):
+    """ Result of sending a post to one channel """
+    __tablename__ = "post_publications"
+
+    id = Column(Integer, primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False, index=True)
+    channel_id = Column(Integer, ForeignKey("channels.id"), nullable=False)
+    # "sent" or "failed"
+    status = Column(String, nullable=False)
+    # The message in the channel, when it was sent
+    message_id = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+
+
+class PostMedia(Base, TimeStampMixin):
+    """ A photo or video of a post, in album order """
+    __tablename__ = "post_media"
+    __table_args__ = (UniqueConstraint("post_id", "position", name="uq_post_media_post_id_position"),)
+
+    id = Column(Integer, primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    # "photo" or "video"
+    media_type = Column(String, nullable=False, default="photo")
+    # Telegram file_id, sending it again does not upload the file
+    file_id = Column(String, nullable=False)
@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, NamedTuple, Optional, Union
+
+from omegaconf import OmegaConf
+from sqlalchemy.orm import Session
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
+
+from ..channels.models import Channel
+from ..channels.service import ChannelAccess, cached_access, resolve_channel, store_access
+from .media import build_album, read_post_media
+from .models import Post, PostPublication
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+
+class RateLimiter:
+    """ Spaces out calls so that at most `rate` of them start per second, across threads """
+
+    def __init__(self, rate: float):  # noqa: D107
+        self.interval = 1 / rate
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:  # noqa: D102
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_at)
+            self.next_at = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+# Shared by all publications, so that concurrent users stay within the limits of the bot together
+publish_executor = ThreadPoolExecutor(
+    max_workers=config.app.publishing.max_concurrency, thread_name_prefix="publish"
+)
+rate_limiter = RateLimiter(config.app.publishing.messages_per_second)
+
+
+class Delivery(NamedTuple):
+    """ What happened when sending a post to one channel """
+
+    # A fresh check of the channel, None when the cached one was used
+    access: Optional[ChannelAccess]
+    message_id: Optional[int]
+    error: Optional[str]
+
+
+def call_telegram(chat_id: Union[int, str], send: Callable[[], Any]) -> Any:
+    """ Make one rate limited API call, waiting out "Too Many Requests" answers """
+    attempt = 0
+    while True:
+        rate_limiter.wait()
+        try:
+            return send()
+        except ApiTelegramException as e:
+            if e.error_code != 429 or attempt >= config.app.publishing.max_retries:
+                raise
+            attempt += 1
+            retry_after = (e.result_json.get("parameters") or {}).get("retry_after", 1)
+            logger.warning(f"Telegram asked to wait {retry_after}s before sending to {chat_id}")
+            time.sleep(retry_after)
+
+
+def send_media(bot: TeleBot, chat_id: Union[int, str], media: list[tuple[str, str]], caption: Optional[str]) -> int:
+    """ Send photos or videos as one message, a media group needs at least two of them """
+    if len(media) == 1:
+        media_type, file_id = media[0]
+        send = bot.send_video if media_type == "video" else bot.send_photo
+        return call_telegram(chat_id, lambda: send(chat_id, file_id, caption=caption)).message_id
+    album = build_album(media, caption)
+    return call_telegram(chat_id, lambda: bot.send_media_group(chat_id=chat_id, media=album))[0].message_id
+
+
+def send_to_channel(
+    bot: TeleBot, chat_id: Union[int, str], content: str, media: Optional[list[tuple[str, str]]] = None
+) -> int:
+    """
+    Send a post with its album to a channel.
+
+    Several photos or videos go out as media groups of at most
+    `max_album_size` items, by their stored file_ids, so nothing is uploaded
+    again. The items are split evenly between the groups, so that no group
+    is left with a single item. A text too long for a caption is caught
+    before sending and follows the media as its own message.
+
+    Returns:
+        int: The message_id of the first message of the post in the channel.
+    """
+    settings = config.app.publishing
+    if not media:
+        return call_telegram(chat_id, lambda: bot.send_message(chat_id=chat_id, text=content)).message_id
+
+    caption = content if len(content) <= settings.max_caption_length else None
+    groups = -(-len(media) // settings.max_album_size)
+    first = None
+    start = 0
+    for index in range(groups):
+        end = start + (len(media) - start) // (groups - index)
+        message_id = send_media(bot, chat_id, media[start:end], caption if index == 0 else None)
+        first = first or message_id
+        start = end
+
+    if caption is None and content:
+        call_telegram(chat_id, lambda: bot.send_message(chat_id=chat_id, text=content))
+    return first
+
+
+def deliver(
+    bot: TeleBot, link: str, access: Optional[ChannelAccess], content: str, media: list[tuple[str, str]]
+) -> Delivery:
+    """
+    Send a post to a channel by its resolved chat_id.
+
+    Without a trusted cached `access` the channel is looked up and the bot's
+    rights are checked first, so a channel the bot cannot post to fails
+    without a send attempt.
+    """
+    refreshed = None
+    try:
+        if access is None:
+            access = refreshed = resolve_channel(bot, link)
+        if not access.can_post:
+            return Delivery(refreshed, None, "The bot is not an administrator allowed to post in the channel")
+        return Delivery(refreshed, send_to_channel(bot, access.chat_id, content, media), None)
+    except Exception as e:
+        return Delivery(refreshed, None, str(e))
+
+
+def publish_to_channels(
+    db_session: Session, bot: TeleBot, post_id: int, channel_ids: list[int]
+) -> list[PostPublication]:
+    """
+    Publish a post to several channels at once.
+
+    The messages are sent concurrently within the rate limit of the bot to
+    the chat_id stored with each channel, which is checked again with
+    get_chat and get_chat_member once its check is older than the TTL. The
+    result of every channel is stored in `post_publications`. Only the
+    channels of the post's owner are used. The post is marked published when
+    at least one channel received it.
+
+    Args:
+        db_session: The database session.
+        bot: The bot sending the messages.
+        post_id: The post to publish.
+        channel_ids: The channels to publish to.
+
+    Returns:
+        list[PostPublication]: The result of each of the owner's channels, in the order of `channel_ids`.
+    """
+    post = db_session.query(Post).filter(Post.id == post_id).first()
+    if not post:
+        return []
+    channels = {
+        channel.id: channel
+        for channel in db_session.query(Channel).filter(
+            Channel.id.in_(channel_ids), Channel.owner_id == post.owner_id
+        )
+    }
+    targets = [channels[channel_id] for channel_id in dict.fromkeys(channel_ids) if channel_id in channels]
+
+    # The worker threads only talk to Telegram, the session stays in this thread
+    media = read_post_media(db_session, post)
+    futures = [
+        publish_executor.submit(deliver, bot, channel.link, cached_access(channel), post.content, media)
+        for channel in targets
+    ]
+    publications = []
+    for channel, future in zip(targets, futures, strict=True):
+        delivery = future.result()
+        if delivery.access is not None:
+            store_access(channel, delivery.access)
+        if delivery.error is None:
+            publications.append(PostPublication(
+                post_id=post.id, channel_id=channel.id, status="sent", message_id=delivery.message_id
+            ))
+        else:
+            logger.error(f"Error sending post {post.id} to channel {channel.id}: {delivery.error}")
+            # The rights may have changed, check them again before the next post
+            store_access(channel, None)
+            publications.append(PostPublication(
+                post_id=post.id, channel_id=channel.id, status="failed", error=delivery.error
+            ))
+
+    try:
+        db_session.add_all(publications)
+        if any(publication.status == "sent" for publication in publications):
+            post.is_published = True
+        db_session.commit()
+    except Exception as e:
+        db_session.rollback()
+        logger.error(f"Error saving publications of post {post.id}: {e}")
+    return publications
@@ -0,0 +1,166 @@
+import logging
+import re
+from pathlib import Path
+from typing import Optional
+
+from omegaconf import OmegaConf
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, load_only
+
+from ..database.pagination import Page
+from .models import Post
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+SQLITE_STATEMENTS = [
+    # External content table: the text stays in posts, FTS5 keeps only the index
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts "
+    "USING fts5(title, content, content='posts', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN "
+    "INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, content ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+]
+
+# The search query must repeat the indexed expression exactly for Postgres to use the index
+POSTGRES_STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_posts_search ON posts "
+    "USING gin (to_tsvector('simple', coalesce(title, '') || ' ' || content))",
+]
+
+SEARCH_STATEMENTS = {
+    "sqlite": text(
+        "SELECT posts.id FROM posts_fts JOIN posts ON posts.id = posts_fts.rowid "
+        "WHERE posts_fts MATCH :match AND posts.owner_id = :owner_id "
+        "ORDER BY bm25(posts_fts, 2.0, 1.0), posts.id DESC LIMIT :limit OFFSET :offset"
+    ),
+    "postgresql": text(
+        "SELECT id FROM posts WHERE owner_id = :owner_id "
+        "AND to_tsvector('simple', coalesce(title, '') || ' ' || content) @@ to_tsquery('simple', :match) "
+        "ORDER BY ts_rank(to_tsvector('simple', coalesce(title, '') || ' ' || content), "
+        "to_tsquery('simple', :match)) DESC, id DESC LIMIT :limit OFFSET :offset"
+    ),
+}
+
+
+def create_search_index(connection: Connection) -> None:
+    """
+    Create the full-text index of posts for the connected database.
+
+    SQLite gets an FTS5 table filled by triggers on `posts`, Postgres a GIN
+    index on the tsvector of the title and content. Either way the index is
+    updated by the database itself on every insert, update and delete, so
+    `create_post`, `update_post_content` and the generated drafts are all
+    searchable right away. Safe to call on a database that already has it.
+    """
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'")
+        ).first()
+        for statement in SQLITE_STATEMENTS:
+            connection.execute(text(statement))
+        if not exists:
+            # Index the posts written before the search existed
+            connection.execute(text("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')"))
+    elif dialect == "postgresql":
+        for statement in POSTGRES_STATEMENTS:
+            connection.execute(text(statement))
+    else:
+        logger.warning(f"Full-text search of posts is not supported on {dialect}")
+
+
+def drop_search_index(connection: Connection) -> None:
+    """ Drop the full-text index of posts, the Postgres index and SQLite triggers go with the posts table """
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS posts_fts"))
+
+
+@event.listens_for(Post.__table__, "after_create")
+def _create_search_index(target, connection: Connection, **kwargs) -> None:
+    create_search_index(connection)
+
+
+# Left behind, the index would point the ids of new posts at the text of dropped ones
+@event.listens_for(Post.__table__, "before_drop")
+def _drop_search_index(target, connection: Connection, **kwargs) -> None:
+    drop_search_index(connection)
+
+
+def search_terms(query: str) -> list[str]:
+    """ Split a search query into words, leaving out the search syntax of the database """
+    return TOKEN_PATTERN.findall(query.lower())[: config.app.search.max_terms]
+
+
+def search_posts(
+    db_session: Session, owner_id: int, query: str, cursor: Optional[str] = None, limit: Optional[int] = None
+) -> Page:
+    """
+    Find a user's posts containing all words of a query, best matches first.
+
+    Every word also matches longer words starting with it. Results are ranked
+    by BM25 on SQLite and ts_rank on Postgres, with titles weighted higher on
+    SQLite. A ranking has no stable key to seek to, so the cursors of the
+    returned page are offsets into the results.
+
+    Args:
+        db_session: The database session.
+        owner_id: The user whose posts are searched.
+        query: The words to look for.
+        cursor: The offset of the page, as returned in a previous page, None for the first page.
+        limit: Posts per page.
+
+    Returns:
+        Page: The matching posts with only the columns the list shows, and the cursors of the neighbouring pages.
+    """
+    limit = limit or config.app.search.page_size
+    offset = int(cursor) if cursor else 0
+    terms = search_terms(query)
+    if not terms:
+        return Page([], None, None)
+
+    dialect = db_session.get_bind().dialect.name
+    statement = SEARCH_STATEMENTS.get(dialect)
+    if statement is None:
+        logger.warning(f"Full-text search of posts is not supported on {dialect}")
+        return Page([], None, None)
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+    else:
+        match = " & ".join(f"{term}:*" for term in terms)
+
+    # One more row tells whether there is a next page
+    ids = db_session.execute(
+        statement, {"match": match, "owner_id": owner_id, "limit": limit + 1, "offset": offset}
+    ).scalars().all()
+    more = len(ids) > limit
+    ids = ids[:limit]
+    if not ids:
+        return Page([], None, None)
+
+    posts = (
+        db_session.query(Post)
+        .options(load_only(Post.id, Post.title, Post.is_published, Post.created_at))
+        .filter(Post.id.in_(ids))
+        .all()
+    )
+    order = {post_id: position for position, post_id in enumerate(ids)}
+    posts.sort(key=lambda post: order[post.id])
+    return Page(
+        posts,
+        str(max(offset - limit, 0)) if offset else None,
+        str(offset + limit) if more else None,
+    )
@@ -2,10 +2,13 @@ import logging
 from datetime import datetime
 from typing import Optional
 
-from content_assistant_bot.channels.service import read_channel
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 
+from ..database.pagination import Page, paginate
+
+from .media import add_post_media
 from .models import Post
+from .publishing import publish_to_channels
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +28,8 @@ def create_post(db_session: Session, title: str, content: str, owner_id: int, ph
     db_session.add(post)
     db_session.commit()
     db_session.refresh(post)
+    if photo_id:
+        add_post_media(db_session, post.id, photo_id)
     return post
 
 # Post related functions
@@ -33,6 +38,18 @@ def read_posts_by_owner(db_session: Session, owner_id: int, skip: int = 0, limit
     return db_session.query(Post).filter(Post.owner_id == owner_id).offset(skip).limit(limit).all()
 
 
+def read_posts_page(
+    db_session: Session, owner_id: int, cursor: Optional[str] = None, direction: str = "next", limit: int = 10
+) -> Page:
+    """ Get one page of a user's posts, newest first, with only the columns the list shows """
+    query = (
+        db_session.query(Post)
+        .options(load_only(Post.id, Post.title, Post.is_published, Post.created_at))
+        .filter(Post.owner_id == owner_id)
+    )
+    return paginate(query, Post, limit, cursor, direction)
+
+
 def read_post(db_session: Session, post_id: int):
     """ Get a post by ID """
     return db_session.query(Post).filter(Post.id == post_id).first()
@@ -50,41 +67,8 @@ def publish_post(db_session, bot, post_id, channel_id=None):
     Returns:
         bool: True if post was published successfully, False otherwise
     """
-    post = db_session.query(Post).filter(Post.id == post_id).first()
-
-    if not post:
-        return False
-
-    try:
-        # Send the post to the specified channel
-        channel = read_channel(db_session, channel_id)
-        channel_tag = f"@{channel.link.split('/')[-1]}"
-
-        if post.photo_id:
-            bot.send_photo(
-                chat_id=channel_tag,
-                photo=post.photo_id,
-                caption=post.content
-            )
-        else:
-            bot.send_message(
-                chat_id=channel_tag,
-                text=post.content
-            )
-    except Exception as e:
-        logger.error(f"Error sending message to channel: {e}")
-        return False
-    try:
-
-        post.is_published = True
-        post.published_at = datetime.now()
-        db_session.commit()
-
-        return True
-    except Exception as e:
-        db_session.rollback()
-        logger.error(f"Error publishing post: {e}")
-        return False
+    publications = publish_to_channels(db_session, bot, post_id, [channel_id])
+    return any(publication.status == "sent" for publication in publications)
 
 
 def schedule_post(db_session: Session, post_id: int, scheduled_time: datetime) -> bool:
@@ -6,7 +6,7 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
 
 from ..posts.models import Post
-from .tasks import publish_post
+from .tasks import publish_scheduled_post, publish_scheduled_posts
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -26,7 +26,7 @@ def init_scheduler():
 
 
 def schedule_publish_post(
-    db_session: Session, channel_link: str,
+    db_session: Session, channel_id: int,
     post_id: int, scheduled_time: datetime
     ):
     """
@@ -34,7 +34,7 @@ def schedule_publish_post(
 
     Args:
         db_session: SQLAlchemy database session
-        bot: Bot instance
+        channel_id: ID of the channel to publish to
         post_id: ID of the post to schedule
         scheduled_time: Time to publish the post
     Returns:
@@ -48,10 +48,10 @@ def schedule_publish_post(
 
         # Schedule the job
         scheduler.add_job(
-            publish_post,
+            publish_scheduled_post,
             'date',
             run_date=scheduled_time,
-            args=[channel_link, post.content, post.photo_id],
+            args=[post_id, channel_id],
         )
         logger.info(f"Post {post_id} scheduled for publication at {post.scheduled_time}.")
         db_session.commit()
@@ -59,3 +59,30 @@ def schedule_publish_post(
     except Exception as e:
         logger.error(f"Error scheduling post {post_id}: {e}")
         return False
+
+
+def schedule_publish_posts(schedules: list[tuple[int, int, datetime]]) -> int:
+    """
+    Schedule many posts at once, with one job for each distinct time.
+
+    The posts' scheduled_time is expected to be saved already, as done by
+    the bulk import.
+
+    Args:
+        schedules: (post_id, channel_id, publish_at) of each publication
+    Returns:
+        int: The number of publications scheduled
+    """
+    by_time: dict[datetime, list[tuple[int, int]]] = {}
+    for post_id, channel_id, publish_at in schedules:
+        by_time.setdefault(publish_at, []).append((post_id, channel_id))
+
+    scheduled = 0
+    for publish_at, publications in by_time.items():
+        try:
+            scheduler.add_job(publish_scheduled_posts, 'date', run_date=publish_at, args=[publications])
+            scheduled += len(publications)
+        except Exception as e:
+            logger.error(f"Error scheduling {len(publications)} posts for {publish_at}: {e}")
+    logger.info(f"Scheduled {scheduled} publications in {len(by_time)} jobs")
+    return scheduled
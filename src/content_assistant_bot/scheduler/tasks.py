@@ -3,14 +3,57 @@ from datetime import datetime, timedelta
 
 from ..database.core import get_session
 from ..posts.models import Post
+from ..posts.publishing import publish_to_channels
 
 logger = logging.getLogger(__name__)
 
 
+def publish_scheduled_post(post_id: int, channel_id: int):
+    """
+    Publish a scheduled post to a channel by its resolved chat_id.
+
+    Args:
+        post_id: ID of the post to publish
+        channel_id: ID of the channel to publish to
+    """
+    from ..main import bot  # Import here to avoid circular imports
+
+    db_session = get_session()
+    try:
+        publications = publish_to_channels(db_session, bot, post_id, [channel_id])
+    finally:
+        db_session.close()
+    return any(publication.status == "sent" for publication in publications)
+
+
+def publish_scheduled_posts(publications: list[tuple[int, int]]):
+    """
+    Publish the posts scheduled for the same time.
+
+    Args:
+        publications: (post_id, channel_id) of each post and the channel to publish it to
+    """
+    from ..main import bot  # Import here to avoid circular imports
+
+    channels_by_post: dict[int, list[int]] = {}
+    for post_id, channel_id in publications:
+        channels_by_post.setdefault(post_id, []).append(channel_id)
+
+    db_session = get_session()
+    try:
+        for post_id, channel_ids in channels_by_post.items():
+            publish_to_channels(db_session, bot, post_id, channel_ids)
+    finally:
+        db_session.close()
+    return True
+
+
 def publish_post(channel_link: str, post_content: str, post_photo_id: str = None):
     """
     Schedule a post to be published at a specific time.
 
+    Jobs scheduled before channels had a resolved chat_id still call this.
+
     Args:
         channel_link: Bot instance
         post_content: Content of the post to schedule
@@ -34,7 +34,7 @@ def register_handlers(bot):
         )
 
         if is_new_user(db_session, user.id):
-            credit_balance(db_session, user.id, 25)
+            credit_balance(db_session, user.id, 25, reason="welcome_bonus")
             bot.send_message(
                 chat_id=message.chat.id,
                 text="Вам доступно 25 постов бесплатно!",
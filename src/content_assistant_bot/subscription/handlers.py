@@ -92,7 +92,7 @@ def register_handlers(bot):
 
         # Credit user balance
         subscription_plan = get_subscription_plan(db_session, subscription_plan_id)
-        credit_balance(db_session, user_id, subscription_plan.credits)
+        credit_balance(db_session, user_id, subscription_plan.credits, reason="subscription")
 
         bot.send_message(
             user_id,
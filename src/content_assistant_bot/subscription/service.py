@@ -4,7 +4,7 @@ from typing import Optional
 
 from sqlalchemy.orm import Session
 
-from ..auth.models import User
+from ..account.service import change_balance
 from .models import Payment, Subscription, SubscriptionPlan
 
 logging.basicConfig(level=logging.INFO)
@@ -157,11 +157,9 @@ def delete_subscription(db_session: Session, subscription_id: int):
     db_session.close()
 
 
-def credit_balance(db_session: Session, user_id: int, amount: float) -> None:
-    user = db_session.query(User).filter(User.id == user_id).first()
-    if user:
-        user.balance += amount
-        db_session.commit()
+def credit_balance(db_session: Session, user_id: int, amount: int, reason: str = "credit") -> None:
+    # One UPDATE, so a credit is not lost when the user spends credits at the same time
+    change_balance(db_session, user_id, int(amount), reason)
     db_session.close()
 
 
@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from content_assistant_bot.account import service as account_services
+from content_assistant_bot.account.models import CreditLedger
+from content_assistant_bot.auth.models import User
+
+
+def test_change_balance_records_ledger_and_rejects_overdraft(funded_user):
+    # Arrange
+    session_factory = funded_user(3)
+    db_session = session_factory()
+
+    # Act
+    credited = account_services.change_balance(db_session, 1, 10, "subscription")
+    debited = account_services.change_balance(db_session, 1, -13, "debit", "job:1")
+    rejected = account_services.change_balance(db_session, 1, -1, "debit")
+    missing = account_services.change_balance(db_session, 2, 5, "subscription")
+
+    # Assert
+    rows = db_session.query(CreditLedger.delta, CreditLedger.balance_after, CreditLedger.reason).all()
+    assert (credited, debited, rejected, missing) == (13, 0, None, None)
+    assert [tuple(row) for row in rows] == [(10, 13, "subscription"), (-13, 0, "debit")]
+
+
+def test_concurrent_debits_never_overspend(funded_user):
+    # Arrange
+    session_factory = funded_user(5)
+
+    # Act
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: account_services.debit_balance(1), range(12)))
+
+    # Assert
+    db_session = session_factory()
+    assert results.count(True) == 5
+    assert db_session.query(User.balance).filter(User.id == 1).scalar() == 0
+    assert db_session.query(CreditLedger).count() == 5
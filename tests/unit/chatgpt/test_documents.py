@@ -0,0 +1,70 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from omegaconf import OmegaConf
+
+from content_assistant_bot.chatgpt.documents import ConversionTimeoutError, DocumentConverter, DocumentTooLargeError
+
+SETTINGS = OmegaConf.create({"max_bytes": 1000, "max_workers": 1, "timeout_seconds": 5, "cache_max_chars": 100})
+
+
+class UnusedBot:
+    def get_file(self, file_id):
+        raise AssertionError("nothing should be downloaded")
+
+
+def make_document(file_unique_id: str, file_size: int):
+    return SimpleNamespace(file_id="id", file_unique_id=file_unique_id, file_size=file_size, file_name="file.pdf")
+
+
+def test_large_document_is_rejected_before_download():
+    # Arrange
+    converter = DocumentConverter(SETTINGS)
+
+    # Act / Assert
+    with pytest.raises(DocumentTooLargeError):
+        converter.convert(UnusedBot(), make_document("large", 5000))
+
+
+def test_converted_text_is_served_from_cache():
+    # Arrange
+    converter = DocumentConverter(SETTINGS)
+    converter.cache.put("known", "cached text")
+
+    # Act
+    text = converter.convert(UnusedBot(), make_document("known", 10))
+
+    # Assert
+    assert text == "cached text"
+
+
+def test_waiting_for_a_worker_does_not_count_against_the_timeout():
+    # Arrange
+    converter = DocumentConverter(OmegaConf.merge(SETTINGS, {"timeout_seconds": 2}))
+
+    # Act
+    with ThreadPoolExecutor(max_workers=2) as threads:
+        results = [threads.submit(converter._run, time.sleep, 1.2) for _ in range(2)]
+
+        # Assert
+        assert [result.result(timeout=60) for result in results] == [None, None]
+
+
+def test_timeout_stops_only_the_overdue_worker():
+    # Arrange
+    converter = DocumentConverter(OmegaConf.merge(SETTINGS, {"max_workers": 2, "timeout_seconds": 1}))
+    with ThreadPoolExecutor(max_workers=1) as threads:
+        stuck = threads.submit(converter._run, time.sleep, 60)
+        healthy_pid = converter._run(os.getpid)
+
+        # Act
+        started = time.monotonic()
+        with pytest.raises(ConversionTimeoutError):
+            stuck.result(timeout=30)
+
+    # Assert
+    assert time.monotonic() - started < 30
+    assert converter._run(os.getpid) == healthy_pid
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from content_assistant_bot.chatgpt.history import MessageRingBuffer
+from content_assistant_bot.openai.schemas import Message
+
+
+def make_messages(chat_id: int, start: int, count: int) -> list[Message]:
+    return [
+        Message(id=index, chat_id=chat_id, role="user", content=str(index), created_at=datetime.now())
+        for index in range(start, start + count)
+    ]
+
+
+def test_buffer_keeps_tail_written_through():
+    # Arrange
+    buffer = MessageRingBuffer(capacity=4, max_chats=10)
+    buffer.load(1, make_messages(1, 0, 4))
+
+    # Act
+    buffer.append(1, make_messages(1, 4, 2))
+    tail = buffer.get(1, 3)
+    too_long = buffer.get(1, 5)
+
+    # Assert
+    assert [message.content for message in tail] == ["3", "4", "5"]
+    assert too_long is None
+
+
+def test_buffer_serves_short_chats_completely_and_evicts_idle_ones():
+    # Arrange
+    buffer = MessageRingBuffer(capacity=4, max_chats=1)
+    buffer.load(1, make_messages(1, 0, 2))
+
+    # Act
+    short = buffer.get(1, 10)
+    buffer.load(2, make_messages(2, 0, 1))
+
+    # Assert
+    assert [message.content for message in short] == ["0", "1"]
+    assert buffer.get(1, 1) is None
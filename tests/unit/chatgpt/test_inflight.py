@@ -0,0 +1,58 @@
+import threading
+
+from content_assistant_bot.chatgpt.inflight import InflightRegistry
+
+
+def test_new_input_cancels_running_reply():
+    # Arrange
+    registry = InflightRegistry(mode="cancel", max_queued=3)
+    started = threading.Event()
+    results = []
+
+    def slow(generation):
+        started.set()
+        generation._cancelled.wait(5)
+        results.append(("slow", generation.cancelled))
+
+    def fast(generation):
+        results.append(("fast", generation.cancelled))
+
+    # Act
+    worker = threading.Thread(target=registry.submit, args=(1, slow))
+    worker.start()
+    started.wait(5)
+    accepted = registry.submit(1, fast)
+    worker.join(5)
+
+    # Assert
+    assert accepted
+    assert results == [("slow", True), ("fast", False)]
+    assert registry.snapshot() == {"running": 0, "queued": 0}
+
+
+def test_queue_mode_rejects_inputs_over_limit():
+    # Arrange
+    registry = InflightRegistry(mode="queue", max_queued=1)
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def slow(generation):
+        started.set()
+        release.wait(5)
+        results.append("slow")
+
+    # Act
+    worker = threading.Thread(target=registry.submit, args=(1, slow))
+    worker.start()
+    started.wait(5)
+    first = registry.submit(1, lambda generation: results.append("first"))
+    second = registry.submit(1, lambda generation: results.append("second"))
+    snapshot = registry.snapshot()
+    release.set()
+    worker.join(5)
+
+    # Assert
+    assert (first, second) == (True, False)
+    assert snapshot == {"running": 1, "queued": 1}
+    assert results == ["slow", "first"]
@@ -0,0 +1,48 @@
+from content_assistant_bot.chatgpt.retrieval import UserIndex, chunk_text
+
+
+def test_chunk_text_keeps_paragraphs_within_limit():
+    # Arrange
+    text = "first paragraph\n\nsecond one\n\n" + "word " * 30
+
+    # Act
+    chunks = chunk_text(text, 40)
+
+    # Assert
+    assert chunks[0] == "first paragraph\n\nsecond one"
+    assert all(len(chunk) <= 40 for chunk in chunks)
+    assert " ".join(chunks[1:]).split() == ["word"] * 30
+
+
+def test_index_returns_most_similar_chunks_first():
+    # Arrange
+    index = UserIndex(dimensions=512)
+    contents = [
+        "The invoice is due on the first of March and totals 300 euros.",
+        "Our office cat is called Murka and sleeps on the printer.",
+        "Shipping takes five days, the invoice number is on the parcel.",
+    ]
+    index.add([1, 2, 3], ["a", "a", "b"], ["a.pdf", "a.pdf", "b.pdf"], contents)
+
+    # Act
+    results = index.search("When is the invoice due?", top_k=2, min_score=0.05)
+    unrelated = index.search("zzz", top_k=2, min_score=0.05)
+
+    # Assert
+    assert [result.content for result in results] == [contents[0], contents[2]]
+    assert results[0].score > results[1].score
+    assert unrelated == []
+
+
+def test_index_trims_oldest_chunks():
+    # Arrange
+    index = UserIndex(dimensions=64)
+    index.add([1, 2, 3], ["a"] * 3, [None] * 3, ["one", "two", "three"])
+
+    # Act
+    last_dropped = index.trim(2)
+
+    # Assert
+    assert last_dropped == 1
+    assert index.snapshot.contents == ["two", "three"]
+    assert index.snapshot.vectors.shape == (2, 64)
@@ -0,0 +1,96 @@
+import itertools
+from types import SimpleNamespace
+
+from telebot.apihelper import ApiTelegramException
+
+from content_assistant_bot.chatgpt.stream import EditRateMeter, StreamRenderer
+
+
+class RecordingBot:
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.messages: dict[int, str] = {}
+        self.edits = 0
+
+    def send_message(self, chat_id, text, reply_markup=None):
+        message_id = next(self.ids)
+        self.messages[message_id] = text
+        return SimpleNamespace(message_id=message_id)
+
+    def edit_message_text(self, text, chat_id, message_id, reply_markup=None):
+        self.messages[message_id] = text
+        self.edits += 1
+
+
+class ThrottledBot(RecordingBot):
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def edit_message_text(self, text, chat_id, message_id, reply_markup=None):
+        if self.failures:
+            self.failures -= 1
+            raise ApiTelegramException("editMessageText", None, {
+                "error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": 0}
+            })
+        super().edit_message_text(text, chat_id, message_id, reply_markup)
+
+
+def test_renderer_skips_edits_within_interval():
+    # Arrange
+    bot = RecordingBot()
+    renderer = StreamRenderer(bot, 1, interval=60, max_length=100, meter=EditRateMeter(60))
+
+    # Act
+    for word in ["a ", "b ", "c"]:
+        renderer.append(word)
+    reply = renderer.finish()
+
+    # Assert
+    assert reply == "a b c"
+    assert bot.edits == 1
+    assert bot.messages == {1: "a b c"}
+
+
+def test_renderer_rolls_over_into_new_message():
+    # Arrange
+    bot = RecordingBot()
+    meter = EditRateMeter(60)
+    renderer = StreamRenderer(bot, 1, interval=0, max_length=10, meter=meter)
+
+    # Act
+    for word in ["hello ", "world ", "again"]:
+        renderer.append(word)
+    renderer.finish()
+
+    # Assert
+    assert bot.messages == {1: "hello", 2: "world", 3: "again"}
+    assert all(len(text) <= 10 for text in bot.messages.values())
+    assert meter.snapshot()[0]["edits"] == bot.edits
+
+
+def test_final_edit_is_retried_when_throttled():
+    # Arrange
+    bot = ThrottledBot(failures=1)
+    renderer = StreamRenderer(bot, 1, interval=60, max_length=100, meter=EditRateMeter(60))
+
+    # Act
+    renderer.append("final answer")
+    renderer.finish()
+
+    # Assert
+    assert bot.messages == {1: "final answer"}
+
+
+def test_final_text_is_sent_when_the_edit_keeps_failing():
+    # Arrange
+    bot = ThrottledBot(failures=10)
+    renderer = StreamRenderer(bot, 1, interval=60, max_length=100, meter=EditRateMeter(60))
+
+    # Act
+    renderer.append("final answer")
+    renderer.finish()
+
+    # Assert
+    assert bot.messages == {1: "...", 2: "final answer"}
+    assert renderer.messages == 2
@@ -0,0 +1,28 @@
+from typing import Callable
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from content_assistant_bot.account import service as account_services
+from content_assistant_bot.auth.models import User
+from content_assistant_bot.models import Base
+
+
+@pytest.fixture
+def funded_user(tmp_path, monkeypatch) -> Callable[[int], sessionmaker]:
+    """Create a database with user 1 holding a balance, used by the account services"""
+
+    def make(balance: int) -> sessionmaker:
+        # A file, so that sessions of several threads see the same data
+        engine = create_engine(f"sqlite:///{tmp_path / 'bot.db'}", connect_args={"timeout": 30})
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+        db_session = session_factory()
+        db_session.add(User(id=1, username="user", balance=balance))
+        db_session.commit()
+        db_session.close()
+        monkeypatch.setattr(account_services, "get_session", session_factory)
+        return session_factory
+
+    return make
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+from content_assistant_bot.auth.models import User  # noqa: F401
+from content_assistant_bot.database.pagination import paginate, parse_page_callback
+from content_assistant_bot.generation.models import Style  # noqa: F401
+from content_assistant_bot.models import Base
+from content_assistant_bot.posts.models import Post
+from content_assistant_bot.posts.service import read_posts_page
+
+
+def make_posts(count: int):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db_session = sessionmaker(bind=engine)()
+    start = datetime(2025, 1, 1)
+    # Pairs of posts share a timestamp, so the id breaks the ties
+    db_session.add_all([
+        Post(title=str(index), content="text", owner_id=1, created_at=start + timedelta(minutes=index // 2))
+        for index in range(count)
+    ])
+    db_session.add(Post(title="other", content="text", owner_id=2, created_at=start))
+    db_session.commit()
+    return db_session, db_session.query(Post).filter(Post.owner_id == 1)
+
+
+def titles(page):
+    return [post.title for post in page.items]
+
+
+def test_pages_walk_forward_and_back():
+    # Arrange
+    db_session, query = make_posts(7)
+
+    # Act
+    first = paginate(query, Post, 3)
+    second = paginate(query, Post, 3, first.next_cursor, "next")
+    last = paginate(query, Post, 3, second.next_cursor, "next")
+    back = paginate(query, Post, 3, last.previous_cursor, "prev")
+    start = paginate(query, Post, 3, back.previous_cursor, "prev")
+
+    # Assert
+    assert titles(first) == ["6", "5", "4"] and first.previous_cursor is None
+    assert titles(second) == ["3", "2", "1"]
+    assert titles(last) == ["0"] and last.next_cursor is None
+    assert titles(back) == titles(second)
+    assert titles(start) == titles(first) and start.previous_cursor is None
+
+
+def test_page_callback_round_trip():
+    # Arrange
+    db_session, query = make_posts(4)
+    page = paginate(query, Post, 2)
+
+    # Act
+    cursor, direction = parse_page_callback(f"posts_page_next_{page.next_cursor}", "posts_page")
+    other = parse_page_callback("list_posts", "posts_page")
+
+    # Assert
+    assert (cursor, direction) == (page.next_cursor, "next")
+    assert len(f"posts_page_next_{page.next_cursor}") <= 64
+    assert other == (None, "next")
+
+
+def test_posts_page_leaves_content_unloaded():
+    # Arrange
+    db_session, _ = make_posts(3)
+    db_session.expunge_all()
+
+    # Act
+    page = read_posts_page(db_session, 1, limit=2)
+
+    # Assert
+    assert titles(page) == ["2", "1"]
+    assert all("content" in inspect(post).unloaded for post in page.items)
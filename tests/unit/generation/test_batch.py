@@ -0,0 +1,63 @@
+from unittest.mock import MagicMock
+
+from content_assistant_bot.generation import batch
+
+
+def patch_batch(monkeypatch, generate) -> MagicMock:
+    account = MagicMock()
+    account.credits_for_usage.return_value = 1
+    account.settle_reservation.side_effect = lambda user_id, reserved, used, reference: used
+    monkeypatch.setattr(batch, "account_services", account)
+    monkeypatch.setattr(batch, "get_session", MagicMock)
+    monkeypatch.setattr(batch, "read_style", MagicMock())
+    monkeypatch.setattr(batch, "read_style_examples", MagicMock())
+    monkeypatch.setattr(batch, "generate_for_style", generate)
+    monkeypatch.setattr(batch, "create_draft_posts", lambda db_session, contents, style_id, user_id: len(contents))
+    return account
+
+
+def test_batch_settles_the_reserved_credits_for_created_drafts(monkeypatch):
+    # Arrange
+    results = {"bad": None, "empty": (" \n", None)}
+    account = patch_batch(monkeypatch, lambda style, examples, text: results.get(text, (text, None)))
+    drafts = []
+
+    def create_draft_posts(db_session, contents, style_id, user_id):
+        drafts.extend(contents)
+        return len(contents)
+
+    monkeypatch.setattr(batch, "create_draft_posts", create_draft_posts)
+
+    # Act
+    batch.run_batch_restyle(MagicMock(), 1, "ru", 2, ["one", "bad", "empty", "three"], reserved=4)
+
+    # Assert
+    assert drafts == ["one", "three"]
+    account.settle_reservation.assert_called_once_with(1, 4, 2, "batch_restyle")
+    account.refund_credits.assert_not_called()
+
+
+def test_failed_batch_refunds_the_reservation(monkeypatch):
+    # Arrange
+    account = patch_batch(monkeypatch, lambda style, examples, text: (text, None))
+    monkeypatch.setattr(batch, "create_draft_posts", MagicMock(side_effect=RuntimeError("database is gone")))
+
+    # Act
+    batch.run_batch_restyle(MagicMock(), 1, "ru", 2, ["one", "two"], reserved=2)
+
+    # Assert
+    account.settle_reservation.assert_not_called()
+    account.refund_credits.assert_called_once_with(1, 2, "batch_restyle")
+
+
+def test_batch_is_not_queued_without_credits(monkeypatch):
+    # Arrange
+    account = patch_batch(monkeypatch, MagicMock())
+    account.reserve_credits.return_value = False
+
+    # Act
+    future = batch.submit_batch_restyle(MagicMock(), 1, "ru", 2, ["one", "two"])
+
+    # Assert
+    assert future is None
+    account.reserve_credits.assert_called_once_with(1, 2, "batch_restyle")
@@ -0,0 +1,44 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from content_assistant_bot.auth.models import User  # noqa: F401
+from content_assistant_bot.generation.examples import LEGACY_SEPARATOR, style_examples_cache
+from content_assistant_bot.generation.models import Style
+from content_assistant_bot.generation.service import read_style_examples
+from content_assistant_bot.models import Base
+
+
+def make_style(examples: str) -> tuple:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db_session = sessionmaker(bind=engine)()
+    style = Style(name="Style", examples=examples, owner_id=1)
+    db_session.add(style)
+    db_session.commit()
+    style_examples_cache.drop(style.id)
+    return db_session, style
+
+
+def test_legacy_examples_are_migrated_once():
+    # Arrange
+    db_session, style = make_style(LEGACY_SEPARATOR.join(["First post", "  ", "Second post", "first  POST"]))
+
+    # Act
+    examples = read_style_examples(db_session, style)
+
+    # Assert
+    assert examples.contents == ["First post", "Second post"]
+    assert style.examples is None
+
+
+def test_unusable_legacy_examples_give_no_examples():
+    # Arrange
+    db_session, style = make_style(LEGACY_SEPARATOR.join([" ", "\n", ""]))
+
+    # Act
+    examples = read_style_examples(db_session, style)
+
+    # Assert
+    assert examples.contents == []
+    assert style.examples is None
+    assert style_examples_cache.get(style.id) is examples
@@ -0,0 +1,60 @@
+from omegaconf import OmegaConf
+
+from content_assistant_bot.account import service as account_services
+from content_assistant_bot.auth.models import User
+from content_assistant_bot.generation import jobs
+from content_assistant_bot.generation.jobs import GenerationQueue
+from content_assistant_bot.generation.models import GenerationJob
+
+
+def read_balance(session_factory):
+    db_session = session_factory()
+    try:
+        return db_session.query(User.balance).filter(User.id == 1).scalar()
+    finally:
+        db_session.close()
+
+
+def test_reservation_stops_overspending(funded_user):
+    # Arrange
+    session_factory = funded_user(2)
+
+    # Act
+    reserved = [account_services.reserve_credits(1, 1) for _ in range(3)]
+
+    # Assert
+    assert reserved == [True, True, False]
+    assert read_balance(session_factory) == 0
+
+
+def test_unfinished_jobs_run_after_restart_and_settle_credits(funded_user, monkeypatch):
+    # Arrange
+    session_factory = funded_user(2)
+
+    def generate(content, style_id, db_session):
+        if content == "fail":
+            raise RuntimeError("LLM is down")
+        return content.upper(), None
+
+    monkeypatch.setattr(jobs, "generate_with_style", generate)
+    delivered, failed = [], []
+    # One worker, so that the jobs finish in the order they were queued
+    settings = OmegaConf.merge(jobs.config.app.jobs, {"workers": 1})
+    stopped = GenerationQueue(settings, session_factory=session_factory)
+    positions = [stopped.submit(1, "ru", 1, content) for content in ("hello", "fail", "rejected")]
+
+    # Act
+    queue = GenerationQueue(settings, session_factory=session_factory)
+    queue.start(lambda job, drafts, db_session: delivered.extend(drafts), lambda job: failed.append(job.id))
+    queue.jobs.join()
+
+    # Assert
+    db_session = session_factory()
+    statuses = [row.status for row in db_session.query(GenerationJob.status).order_by(GenerationJob.id)]
+    db_session.close()
+    assert positions == [1, 2, None]
+    assert delivered == ["HELLO"]
+    assert len(failed) == 1
+    assert statuses == ["done", "failed"]
+    assert read_balance(session_factory) == 1
+    assert queue.snapshot()["depth"] == 0
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from content_assistant_bot.openai.budget import ContextBudgeter, Tokenizer
+from content_assistant_bot.openai.schemas import Message
+
+
+def make_message(id, role, content):
+    return Message(id=id, chat_id=1, role=role, content=content, created_at=datetime.now())
+
+
+def test_fit_keeps_system_prompt_and_latest_input_first():
+    # Arrange
+    budgeter = ContextBudgeter("test-model", max_prompt_tokens=100, history_limit=10)
+    budgeter.tokenizer = Tokenizer()
+    history = [make_message(1, "user", "a" * 400), make_message(2, "user", "x" * 1000)]
+
+    # Act
+    selected, usage = budgeter.fit(history, system_prompt="s" * 40)
+
+    # Assert
+    assert [message.id for message in selected] == [2]
+    assert usage.input_truncated
+    assert usage.total <= 100
+    assert usage.dropped_messages == 1
+
+
+def test_fit_prefers_recent_history():
+    # Arrange
+    budgeter = ContextBudgeter("test-model", max_prompt_tokens=40, history_limit=10)
+    budgeter.tokenizer = Tokenizer()
+    history = [
+        make_message(1, "user", "a" * 80),
+        make_message(2, "assistant", "b" * 40),
+        make_message(3, "user", "c" * 40),
+    ]
+
+    # Act
+    selected, usage = budgeter.fit(history)
+
+    # Assert
+    assert [message.id for message in selected] == [2, 3]
+    assert usage.history_messages == 1
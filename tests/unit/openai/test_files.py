@@ -0,0 +1,89 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+from omegaconf import OmegaConf
+
+from content_assistant_bot.openai import files
+from content_assistant_bot.openai.files import FileCache
+
+
+class CountingBot:
+    def __init__(self):
+        self.get_file_calls = 0
+
+    def get_file(self, file_id):
+        self.get_file_calls += 1
+        return SimpleNamespace(file_path=f"photos/{file_id}.jpg", file_size=4)
+
+
+def make_cache(directory: Path, monkeypatch, downloads: list, disk_max_bytes: int = 100) -> FileCache:
+    def fake_download(bot, file_path, destination):
+        downloads.append(file_path)
+        Path(destination).write_bytes(b"data")
+        return 4
+
+    monkeypatch.setattr(files, "download_file_to_path", fake_download)
+    settings = OmegaConf.create({
+        "memory_max_bytes": 0, "disk_dir": str(directory), "disk_max_bytes": disk_max_bytes,
+        "metadata_ttl_seconds": 60, "metadata_max_items": 10,
+    })
+    return FileCache(settings)
+
+
+def test_repeated_downloads_are_served_from_cache(tmp_path, monkeypatch):
+    # Arrange
+    downloads = []
+    cache = make_cache(tmp_path, monkeypatch, downloads)
+    cache.settings.memory_max_bytes = 100
+    bot = CountingBot()
+
+    # Act
+    first = cache.get_bytes(bot, "file_a", "unique")
+    second = cache.get_bytes(bot, "file_b", "unique")
+    with cache.open_path(bot, "file_a", "unique", ".pdf") as path:
+        content = Path(path).read_bytes()
+
+    # Assert
+    assert bytes(first) == bytes(second) == content == b"data"
+    assert path.endswith(".pdf")
+    assert not Path(path).exists()
+    assert downloads == ["photos/file_a.jpg"]
+    assert bot.get_file_calls == 1
+    assert cache.metrics()["memory_hits"] == 1
+    assert cache.metrics()["misses"] == 1
+
+
+def test_path_keeps_its_content_when_the_file_is_evicted(tmp_path, monkeypatch):
+    # Arrange
+    downloads = []
+    cache = make_cache(tmp_path, monkeypatch, downloads, disk_max_bytes=4)
+    bot = CountingBot()
+
+    # Act
+    with cache.open_path(bot, "file_a", "first", ".txt") as path:
+        cache.get_bytes(bot, "file_b", "second")
+        content = Path(path).read_bytes()
+
+    # Assert
+    assert content == b"data"
+    assert list(cache.disk) == ["second"]
+    assert not (tmp_path / "first").exists()
+
+
+def test_files_of_both_readers_share_one_entry(tmp_path, monkeypatch):
+    # Arrange
+    downloads = []
+    cache = make_cache(tmp_path / "cache", monkeypatch, downloads)
+    bot = CountingBot()
+    created_before_use = (tmp_path / "cache").exists()
+
+    # Act
+    with cache.open_path(bot, "file_a", "unique", ".docx"):
+        pass
+    cache.get_bytes(bot, "file_a", "unique")
+
+    # Assert
+    assert not created_before_use
+    assert downloads == ["photos/file_a.jpg"]
+    assert list(cache.disk) == ["unique"]
+    assert not list((tmp_path / "cache").glob("*.part"))
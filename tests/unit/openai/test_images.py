@@ -0,0 +1,39 @@
+import base64
+import io
+
+from PIL import Image
+from telebot.types import PhotoSize
+
+from content_assistant_bot.openai.images import encode_image, pick_photo_size
+
+
+def make_photo(side: int) -> PhotoSize:
+    return PhotoSize(file_id=f"id{side}", file_unique_id=f"unique{side}", width=side, height=side * 3 // 4)
+
+
+def test_pick_photo_size_takes_smallest_reaching_target():
+    # Arrange
+    photos = [make_photo(90), make_photo(320), make_photo(800), make_photo(1280), make_photo(2560)]
+
+    # Act
+    picked = pick_photo_size(photos, 1024)
+    fallback = pick_photo_size(photos[:3], 1024)
+
+    # Assert
+    assert picked.width == 1280
+    assert fallback.width == 800
+
+
+def test_encode_image_downscales_to_jpeg():
+    # Arrange
+    source = io.BytesIO()
+    Image.new("RGB", (3000, 2000), "red").save(source, format="PNG")
+
+    # Act
+    payload = encode_image(source.getvalue(), max_side=1024, image_format="JPEG", quality=80)
+
+    # Assert
+    image = Image.open(io.BytesIO(base64.b64decode(payload.data)))
+    assert payload.mime_type == "image/jpeg"
+    assert image.format == "JPEG"
+    assert image.size == (1024, 683)
@@ -0,0 +1,39 @@
+import pytest
+
+from content_assistant_bot.openai.keys import ApiKeyPool, KeyPoolSaturatedError, parse_reset_duration
+
+
+def test_acquire_picks_least_loaded_key():
+    # Arrange
+    pool = ApiKeyPool("openai", ["key-a", "key-b"], requests_per_minute=10, tokens_per_minute=1000, queue_timeout=0)
+
+    # Act
+    first = pool.acquire(tokens=500)
+    second = pool.acquire(tokens=100)
+
+    # Assert
+    assert first.key != second.key
+
+
+def test_acquire_raises_when_pool_is_saturated():
+    # Arrange
+    pool = ApiKeyPool("openai", ["key-a"], requests_per_minute=1, tokens_per_minute=1000, queue_timeout=0)
+    pool.acquire(tokens=10)
+
+    # Act / Assert
+    with pytest.raises(KeyPoolSaturatedError):
+        pool.acquire(tokens=10)
+
+
+def test_settle_blocks_key_on_exhausted_headers():
+    # Arrange
+    pool = ApiKeyPool("openai", ["key-a"], requests_per_minute=10, tokens_per_minute=1000, queue_timeout=0)
+    lease = pool.acquire(tokens=10)
+
+    # Act
+    pool.settle(lease, tokens=42, headers={"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "6m0s"})
+
+    # Assert
+    assert pool.utilization()[0]["tokens"] == 42
+    assert pool.utilization()[0]["blocked"]
+    assert parse_reset_duration("6m0s") == 360
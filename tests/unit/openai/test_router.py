@@ -0,0 +1,192 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import HumanMessage
+from omegaconf import OmegaConf
+
+from content_assistant_bot.openai.keys import ApiKeyPool
+from content_assistant_bot.openai.router import CallCancelledError, ProviderRouter, ProviderUnavailableError
+from content_assistant_bot.openai.schemas import ModelConfig
+from content_assistant_bot.openai.stub import StubChatModel
+
+SETTINGS = OmegaConf.create({
+    "window_size": 10,
+    "failure_rate_threshold": 0.5,
+    "min_calls": 2,
+    "open_seconds": 60,
+    "deadline_seconds": 1,
+    "hedge_percentile": 0.95,
+    "hedge_min_seconds": 0,
+    "max_workers": 4,
+})
+
+
+class FailingChatModel:
+    def invoke(self, messages):
+        raise RuntimeError("provider is down")
+
+    def stream(self, messages):
+        raise RuntimeError("provider is down")
+
+
+class SlowChatModel(StubChatModel):
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(0.5)
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+
+class LateStreamModel:
+    def __init__(self):
+        self.closed = False
+
+    def stream(self, messages):
+        try:
+            time.sleep(0.3)
+            yield StubChatModel().invoke(messages)
+        finally:
+            self.closed = True
+
+
+def make_factory(**clients):
+    return lambda config, api_key=None: clients[config.provider]
+
+
+def test_invoke_fails_over_to_fallback():
+    # Arrange
+    router = ProviderRouter(make_factory(down=FailingChatModel(), stub=StubChatModel()), SETTINGS)
+    config = ModelConfig(provider="down", model_name="primary", fallbacks=[{"provider": "stub"}])
+
+    # Act
+    response = router.invoke(config, [HumanMessage(content="hello")])
+
+    # Assert
+    assert response.content == "[stub] hello"
+    assert {row["provider"]: row["error_rate"] for row in router.snapshot()} == {"down": 1.0, "stub": 0.0}
+
+
+def test_circuit_opens_after_repeated_failures():
+    # Arrange
+    router = ProviderRouter(make_factory(down=FailingChatModel()), SETTINGS)
+    config = ModelConfig(provider="down", model_name="primary")
+
+    # Act
+    for _ in range(2):
+        with pytest.raises(ProviderUnavailableError):
+            router.invoke(config, [HumanMessage(content="hello")])
+
+    # Assert
+    with pytest.raises(ProviderUnavailableError, match="circuit open"):
+        router.invoke(config, [HumanMessage(content="hello")])
+
+
+def test_deadline_moves_to_fallback():
+    # Arrange
+    settings = OmegaConf.merge(SETTINGS, {"deadline_seconds": 0.1})
+    router = ProviderRouter(make_factory(slow=SlowChatModel(), stub=StubChatModel(model_name="fast")), settings)
+    config = ModelConfig(provider="slow", model_name="slow", fallbacks=[{"provider": "stub", "model_name": "fast"}])
+
+    # Act
+    response = router.invoke(config, [HumanMessage(content="hello")])
+
+    # Assert
+    assert response.content == "[fast] hello"
+
+
+def test_stream_fails_over_before_first_chunk():
+    # Arrange
+    router = ProviderRouter(make_factory(down=FailingChatModel(), stub=StubChatModel()), SETTINGS)
+    config = ModelConfig(provider="down", model_name="primary", fallbacks=[{"provider": "stub"}])
+
+    # Act
+    chunks = [chunk.content for chunk in router.stream(config, [HumanMessage(content="hello")])]
+
+    # Assert
+    assert "".join(chunks).strip() == "[stub] hello"
+
+
+def test_invoke_returns_all_choices_of_one_request():
+    # Arrange
+    router = ProviderRouter(make_factory(stub=StubChatModel(n=3)), SETTINGS)
+    config = ModelConfig(provider="stub", model_name="primary", n=3)
+
+    # Act
+    responses = router.invoke(config, [HumanMessage(content="hello")], n=3)
+
+    # Assert
+    assert [response.content for response in responses] == ["[stub] hello (1)", "[stub] hello (2)", "[stub] hello (3)"]
+
+
+def test_saturated_key_pool_does_not_keep_the_circuit_half_open():
+    # Arrange
+    clients = {"down": FailingChatModel()}
+    pools = {}
+    settings = OmegaConf.merge(SETTINGS, {"open_seconds": 0.05})
+    router = ProviderRouter(
+        lambda config, api_key=None: clients[config.provider], settings, SimpleNamespace(get=pools.get)
+    )
+    config = ModelConfig(provider="down", model_name="primary")
+    for _ in range(2):
+        with pytest.raises(ProviderUnavailableError):
+            router.invoke(config, [HumanMessage(content="hello")])
+    time.sleep(0.1)
+    saturated = ApiKeyPool("down", ["key-a"], requests_per_minute=1, tokens_per_minute=1000, queue_timeout=0)
+    saturated.acquire(tokens=10)
+    pools["down"] = saturated
+
+    # Act
+    with pytest.raises(ProviderUnavailableError, match="down"):
+        router.invoke(config, [HumanMessage(content="hello")])
+    del pools["down"]
+    clients["down"] = StubChatModel()
+    response = router.invoke(config, [HumanMessage(content="hello")])
+
+    # Assert
+    assert response.content == "[stub] hello"
+    assert router.snapshot()[0]["circuit"] == "closed"
+
+
+def test_late_stream_is_closed_and_clients_get_the_deadline():
+    # Arrange
+    settings = OmegaConf.merge(SETTINGS, {"deadline_seconds": 0.1})
+    late = LateStreamModel()
+    deadlines = []
+
+    def factory(config, api_key=None):
+        deadlines.append(config.deadline_seconds)
+        return {"late": late, "stub": StubChatModel()}[config.provider]
+
+    router = ProviderRouter(factory, settings)
+    config = ModelConfig(provider="late", model_name="late", fallbacks=[{"provider": "stub"}])
+
+    # Act
+    chunks = list(router.stream(config, [HumanMessage(content="hello")]))
+    time.sleep(0.5)
+
+    # Assert
+    assert "".join(chunk.content for chunk in chunks).strip() == "[stub] hello"
+    assert deadlines == [0.1, 0.1]
+    assert late.closed
+
+
+def test_cancelled_invoke_returns_at_once_and_frees_its_unsent_lease():
+    # Arrange
+    settings = OmegaConf.merge(SETTINGS, {"max_workers": 1, "deadline_seconds": 5})
+    pool = ApiKeyPool("slow", ["key-a"], requests_per_minute=10, tokens_per_minute=1000, queue_timeout=0)
+    router = ProviderRouter(make_factory(slow=SlowChatModel()), settings, SimpleNamespace(get={"slow": pool}.get))
+    config = ModelConfig(provider="slow", model_name="slow")
+    # The only worker is busy, so the call waits in the queue
+    router._executor.submit(time.sleep, 1)
+    cancelled = threading.Event()
+    threading.Timer(0.1, cancelled.set).start()
+
+    # Act
+    started = time.monotonic()
+    with pytest.raises(CallCancelledError):
+        router.invoke(config, [HumanMessage(content="hello")], cancelled=cancelled)
+
+    # Assert
+    assert time.monotonic() - started < 0.5
+    assert pool.utilization()[0]["tokens"] == 0
+    assert router.snapshot()[0]["calls"] == 0
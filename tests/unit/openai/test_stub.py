@@ -0,0 +1,30 @@
+import pytest
+from langchain_core.messages import HumanMessage
+
+from content_assistant_bot.openai.stub import StubChatModel, StubError
+
+
+def test_stream_is_deterministic_and_chunked():
+    # Arrange
+    model = StubChatModel(model_name="bench", chunk_size=2, reply_words=5)
+
+    # Act
+    first = [chunk.content for chunk in model.stream([HumanMessage(content="one two")]) if chunk.content]
+    second = [chunk.content for chunk in model.stream([HumanMessage(content="one two")]) if chunk.content]
+
+    # Assert
+    assert first == second == ["[bench] one ", "two word3 ", "word4 "]
+
+
+def test_injected_error_interrupts_stream_after_chunks():
+    # Arrange
+    model = StubChatModel(error_rate=1.0, error_after_chunks=1)
+
+    # Act
+    chunks = []
+    with pytest.raises(StubError):
+        for chunk in model.stream([HumanMessage(content="one two three")]):
+            chunks.append(chunk.content)
+
+    # Assert
+    assert chunks == ["[stub] "]
@@ -0,0 +1,55 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from content_assistant_bot.openai.models import LLMUsage
+from content_assistant_bot.openai.schemas import LLMCallUsage
+from content_assistant_bot.openai.usage import UsageRecorder, cost_per_user, latency_per_model
+
+
+def make_session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    LLMUsage.__table__.create(engine)
+    return sessionmaker(bind=engine)
+
+
+def test_recorder_writes_batches_used_by_aggregations():
+    # Arrange
+    session_factory = make_session_factory()
+    recorder = UsageRecorder(batch_size=100, flush_interval_seconds=60, session_factory=session_factory)
+    for latency_ms in range(1, 21):
+        recorder.record(1, LLMCallUsage(
+            provider="openai", model="gpt-4o-mini", prompt_tokens=1000, completion_tokens=500, latency_ms=latency_ms
+        ))
+
+    # Act
+    written = recorder.flush()
+    db_session = session_factory()
+    costs = cost_per_user(db_session)
+    latencies = latency_per_model(db_session)
+
+    # Assert
+    assert written == 20
+    assert costs == [{"user_id": 1, "calls": 20, "prompt_tokens": 20000, "completion_tokens": 10000, "cost": 0.009}]
+    assert latencies == [{"provider": "openai", "model": "gpt-4o-mini", "calls": 20, "latency_ms": 20, "ttft_ms": None}]
+
+
+def test_latency_percentile_is_picked_per_model():
+    # Arrange
+    session_factory = make_session_factory()
+    recorder = UsageRecorder(batch_size=100, flush_interval_seconds=60, session_factory=session_factory)
+    for latency_ms in [50, 10, 40, 30, 20]:
+        recorder.record(1, LLMCallUsage(provider="openai", model="gpt-4o-mini", latency_ms=latency_ms, ttft_ms=latency_ms // 10))
+    for latency_ms in [7, 3]:
+        recorder.record(1, LLMCallUsage(provider="deepseek", model="deepseek-chat", latency_ms=latency_ms))
+    recorder.record(1, LLMCallUsage(provider="deepseek", model="deepseek-chat", latency_ms=1000, ok=False))
+    recorder.flush()
+
+    # Act
+    latencies = latency_per_model(session_factory(), percentile=0.5)
+
+    # Assert
+    assert sorted(latencies, key=lambda row: row["model"]) == [
+        {"provider": "deepseek", "model": "deepseek-chat", "calls": 2, "latency_ms": 7, "ttft_ms": None},
+        {"provider": "openai", "model": "gpt-4o-mini", "calls": 5, "latency_ms": 30, "ttft_ms": 3},
+    ]
@@ -0,0 +1,30 @@
+from content_assistant_bot.openai.vectors import rank, term_vectors
+
+
+def test_rank_prefers_rare_shared_words():
+    # Arrange
+    texts = [
+        "the report about the budget",
+        "the report about the weather",
+        "the report about the football match",
+    ]
+    vectors = term_vectors(texts, 256)
+
+    # Act
+    ranked = rank(vectors, "weather report", top_k=2)
+
+    # Assert
+    assert ranked[0][0] == 1
+    assert len(ranked) == 2
+    assert ranked[0][1] > ranked[1][1]
+
+
+def test_rank_returns_nothing_without_shared_words():
+    # Arrange
+    vectors = term_vectors(["alpha beta", "gamma delta"], 256)
+
+    # Act
+    ranked = rank(vectors, "omega", top_k=2, min_score=0.01)
+
+    # Assert
+    assert ranked == []
@@ -0,0 +1,79 @@
+import io
+import json
+import zipfile
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from content_assistant_bot.auth.models import User  # noqa: F401
+from content_assistant_bot.channels.models import Channel
+from content_assistant_bot.generation.models import Style  # noqa: F401
+from content_assistant_bot.models import Base
+from content_assistant_bot.posts.importing import import_posts, parse_posts
+from content_assistant_bot.posts.models import Post
+
+LATER = (datetime.now() + timedelta(days=1)).replace(microsecond=0)
+
+CSV = f"title,content,channel,publish_at\nFirst,Hello,news,{LATER.isoformat(' ')}\nSecond,World,,\n,,,\n"
+JSON_LINES = '{"title": "Third", "content": "Line"}\n\n{"title": "Fourth", "content": "Line", "channel": "@news"}\n'
+MARKDOWN = f"# Fifth\nchannel: https://t.me/news\npublish_at: {LATER.isoformat()}\n\nBody\n---\nNo title\n"
+
+
+def parse(name: str, content: bytes):
+    return list(parse_posts(name, io.BytesIO(content)))
+
+
+def test_parse_posts_reads_every_format():
+    # Arrange
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("posts.csv", CSV)
+        zip_file.writestr("notes/posts.md", MARKDOWN)
+        zip_file.writestr("image.png", b"\x89PNG")
+
+    # Act
+    csv_posts = parse("posts.csv", CSV.encode())
+    array_posts = parse("posts.json", json.dumps([{"Title": "A", "Text": "B"}]).encode())
+    object_posts = parse("posts.json", json.dumps({"posts": [{"content": "C"}]}, indent=2).encode())
+    line_posts = parse("posts.jsonl", JSON_LINES.encode())
+    markdown_posts = parse("posts.md", MARKDOWN.encode())
+    zip_posts = parse("posts.zip", archive.getvalue())
+
+    # Assert
+    assert [(post.title, post.content, post.channel) for post in csv_posts] == [
+        ("First", "Hello", "news"), ("Second", "World", None), ("", "", None)
+    ]
+    assert (array_posts[0].title, array_posts[0].content) == ("A", "B")
+    assert object_posts[0].content == "C"
+    assert [post.title for post in line_posts] == ["Third", "Fourth"]
+    assert markdown_posts[0].channel == "https://t.me/news" and markdown_posts[0].content == "Body"
+    assert markdown_posts[1].title == "" and markdown_posts[1].content == "No title"
+    assert len(zip_posts) == len(csv_posts) + len(markdown_posts)
+
+
+def test_import_posts_inserts_and_collects_schedules():
+    # Arrange
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db_session = sessionmaker(bind=engine)()
+    channel = Channel(name="News", link="https://t.me/news", owner_id=1)
+    db_session.add(channel)
+    db_session.commit()
+    # The same moment as LATER, written in UTC with an offset
+    aware = f'{{"title": "Sixth", "content": "Offset", "channel": "news", "publish_at": "{LATER.astimezone(UTC).isoformat()}"}}'
+    posts = parse("posts.csv", CSV.encode()) + parse("posts.jsonl", JSON_LINES.encode()) + parse(
+        "posts.md", MARKDOWN.encode()
+    ) + parse("aware.jsonl", aware.encode())
+
+    # Act
+    result = import_posts(db_session, 1, posts)
+
+    # Assert
+    saved = {post.id: post for post in db_session.query(Post).all()}
+    assert (result.created, result.skipped, result.unscheduled) == (7, 1, 1)
+    assert [(saved[post_id].title, channel_id) for post_id, channel_id, _ in result.schedules] == [
+        ("First", channel.id), ("Fifth", channel.id), ("Sixth", channel.id)
+    ]
+    assert all(publish_at == LATER for _, _, publish_at in result.schedules)
+    assert saved[result.schedules[0][0]].scheduled_time == LATER
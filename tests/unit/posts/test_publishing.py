@@ -0,0 +1,147 @@
+import threading
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from telebot.apihelper import ApiTelegramException
+
+from content_assistant_bot.auth.models import User  # noqa: F401
+from content_assistant_bot.channels.models import Channel
+from content_assistant_bot.generation.models import Style  # noqa: F401
+from content_assistant_bot.models import Base
+from content_assistant_bot.posts.models import Post, PostPublication
+from content_assistant_bot.posts.publishing import publish_to_channels, send_to_channel
+
+CHAT_IDS = {"@first": -1001, "@busy": -1002, "@readonly": -1003, "@foreign": -1004}
+
+
+def telegram_error(code, description, **parameters):
+    return ApiTelegramException(
+        "method", None, {"error_code": code, "description": description, "parameters": parameters}
+    )
+
+
+class ChannelBot:
+    """Answers like Telegram: one channel is unknown, one is read-only and one throttles once"""
+
+    def __init__(self):
+        self.user = SimpleNamespace(id=42)
+        self.sent = []
+        self.lookups = 0
+        self.lock = threading.Lock()
+        self.throttled = False
+
+    def get_chat(self, chat_id):
+        with self.lock:
+            self.lookups += 1
+        if chat_id not in CHAT_IDS:
+            raise telegram_error(400, "Bad Request: chat not found")
+        return SimpleNamespace(id=CHAT_IDS[chat_id])
+
+    def get_chat_member(self, chat_id, user_id):
+        if chat_id == CHAT_IDS["@readonly"]:
+            return SimpleNamespace(status="administrator", can_post_messages=False)
+        return SimpleNamespace(status="administrator", can_post_messages=True)
+
+    def send_message(self, chat_id, text):
+        with self.lock:
+            if chat_id == CHAT_IDS["@busy"] and not self.throttled:
+                self.throttled = True
+                raise telegram_error(429, "Too Many Requests", retry_after=0)
+            self.sent.append(chat_id)
+            return SimpleNamespace(message_id=len(self.sent))
+
+
+def make_channels():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db_session = sessionmaker(bind=engine)()
+    post = Post(title="News", content="Hello", owner_id=1)
+    channels = [
+        Channel(name=name, link=f"https://t.me/{name}", owner_id=owner_id)
+        for name, owner_id in [("first", 1), ("broken", 1), ("busy", 1), ("readonly", 1), ("foreign", 2)]
+    ]
+    db_session.add_all([post, *channels])
+    db_session.commit()
+    return db_session, post, channels
+
+
+def test_publish_to_channels_records_each_channel():
+    # Arrange
+    db_session, post, channels = make_channels()
+    bot = ChannelBot()
+
+    # Act
+    publications = publish_to_channels(db_session, bot, post.id, [channel.id for channel in channels])
+
+    # Assert
+    assert [publication.status for publication in publications] == ["sent", "failed", "sent", "failed"]
+    assert "chat not found" in publications[1].error
+    assert "not an administrator" in publications[3].error
+    assert sorted(bot.sent) == [-1002, -1001]
+    assert {publication.message_id for publication in publications if publication.status == "sent"} == {1, 2}
+    assert db_session.query(PostPublication).count() == 4
+    assert db_session.query(Post).filter(Post.id == post.id).first().is_published
+
+
+def test_publish_uses_cached_chat_id_until_it_fails():
+    # Arrange
+    db_session, post, channels = make_channels()
+    bot = ChannelBot()
+    first, readonly = channels[0], channels[3]
+    publish_to_channels(db_session, bot, post.id, [first.id, readonly.id])
+    lookups = bot.lookups
+
+    # Act
+    publish_to_channels(db_session, bot, post.id, [first.id, readonly.id])
+
+    # Assert
+    assert first.chat_id == -1001 and first.can_post
+    assert bot.lookups == lookups + 1
+    assert bot.sent == [-1001, -1001]
+
+
+class AlbumBot:
+    """Records the API calls of a publication"""
+
+    def __init__(self):
+        self.calls = []
+
+    def send_media_group(self, chat_id, media):
+        self.calls.append(("media_group", [item.media for item in media], media[0].caption))
+        return [SimpleNamespace(message_id=len(self.calls) * 100 + index) for index in range(len(media))]
+
+    def send_photo(self, chat_id, photo, caption=None):
+        self.calls.append(("photo", photo, caption))
+        return SimpleNamespace(message_id=len(self.calls))
+
+    def send_message(self, chat_id, text):
+        self.calls.append(("message", text, None))
+        return SimpleNamespace(message_id=len(self.calls))
+
+
+def test_send_to_channel_groups_album_and_checks_caption():
+    # Arrange
+    album = [("photo", f"file_{index}") for index in range(12)]
+    long_text = "x" * 2000
+
+    # Act
+    bot = AlbumBot()
+    first = send_to_channel(bot, -1001, "Caption", album)
+    long_bot = AlbumBot()
+    send_to_channel(long_bot, -1001, long_text, album[:3])
+    single_bot = AlbumBot()
+    send_to_channel(single_bot, -1001, "Caption", album[:1])
+    eleven_bot = AlbumBot()
+    send_to_channel(eleven_bot, -1001, "Caption", album[:11])
+
+    # Assert
+    assert first == 100
+    assert [(kind, len(media), caption) for kind, media, caption in bot.calls] == [
+        ("media_group", 6, "Caption"), ("media_group", 6, None)
+    ]
+    assert bot.calls[1][1] == [f"file_{index}" for index in range(6, 12)]
+    assert [(kind, len(media)) for kind, media, _ in eleven_bot.calls] == [("media_group", 5), ("media_group", 6)]
+    assert [kind for kind, _, _ in long_bot.calls] == ["media_group", "message"]
+    assert long_bot.calls[0][2] is None and long_bot.calls[1][1] == long_text
+    assert single_bot.calls == [("photo", "file_0", "Caption")]
@@ -0,0 +1,77 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from content_assistant_bot.auth.models import User  # noqa: F401
+from content_assistant_bot.generation.models import Style  # noqa: F401
+from content_assistant_bot.models import Base
+from content_assistant_bot.posts.search import search_posts
+from content_assistant_bot.posts.service import create_post, update_post_content
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def titles(page):
+    return [post.title for post in page.items]
+
+
+def test_search_ranks_own_posts_and_follows_updates():
+    # Arrange
+    db_session = make_session()
+    create_post(db_session, "Coffee", "Notes about brewing coffee at home", 1)
+    create_post(db_session, "Tea", "Green tea and a little coffee", 1)
+    create_post(db_session, "Coffee", "Someone else's coffee", 2)
+    bread = create_post(db_session, "Bread", "Sourdough starter", 1)
+
+    # Act
+    found = search_posts(db_session, 1, "coffee")
+    prefix = search_posts(db_session, 1, '"brew* (at')
+    update_post_content(db_session, bread.id, "Bread", "Bread goes well with coffee")
+    updated = search_posts(db_session, 1, "coffee")
+
+    # Assert
+    assert titles(found) == ["Coffee", "Tea"]
+    assert titles(prefix) == ["Coffee"]
+    assert set(titles(updated)) == {"Coffee", "Tea", "Bread"}
+    assert search_posts(db_session, 1, "sourdough").items == []
+
+
+def test_search_pages_by_offset():
+    # Arrange
+    db_session = make_session()
+    for index in range(5):
+        create_post(db_session, str(index), "weekly digest", 1)
+
+    # Act
+    first = search_posts(db_session, 1, "digest", limit=2)
+    second = search_posts(db_session, 1, "digest", first.next_cursor, limit=2)
+    last = search_posts(db_session, 1, "digest", second.next_cursor, limit=2)
+    back = search_posts(db_session, 1, "digest", last.previous_cursor, limit=2)
+
+    # Assert
+    assert first.previous_cursor is None and len(first.items) == 2
+    assert len(last.items) == 1 and last.next_cursor is None
+    assert titles(back) == titles(second)
+    assert set(titles(first) + titles(second) + titles(last)) == {"0", "1", "2", "3", "4"}
+
+
+def test_search_index_is_rebuilt_with_the_tables():
+    # Arrange
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db_session = sessionmaker(bind=engine)()
+    create_post(db_session, "Fruit", "banana", 1)
+    db_session.close()
+
+    # Act
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db_session = sessionmaker(bind=engine)()
+    create_post(db_session, "Fruit", "apple", 1)
+
+    # Assert
+    assert search_posts(db_session, 1, "banana").items == []
+    assert titles(search_posts(db_session, 1, "apple")) == ["Fruit"]